@@ -1,4 +1,4 @@
-from .acwrapper import ACWrapper
+from .acwrapper import ACWrapper, DEFAULT_HISTORY_SEC
 from .cmu_wrapper import TEDWrapper, BEARDWrapper
 from .cornell_wrapper import ComplianceWrapper
 from .gallup_wrapper import GelpWrapper
@@ -94,5 +94,10 @@ def make_ac_handlers(config=None, world=None, logger=logging, version=0):
     specs = copy.deepcopy(AC_specs)
     if version >= 1:
         apply_AC_patch(specs, AC_patches[0])
+    if config is not None:
+        # Length of the rolling window of AC history, and whether to keep the full history as well
+        for AC_spec in specs.values():
+            AC_spec.setdefault('history_sec', config.getfloat('teamwork', 'history_sec', fallback=DEFAULT_HISTORY_SEC))
+            AC_spec.setdefault('keep_history', config.getboolean('teamwork', 'keep_history', fallback=True))
     return {name: AC_spec.get('wrapper', ACWrapper)(name, world, **AC_spec) for name, AC_spec in specs.items() 
             if config is None or config.getboolean('teamwork', name, fallback=False)}
@@ -5,13 +5,102 @@ Created on Fri Mar 11 15:40:39 2022
 
 @author: mostafh
 """
-from dateutil import parser
+from collections import deque
 import logging
+import math
+import numbers
 import pandas as pd
 import numpy as np
 
 from psychsim.pwl.keys import stateKey, binaryKey
 from psychsim.action import Action, ActionSet
+from atomic.definitions.timestamps import parse_timestamp
+from atomic.parsing.row_buffer import RowBuffer
+
+# Default length (in seconds of mission time) of the window over which ACs compare players
+DEFAULT_HISTORY_SEC = 60
+# Record fields that are never treated as scores
+NON_SCORES = {'Timestamp', 'Trial', 'millis', 'elapsed_ms', 'delta_ms'}
+
+
+class ACHistory(object):
+    """
+    Records derived from an AC's messages, with running statistics over a rolling window of mission time.  Adding a
+    record costs time proportional to the record's size, no matter how long the history; the window holds only the
+    records from the last window seconds, while the full history goes (column by column) into an archive
+    :ivar window: Length (in seconds of mission time) of the rolling window
+    :type window: float
+    :ivar recent: The records within the window (mission time, record)
+    :type recent: deque
+    :ivar stats: Running [count, sum, sum of squares] of each numeric field for each player within the window
+    :type stats: Dict(str,Dict(str,List[float]))
+    :ivar archive: Every record so far (None if only the window is kept)
+    :type archive: RowBuffer
+    """
+
+    def __init__(self, window=DEFAULT_HISTORY_SEC, keep_all=True):
+        self.window = window
+        self.recent = deque()
+        self.stats = {}
+        self.now = None
+        self.archive = RowBuffer() if keep_all else None
+
+    def __len__(self):
+        return len(self.recent) if self.archive is None else len(self.archive)
+
+    @staticmethod
+    def _scores(record):
+        return [(field, value) for field, value in record.items() if field not in NON_SCORES and
+                isinstance(value, numbers.Real) and not isinstance(value, bool) and not math.isnan(value)]
+
+    def _update(self, record, sign):
+        player = record.get('Player')
+        for field, value in self._scores(record):
+            table = self.stats.setdefault(field, {})
+            if player not in table:
+                table[player] = [0, 0., 0.]
+            entry = table[player]
+            entry[0] += sign
+            entry[1] += sign*value
+            entry[2] += sign*value*value
+            if entry[0] == 0:
+                # Reset accumulated rounding error
+                del table[player]
+
+    def add(self, record, mission_time=None):
+        """
+        :param mission_time: seconds elapsed in the mission (if None, the record is treated as the most recent)
+        """
+        if self.archive is not None:
+            self.archive.append(record)
+        if mission_time is not None and (self.now is None or mission_time > self.now):
+            self.now = mission_time
+        self.recent.append((self.now if mission_time is None else mission_time, record))
+        self._update(record, 1)
+        # Evict the records that have left the window
+        if self.now is not None:
+            while self.recent and (self.recent[0][0] is None or self.recent[0][0] < self.now - self.window):
+                self._update(self.recent.popleft()[1], -1)
+
+    def mean_std(self, field):
+        """
+        :return: the mean and (sample) standard deviation of the given field for each player within the window
+        :rtype: Dict(str,float), Dict(str,float)
+        """
+        means = {}
+        stds = {}
+        for player, (count, total, squares) in self.stats.get(field, {}).items():
+            means[player] = total/count
+            stds[player] = math.sqrt(max(squares - total*total/count, 0)/(count-1)) if count > 1 else np.nan
+        return means, stds
+
+    def dataframe(self):
+        """
+        :return: the full history (or only the window, if the full history is not being kept)
+        """
+        if self.archive is None:
+            return pd.DataFrame([record for t, record in self.recent])
+        return self.archive.dataframe()
 
 
 class ACWrapper:
@@ -25,8 +114,9 @@ class ACWrapper:
         self.score_names = []
         self.callsigns = ['green', 'red', 'blue']
         self.trial = None
-        self.data = None
-        self.last = None
+        self.history = ACHistory(kwargs.get('history_sec', DEFAULT_HISTORY_SEC), kwargs.get('keep_history', True))
+        self.last_records = None
+        self._last = None
         self.topic_handlers = {}
         self.ignored_topics = set()
 
@@ -75,9 +165,37 @@ class ACWrapper:
                     state_delta[var] = record[field]
         return state_delta        
         
-    def make_dfs(self):
-        self.data = [pd.DataFrame(columns=['millis'] + self.callsigns) for i in range(len(self.score_names))]
-        
+    def record(self, records, mission_time=None):
+        """
+        Adds the records derived from the latest message to the history, stamped with mission time and trial
+        """
+        self.last_records = []
+        for record in records:
+            row = dict(record)
+            row['Timestamp'] = mission_time
+            row['Trial'] = self.trial
+            self.history.add(row, mission_time)
+            self.last_records.append(row)
+        self._last = None
+
+    @property
+    def data(self):
+        """
+        :return: the history of records from this AC
+        :rtype: pd.DataFrame
+        """
+        return self.history.dataframe()
+
+    @property
+    def last(self):
+        """
+        :return: the records derived from the latest message (None if there has been none)
+        :rtype: pd.DataFrame
+        """
+        if self._last is None and self.last_records is not None:
+            self._last = pd.DataFrame(self.last_records)
+        return self._last
+
     def n_scores(self):
         return len(self.score_names)
         
@@ -85,32 +203,42 @@ class ACWrapper:
         return []
 
     def handle_trial(self, message, data, mission_time):
-        self.start_time = parser.parse(message['timestamp'])
+        self.start_time = parse_timestamp(message['timestamp'])
         self.trial = data['trial_number']
 
     def elapsed_millis(self, message):
-        time_diff = parser.parse(message['timestamp']) - self.start_time
-        milliseconds = 1000*time_diff.seconds + time_diff.microseconds/1000
-        return milliseconds
+        return parse_timestamp(message['timestamp']) - self.start_time
         
-    ''' Compare players over the last history_sec seconds
-        For each score, return a list of [min, max] of the players that fall well below/above 
-        the others on this score.
-    '''
-    def compare(self, history_sec):
-        start_ms = self.elapsed_millis(self.messages[-1][0]) - history_sec*1000
+    def compare(self, history_sec=None):
+        """
+        Compare players over the last history_sec seconds (default is the window of the history)
+        :return: for each score, [min, max] of the players that fall well below/above the others on this score
+        """
+        if history_sec is None or history_sec == self.history.window:
+            stats = {score: self.history.mean_std(score) for score in self.score_names}
+        else:
+            # Not the window being tracked, so compute from the archive
+            df = self.data
+            relevant_df = df.loc[df['Timestamp'] >= df['Timestamp'].max() - history_sec, :]
+            stats = {}
+            for score in self.score_names:
+                if score in relevant_df.columns and 'Player' in relevant_df.columns:
+                    grouped = relevant_df.groupby('Player')[score]
+                    stats[score] = (grouped.mean().to_dict(), grouped.std().to_dict())
+                elif score in relevant_df.columns:
+                    # Records not attributed to any player (as with mean_std of the window)
+                    overall = relevant_df[score].agg(['mean', 'std'])
+                    stats[score] = ({None: overall['mean']}, {None: overall['std']})
+                else:
+                    stats[score] = ({}, {})
         extremes = {score:['', ''] for score in self.score_names}
-        for si, score in enumerate(self.score_names):
-            df = self.data[si]
-            relevant_df = df.loc[df['millis'] >= start_ms, :]
-            means = relevant_df.mean()
-            stds = relevant_df.std()
-            for callsign in self.callsigns:
+        for score, (means, stds) in stats.items():
+            for callsign in means:
                 thiscall_ub = means[callsign] + stds[callsign]
                 thiscall_lb = means[callsign] - stds[callsign]
-                if np.all([thiscall_ub <= means[other]-stds[other] for other in self.callsigns]):
+                if np.all([thiscall_ub <= means[other]-stds[other] for other in means]):
                     extremes[score][0] = callsign
-                if np.all([thiscall_lb >= means[other]+stds[other] for other in self.callsigns]):
+                if np.all([thiscall_lb >= means[other]+stds[other] for other in means]):
                     extremes[score][1] = callsign
                     
         return extremes
@@ -8,7 +8,6 @@ Created on Tue Mar 15 13:32:51 2022
 
 from atomic.analytic.acwrapper import ACWrapper
 import json
-import pandas as pd
 import numpy as np
 
 
@@ -42,16 +41,10 @@ class TEDWrapper(ACWrapper):
         self.topic_handlers = {
             'trial': self.handle_trial,
             'agent/ac/ac_cmu_ta2_ted/ted': self.handle_msg}
-        
-        self.data = pd.DataFrame()
-        # self.data = pd.DataFrame(columns=['millis'] + self.score_names)
 
     def handle_msg(self, message, data, mission_time):
         new_data = [data]
-        self.last = pd.DataFrame(new_data)
-        self.last['Timestamp'] = mission_time
-        self.last['Trial'] = self.trial
-        self.data = pd.concat([self.data, self.last], ignore_index=True)
+        self.record(new_data, mission_time)
         # elapsed = [self.elapsed_millis(message)]
         # row = [data.get(score, 0) for score in self.score_names]
         # self.data.loc[len(self.data)] = elapsed + row
@@ -65,8 +58,6 @@ class BEARDWrapper(ACWrapper):
         self.topic_handlers = {
             'trial': self.handle_trial,
             'agent/ac/ac_cmu_ta2_beard/beard': self.handle_msg}
-        
-        self.data = pd.DataFrame()
 
     def handle_msg(self, message, data, mission_time):
         new_data = []
@@ -76,8 +67,5 @@ class BEARDWrapper(ACWrapper):
                 new_data[-1]['Player'] = player.split('_')[0].capitalize()
                 if new_data[-1]['Player'] not in self.world.agents:
                     new_data[-1]['Player'] = self.world.participant2player[new_data[-1]['Player']]['callsign']
-        self.last = pd.DataFrame(new_data)
-        self.last['Timestamp'] = mission_time
-        self.last['Trial'] = self.trial
-        self.data = pd.concat([self.data, self.last], ignore_index=True)
+        self.record(new_data, mission_time)
         return new_data        
@@ -8,7 +8,6 @@ Created on Tue Mar 15 13:32:51 2022
 
 from atomic.analytic.acwrapper import ACWrapper
 import json
-import pandas as pd
 import numpy as np
 
 
@@ -20,7 +19,6 @@ class ComplianceWrapper(ACWrapper):
             'trial': self.handle_trial,
             'agent/ac/player_compliance': self.handle_compliance_msg,
             'agent/ac/goal_alignment': self.handle_alignment_msg}
-        self.data = pd.DataFrame()
 
     def handle_compliance_msg(self, message, data, mission_time):
         # Load in the latest compliance numbers
@@ -35,15 +33,7 @@ class ComplianceWrapper(ACWrapper):
                             records[player2] = {'Requestor': player1, 'Requestee': player2}
                         records[player2][field] = value
                 new_data += list(records.values())
-        new_frame = pd.DataFrame(new_data)
-        # Identify any changes
-        if len(self.data) > 0:
-            for i, record in new_frame.iterrows():
-                previous = self.data[(self.data['Requestor'] == record['Requestor']) & (self.data['Requestee'] == record['Requestee'])]
-        self.last = new_frame
-        self.last['Timestamp'] = mission_time
-        self.last['Trial'] = self.trial
-        self.data = pd.concat([self.data, self.last], ignore_index=True)
+        self.record(new_data, mission_time)
         return new_data
 
     def compute_state_delta(self, data):
@@ -77,8 +67,5 @@ class ComplianceWrapper(ACWrapper):
                     record.update({field: value[player2] for field, value in table.items() if field != 'current_goal'})
                     record['goal_alignment_current'] = 1 if record['goal_alignment_current'] else 0
                     new_data.append(record)
-        self.last = pd.DataFrame(new_data)
-        self.last['Timestamp'] = mission_time
-        self.last['Trial'] = self.trial
-        self.data = pd.concat([self.data, self.last], ignore_index=True)
+        self.record(new_data, mission_time)
         return new_data            
\ No newline at end of file
@@ -8,7 +8,6 @@ Created on Tue Mar 15 13:32:51 2022
 
 from .acwrapper import ACWrapper
 import json
-import pandas as pd
 import numpy as np
 
 
@@ -32,8 +31,6 @@ class GelpWrapper(ACWrapper):
         self.topic_handlers = {
             'trial': self.handle_trial,
             'agent/gelp': self.handle_msg}
-
-        self.data = pd.DataFrame()
         
     def handle_msg(self, message, data, mission_time):
         new_data = []
@@ -45,10 +42,7 @@ class GelpWrapper(ACWrapper):
             record[self.score_names[-1]] = result['gelp_overall']
             new_data.append(record)
         if new_data:
-            self.last = pd.DataFrame(new_data)
-            self.last['Timestamp'] = mission_time
-            self.last['Trial'] = self.trial
-            self.data = pd.concat([self.data, self.last], ignore_index=True)
+            self.record(new_data, mission_time)
         return new_data
     
 
@@ -59,8 +53,6 @@ class GOLDWrapper(ACWrapper):
             'trial': self.handle_trial,
             'agent/gold': self.handle_msg}
 
-        self.data = pd.DataFrame()
-
     def handle_msg(self, message, data, mission_time):
         if data['gold_results']:
             print(data)
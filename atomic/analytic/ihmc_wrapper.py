@@ -6,7 +6,6 @@ Created on Thu Mar 17 10:30:43 2022
 @author: mostafh
 """
 import traceback
-import pandas as pd
 
 from atomic.analytic.models.joint_activity_model import JointActivityModel
 from atomic.analytic.models.jags import asist_jags as aj
@@ -38,7 +37,6 @@ class JAGWrapper(ACWrapper):
         self.started = False
         self.asi_completed_jags = []
         self.orphan_msgs = []
-        self.data = pd.DataFrame(columns=['millis'] + self.score_names)
         common_tasks = [aj.AT_PROPER_TRIAGE_AREA, aj.CHECK_IF_UNLOCKED, aj.DROP_OFF_VICTIM, aj.PICK_UP_VICTIM,
                         aj.GET_IN_RANGE, aj.UNLOCK_VICTIM]
         self.role_to_urns = {clr: common_tasks for clr in ['red', 'blue', 'green']}
@@ -1,13 +1,25 @@
+import heapq
+import itertools
 from uuid import uuid4
 
 from .jag import Jag
 
+# Beyond this many inputs in a query, enumerating the input subsets an instance may match costs more than a scan
+MAX_INDEXED_INPUTS = 6
+
 
 class JagRegistry:
 
     def __init__(self, jags=()):
         self.__jags = {}
 
+        # every instance created, in order of creation (i.e., depth first, parents before children)
+        self.__instances = []
+        # indexes into __instances
+        self.__by_id = {}
+        self.__by_urn = {}
+        self.__by_inputs = {}
+
         for jag in jags:
             self.load_jag(jag)
 
@@ -21,20 +33,27 @@ class JagRegistry:
             return
 
         definition = self.__jags[urn]
-        uid = definition.get('id', uuid4())
-        jag = JagRegistry.from_definition(definition, uid, inputs, outputs)
-
-        if 'children' in definition:
-            for child_reference in definition['children']:
-                child_urn = child_reference['urn']
-                child = self.create_instance(child_urn, inputs, outputs)
-                if 'required' in child_reference.keys():
-                    child_required = child_reference['required']
-                    child.set_required(child_required)
-
-                jag.add_child(child)
-
-        return jag
+        start = len(self.__instances)
+        try:
+            uid = definition.get('id', uuid4())
+            jag = JagRegistry.from_definition(definition, uid, inputs, outputs)
+            self.__add_instance(jag)
+
+            if 'children' in definition:
+                for child_reference in definition['children']:
+                    child_urn = child_reference['urn']
+                    child = self.create_instance(child_urn, inputs, outputs)
+                    if 'required' in child_reference.keys():
+                        child_required = child_reference['required']
+                        child.set_required(child_required)
+
+                    jag.add_child(child)
+
+            return jag
+        except Exception:
+            # forget the instances of the partially created tree
+            self.__discard(start)
+            raise
 
     def create_instance_from_description(self, instance_description):
         urn = instance_description['urn']
@@ -43,21 +62,95 @@ class JagRegistry:
             return
 
         definition = self.__jags[urn]
-        uid = instance_description['id']
-        inputs = instance_description['inputs']
-        outputs = instance_description['outputs']
-        jag = JagRegistry.from_definition(definition, uid, inputs, outputs)
-
-        if 'children' in instance_description:
-            for child_description in instance_description['children']:
-                child = self.create_instance_from_description(child_description)
-                if 'required' in child_description.keys():
-                    child_required = child_description['required']
-                    child.set_required(child_required)
+        start = len(self.__instances)
+        try:
+            uid = instance_description['id']
+            inputs = instance_description['inputs']
+            outputs = instance_description['outputs']
+            jag = JagRegistry.from_definition(definition, uid, inputs, outputs)
+            self.__add_instance(jag)
+
+            if 'children' in instance_description:
+                for child_description in instance_description['children']:
+                    child = self.create_instance_from_description(child_description)
+                    if 'required' in child_description.keys():
+                        child_required = child_description['required']
+                        child.set_required(child_required)
+
+                    jag.add_child(child)
+
+            return jag
+        except Exception:
+            # forget the instances of the partially created tree
+            self.__discard(start)
+            raise
+
+    def __add_instance(self, jag):
+        order = len(self.__instances)
+        self.__instances.append(jag)
+        self.__by_id.setdefault(jag.id_string, order)
+        self.__by_urn.setdefault(jag.urn, []).append(order)
+        self.__by_inputs.setdefault(self.__inputs_key(jag.urn, jag.inputs), []).append(order)
 
-                jag.add_child(child)
-
-        return jag
+    @staticmethod
+    def __inputs_key(urn, inputs):
+        try:
+            return urn, frozenset(inputs.items())
+        except TypeError:
+            # unhashable inputs can only be found by scanning
+            return urn, None
+
+    def __discard(self, start):
+        for order in range(len(self.__instances) - 1, start - 1, -1):
+            jag = self.__instances.pop()
+            if self.__by_id.get(jag.id_string) == order:
+                del self.__by_id[jag.id_string]
+            self.__by_urn[jag.urn].pop()
+            self.__by_inputs[self.__inputs_key(jag.urn, jag.inputs)].pop()
+
+    def __len__(self):
+        return len(self.__instances)
+
+    def instance(self, order):
+        """
+        :return: the instance created in the given order
+        """
+        return self.__instances[order]
+
+    def get_by_id(self, uid):
+        """
+        :return: the first instance created with the given id (None if there is none)
+        """
+        order = self.__by_id.get(uid)
+        return None if order is None else self.__instances[order]
+
+    def get_by_urn(self, urn):
+        """
+        :return: the instances of the given URN, in order of creation
+        """
+        return [self.__instances[order] for order in self.__by_urn.get(urn, [])]
+
+    def find(self, urn, inputs=None, outputs=None):
+        """
+        :return: the order of creation of each instance that matches the given URN and inputs (see Jag.matches), in
+        increasing order
+        """
+        if inputs is None:
+            inputs = {}
+        try:
+            items = frozenset(inputs.items())
+        except TypeError:
+            items = None
+        if items is None or len(items) > MAX_INDEXED_INPUTS:
+            candidates = [self.__by_urn.get(urn, [])]
+        else:
+            # an instance matches if its inputs are a subset of the given ones
+            candidates = [self.__by_inputs.get((urn, frozenset(subset)), []) for size in range(len(items) + 1)
+                          for subset in itertools.combinations(items, size)]
+            candidates.append(self.__by_inputs.get((urn, None), []))
+        for order in heapq.merge(*candidates):
+            if self.__instances[order].matches(urn, inputs, outputs):
+                yield order
 
     @staticmethod
     def from_definition(definition, uid, inputs, outputs):
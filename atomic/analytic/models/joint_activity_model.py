@@ -1,3 +1,4 @@
+from bisect import bisect_right
 from typing import Optional
 
 from ..handlers import clear_path, stabilize, diagnose, unlock, pick_up, drop_off, at_proper_triage_area, get_in_range
@@ -34,67 +35,104 @@ __HANDLERS__ = {
     }
 }
 
+# Handlers that only act on instances with a given input matching the event:
+# handler -> (input name, function returning the values of that input concerned by the event data)
+__ROUTES__ = {
+    stabilize.handle_triage: ('victim-id', lambda data: [data['victim_id']]),
+    diagnose.handle_triage: ('victim-id', lambda data: [data['victim_id']]),
+    unlock.handle_proximity: ('victim-id', lambda data: [data['victim_id']]),
+    pick_up.handle_victim_picked_up: ('victim-id', lambda data: [data['victim_id']]),
+    drop_off.handle_victim_picked_up: ('victim-id', lambda data: [data['victim_id']]),
+    drop_off.handle_victim_placed: ('victim-id', lambda data: [data['victim_id']]),
+    at_proper_triage_area.handle_victim_evacuated: ('victim-id', lambda data: [data['victim_id']]),
+    get_in_range.handle_location_update: ('area', lambda data: [location['id']
+                                                                for location in data.get('locations', [])]),
+}
+
 
 class JointActivityModel:
     def __init__(self, jags):
         self.__registry = JagRegistry(jags)
         self.__jag_instances = []
+        # order of creation in the registry of each top level jag (its descendants follow it)
+        self.__jag_starts = []
+        # event type -> handler -> routing input value -> [(dispatch order, instance)]
+        self.__routes = {}
+        self.__dispatch_count = 0
+
+    def __add_routes(self, jag_instance):
+        # dispatch to children first to bubble up events
+        for child in jag_instance.children:
+            self.__add_routes(child)
+        for event_type, handler in __HANDLERS__.get(jag_instance.urn, {}).items():
+            if handler in __ROUTES__:
+                key = jag_instance.inputs.get(__ROUTES__[handler][0])
+            else:
+                key = None
+            table = self.__routes.setdefault(event_type, {}).setdefault(handler, {})
+            table.setdefault(key, []).append((self.__dispatch_count, jag_instance))
+            self.__dispatch_count += 1
+
+    def __add(self, jag, start):
+        self.__jag_instances.append(jag)
+        self.__jag_starts.append(start)
+        if jag is not None:
+            self.__add_routes(jag)
 
-    @staticmethod
-    def __dispatch(event_type, data, jag_instances):
-        if len(jag_instances) == 0:
-            return
-
-        for jag_instance in jag_instances:
-            # dispatch first to bubble up events
-            JointActivityModel.__dispatch(event_type, data, jag_instance.children)
-
-            if jag_instance.urn not in __HANDLERS__:
-                continue
-
-            handlers = __HANDLERS__.get(jag_instance.urn)
-
-            if event_type not in handlers:
-                continue
-
-            handlers[event_type](jag_instance, data)
+    def __top_level(self, order):
+        """
+        :return: the top level jag containing the instance created in the given order
+        """
+        return self.__jag_instances[bisect_right(self.__jag_starts, order) - 1]
 
     @property
     def jag_instances(self):
         return self.__jag_instances
 
     def dispatch(self, event_type, data):
-        JointActivityModel.__dispatch(event_type, data, self.__jag_instances)
+        """
+        Passes the event to the handlers of only those instances it may concern, in the same order as a depth first
+        traversal of the instances (children before their parent)
+        """
+        if event_type not in self.__routes:
+            return
+        targets = {}
+        for handler, table in self.__routes[event_type].items():
+            keys = __ROUTES__[handler][1](data) if handler in __ROUTES__ else [None]
+            for key in keys:
+                for order, jag_instance in table.get(key, []):
+                    targets[order] = (jag_instance, handler)
+        for order in sorted(targets):
+            jag_instance, handler = targets[order]
+            handler(jag_instance, data)
 
     def get_by_id(self, uid) -> Optional[Jag]:
-        for instance in self.__jag_instances:
-            value = instance.get_by_id(uid)
-            if value is not None:
-                return value
-        return None
+        return self.__registry.get_by_id(uid)
 
     # only inspect top level jags
     def get(self, urn, inputs=None, outputs=None) -> Optional[Jag]:
-        for instance in self.__jag_instances:
-            if instance.matches(urn, inputs, outputs):
+        for order in self.__registry.find(urn, inputs, outputs):
+            instance = self.__registry.instance(order)
+            if self.__top_level(order) is instance:
                 return instance
         return None
 
     def get_by_urn_recursive(self, urn, inputs=None, outputs=None):
-        for instance in self.__jag_instances:
-            if instance.get_by_urn(urn, inputs, outputs):
-                return instance
+        for order in self.__registry.find(urn, inputs, outputs):
+            return self.__top_level(order)
         return None
 
     #  @todo id should be a parameter and default to uuid4: uid=uuid4() and set of children
     def create(self, urn, inputs=None, outputs=None):
+        start = len(self.__registry)
         jag = self.__registry.create_instance(urn, inputs, outputs)
-        self.__jag_instances.append(jag)
+        self.__add(jag, start)
         return jag
 
     def create_from_instance(self, instance_description):
+        start = len(self.__registry)
         jag = self.__registry.create_instance_from_description(instance_description)
-        self.__jag_instances.append(jag)
+        self.__add(jag, start)
         return jag
 
     def get_known_victims(self):
@@ -9,7 +9,10 @@ email: mvignati@ihmc.org
 
 __author__ = 'mvignati'
 
+import hashlib
 import json
+import os
+import tempfile
 
 import math
 import numpy as np
@@ -56,11 +59,89 @@ POINTS_OF_INTEREST = [2, 3, 4]
 
 HALF_PI = math.pi / 2
 
+# Directory of the compiled voxel grids shared across processes (empty to compile each map file on every load)
+VOXEL_CACHE_DIR = os.environ.get('ATOMIC_MAP_CACHE', os.path.join(tempfile.gettempdir(), 'atomic_map_cache'))
+# Bump whenever the compilation of the map files changes
+VOXEL_CACHE_VERSION = 1
+
 
 def handle_poi_detection(poi, player):
     pass
 
 
+def block_shadows(blocks):
+    """
+    Vectorized version of Map.__block_shadow over an array of block locations (e.g., the ring offsets of a player)
+    :return: start and end arcs cast by each block
+    :rtype: np.ndarray, np.ndarray
+    """
+    xs = np.copysign(.5, blocks[:, 0])
+    ys = np.copysign(.5, blocks[:, 1])
+    on_x = blocks[:, 0] == 0
+    on_y = ~on_x & (blocks[:, 1] == 0)
+    start = np.stack([np.where(on_y, -xs, ys), np.where(on_x, -ys, -xs)], axis=1)
+    end = np.stack([np.where(on_y, -xs, -ys), np.where(on_x, -ys, xs)], axis=1)
+    return blocks + start, blocks + end
+
+
+def compile_voxel_map(file_name):
+    """
+    Reads a map file into its voxel grid (zero for air, one for opaque blocks), indexed by x, z, y relative to the
+    lower bound of the map
+    :return: the lower bound (x, z, y), the dimensions and the grid
+    :rtype: np.ndarray, np.ndarray, np.ndarray
+    """
+    with open(file_name, 'r') as map_file:
+        map_data = json.load(map_file)
+
+    origin = xzy_location_from_dict(map_data['metadata']['lower_bound'])
+    upper_bound = xzy_location_from_dict(map_data['metadata']['upper_bound'])
+    dimensions = (upper_bound - origin) + 1
+
+    blocks = np.zeros(np.uint(dimensions), dtype=np.uint8)  # zero is for air block
+    locations = np.array([[block['location']['x'], block['location']['z'], block['location']['y']]
+                          for block in map_data['blocks'] if block['type'] not in TRANSPARENT_BLOCKS],
+                         dtype=origin.dtype).reshape(-1, 3)
+    local = locations - origin
+    blocks[local[:, 0].astype(np.uint16), local[:, 1].astype(np.uint8), local[:, 2].astype(np.uint16)] = 1
+    return origin, dimensions, blocks
+
+
+def load_voxel_map(file_name, cache_dir=None):
+    """
+    Same as compile_voxel_map, but the map file is compiled only once (until it changes) into a binary file in the
+    cache directory, whose grid every later load maps copy-on-write: all the processes using the map share its pages,
+    except for the ones they modify (e.g., when placing victims)
+    :param cache_dir: the directory of the compiled grids (default is VOXEL_CACHE_DIR)
+    """
+    if cache_dir is None:
+        cache_dir = VOXEL_CACHE_DIR
+    if not cache_dir:
+        return compile_voxel_map(file_name)
+    stat = os.stat(file_name)
+    key = hashlib.sha256(f'{os.path.abspath(file_name)}:{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()
+    root = os.path.join(cache_dir, f'voxels_{VOXEL_CACHE_VERSION}_{key}')
+    try:
+        bounds = np.load(f'{root}_bounds.npy')
+        return bounds[0], bounds[1], np.load(f'{root}.npy', mmap_mode='c')
+    except (OSError, ValueError):
+        pass
+    origin, dimensions, blocks = compile_voxel_map(file_name)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written to temporary files first, so concurrent processes never map a partial grid (and the grid last, as
+        # its presence marks the entry as complete)
+        for suffix, array in [('_bounds.npy', np.stack([origin, dimensions])), ('.npy', blocks)]:
+            fd, tmp_name = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as grid_file:
+                np.save(grid_file, array)
+            os.replace(tmp_name, f'{root}{suffix}')
+        blocks = np.load(f'{root}.npy', mmap_mode='c')
+    except OSError:
+        pass
+    return origin, dimensions, blocks
+
+
 class Map:
     def __init__(self, _handle_poi_detection=handle_poi_detection):
         self.__origin = None
@@ -114,6 +195,41 @@ class Map:
                 return i
         return None
 
+    @staticmethod
+    def __is_close(a, b):
+        # np.allclose(a, b, rtol=0.98) without the overhead of the array machinery
+        return abs(a[0] - b[0]) <= 1e-8 + 0.98 * abs(b[0]) and abs(a[1] - b[1]) <= 1e-8 + 0.98 * abs(b[1])
+
+    @staticmethod
+    def __arcs_containing(arcs, blocks):
+        """
+        Vectorized version of __in_field_of_view over an array of blocks
+        :return: index of the first arc containing each block (-1 if none)
+        """
+        if len(arcs) == 0:
+            return np.full(len(blocks), -1)
+        arcs = np.array(arcs)
+        starts = arcs[0::2]
+        ends = arcs[1::2]
+        start_cross = starts[:, 0, None] * blocks[None, :, 1] - starts[:, 1, None] * blocks[None, :, 0]
+        end_cross = ends[:, 0, None] * blocks[None, :, 1] - ends[:, 1, None] * blocks[None, :, 0]
+        inside = (start_cross >= 0) & (end_cross <= 0)
+        return np.where(inside.any(axis=0), 2 * inside.argmax(axis=0), -1)
+
+    def __block_types(self, blocks, z):
+        """
+        Vectorized version of __block_type over an array of block locations at the same height
+        """
+        types = np.ones(len(blocks), dtype=self.__blocks.dtype)
+        shape = self.__blocks.shape
+        if -shape[2] <= z < shape[2]:
+            x = blocks[:, 0]
+            y = blocks[:, 1]
+            # negative indices wrap around as in __block_type
+            inside = (x >= -shape[0]) & (x < shape[0]) & (y >= -shape[1]) & (y < shape[1])
+            types[inside] = self.__blocks[x[inside], y[inside], z]
+        return types
+
     def __block_key(self, x, y):
         return y * self.__dimensions[0] + x
 
@@ -153,24 +269,7 @@ class Map:
 
         if eye_block_type != 0:
             start, end = self.__block_shadow(local_block)
-
-            arc_start = arcs[arc_idx]
-            arc_end = arcs[arc_idx + 1]
-
-            player.arcs.insert(arc_idx + 1, start)
-            player.arcs.insert(arc_idx + 2, end)
-
-            # starts with the end to keep the index meaning
-            # if not self.__in_arc(arc_start, arc_end, end):
-            if not self.__in_arc(arc_start, arc_end, end) or np.allclose(arc_end, end, rtol=0.98):
-                arcs.pop(arc_idx + 1)
-            else:
-                arcs.insert(arc_idx + 1, end)
-
-            if not self.__in_arc(arc_start, arc_end, start) or np.allclose(arc_start, start, rtol=0.98):
-                arcs.pop(arc_idx)
-            else:
-                arcs.insert(arc_idx + 1, start)
+            self.__narrow_arcs(player, arcs, arc_idx, start, end)
 
         return True
 
@@ -196,27 +295,80 @@ class Map:
             self.on_map_update()
 
     def load_map_data(self, map_name):
-        with open(f'./maps/{map_name}.json', 'r') as map_file:
-            map_data = json.load(map_file)
+        self.__origin, self.__dimensions, self.__blocks = load_voxel_map(f'./maps/{map_name}.json')
+        self.on_map_update()
+
+    def compute_fov(self, player):
+        """
+        Computes the blocks visible to the given player by casting the shadows of the opaque blocks, one ring of
+        offsets at a time: the arc containing every block of the ring is found at once, and only the opaque blocks
+        in view (which narrow the arcs for the rest of the ring) are handled one by one
+        """
+        player.arcs.clear()
+        arcs = [
+            player.fov_bounds[0],
+            player.fov_bounds[1],
+        ]
+        player.arcs.extend(arcs)
 
-        self.__origin = xzy_location_from_dict(map_data['metadata']['lower_bound'])
-        upper_bound = xzy_location_from_dict(map_data['metadata']['upper_bound'])
+        np.add(player.ring_offsets, player.location, out=player.fov)
+        player.fov_mask[:] = False
+        poi_mask = np.isin(self.__block_types(player.fov, 2), POINTS_OF_INTEREST)
+        eye_block_types = self.__block_types(player.fov, 3)
+        shadow_starts, shadow_ends = player.ring_shadows
+        for ring_start, ring_end in player.rings:
+            idx = ring_start
+            while idx < ring_end:
+                arc_indices = self.__arcs_containing(arcs, player.ring_offsets[idx:ring_end])
+                visible = arc_indices >= 0
+                opaque = np.flatnonzero(visible & (eye_block_types[idx:ring_end] != 0))
+                # the arcs hold until the first opaque block in view
+                last = len(visible) if len(opaque) == 0 else opaque[0] + 1
+                player.fov_mask[idx:idx + last] = visible[:last]
+                for poi_idx in np.flatnonzero(visible[:last] & poi_mask[idx:idx + last]):
+                    x, y = player.fov[idx + poi_idx]
+                    block_key = self.__block_key(x, y)
+                    # if the block is a point of interest and has not been seen before by this player
+                    if block_key in self.__points_of_interest and block_key not in player.points_of_interest:
+                        poi = self.__points_of_interest[block_key]
+                        player.points_of_interest[block_key] = poi
+                        self.__handle_poi_detection(poi, player)
+                if len(opaque) > 0:
+                    block_idx = idx + opaque[0]
+                    self.__narrow_arcs(player, arcs, arc_indices[opaque[0]], shadow_starts[block_idx],
+                                       shadow_ends[block_idx])
+                idx += last
+            if len(arcs) == 0:
+                # nothing else can be seen
+                player.fov_length = len(player.ring_offsets)
+                break
 
-        self.__dimensions = (upper_bound - self.__origin) + 1
+    def __narrow_arcs(self, player, arcs, arc_idx, start, end):
+        """
+        Removes the shadow (from start to end) of the given block from the arc in which the block lies
+        """
+        arc_start = arcs[arc_idx]
+        arc_end = arcs[arc_idx + 1]
 
-        shape = np.uint(self.__dimensions)
-        self.__blocks = np.zeros(shape, dtype=np.uint8)  # zero is for air block
-        for block in map_data['blocks']:
-            if block['type'] in TRANSPARENT_BLOCKS:
-                continue
+        player.arcs.insert(arc_idx + 1, start)
+        player.arcs.insert(arc_idx + 2, end)
 
-            loc = block['location']
-            x, y, z = self.__local_coordinates(loc)
-            self.__blocks[x, z, y] = 1
+        # starts with the end to keep the index meaning
+        if not self.__in_arc(arc_start, arc_end, end) or self.__is_close(arc_end, end):
+            arcs.pop(arc_idx + 1)
+        else:
+            arcs.insert(arc_idx + 1, end)
 
-        self.on_map_update()
+        if not self.__in_arc(arc_start, arc_end, start) or self.__is_close(arc_start, start):
+            arcs.pop(arc_idx)
+        else:
+            arcs.insert(arc_idx + 1, start)
 
-    def compute_fov(self, player):
+    def compute_fov_by_block(self, player):
+        """
+        Computes the same field of view as compute_fov, casting the shadow of one block at a time (used as the
+        reference for validating compute_fov)
+        """
         player.arcs.clear()
         # uncomment to only record what is currently seen
         # player.points_of_interest.clear()
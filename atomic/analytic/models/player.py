@@ -3,7 +3,7 @@ import numpy as np
 
 from .events import JagEvent
 from .joint_activity_model import JointActivityModel
-from .map import DIAMOND_TOPOLOGY
+from .map import DIAMOND_TOPOLOGY, block_shadows
 from ..models.jags import asist_jags as aj
 
 PLAYER_COLORS = {
@@ -36,6 +36,8 @@ class Player:
         self.__fov_radius = 40
         self.__fov_ring_stride_factor = 0
         self.__ring_offsets = None
+        self.__rings = []
+        self.__ring_shadows = None
         self.__fov_mask = None
         self.__fov_map = None
         self.__fov_length = 0
@@ -80,6 +82,7 @@ class Player:
         self.__init_ring_offsets(DIAMOND_TOPOLOGY)
         self.__fov_mask = np.ndarray((self.__ring_offsets.shape[0]), dtype=np.bool)
         self.__fov_map = np.ndarray(self.__ring_offsets.shape, dtype=np.int16)
+        self.__ring_shadows = block_shadows(self.__ring_offsets)
 
     def __fov_ring_index_offset(self, d):
         # s=number of sides, c=block per side count factor (multiply by distance for actual block count)
@@ -104,6 +107,7 @@ class Player:
             # creates a view at the correct offset to be populated by __init_ring
             ring = self.__ring_offsets[index_offset:]
             self.__init_ring(d, topology['offset'], count, walk, ring)
+            self.__rings.append((int(index_offset), int(self.__fov_ring_index_offset(d))))
 
     def __update_fov_bounds(self):
         start_theta = self.__yaw - self.__horizontal_fov / 2
@@ -190,6 +194,14 @@ class Player:
     def ring_offsets(self):
         return self.__ring_offsets
 
+    @property
+    def rings(self):
+        return self.__rings
+
+    @property
+    def ring_shadows(self):
+        return self.__ring_shadows
+
     @property
     def role(self):
         return self.__role
@@ -1,6 +1,5 @@
 from atomic.analytic.acwrapper import ACWrapper
 import json
-import pandas as pd
 import numpy as np
 
 
@@ -13,7 +12,6 @@ class BeliefDiffWrapper(ACWrapper):
             'agent/ac/threat_room_communication': self.ignore_msg,
             'agent/ac/victim_type_communication': self.ignore_msg,
             'agent/ac/threat_room_coordination': self.handle_threat}
-        self.data = pd.DataFrame()
 
     def handle_msg(self, message, data, mission_time):
         overall_pos = data['room_id'].index('overall')
@@ -21,9 +19,7 @@ class BeliefDiffWrapper(ACWrapper):
         for field, value in data.items():
             if isinstance(value, list) and field != 'room_id':
                 new_data[field] = value[overall_pos]
-        self.last = pd.DataFrame([new_data])
-        self.last['Trial'] = self.trial
-        self.data = pd.concat([self.data, self.last], ignore_index=True)
+        self.record([new_data], mission_time)
         return [new_data]
 
     def handle_threat(self, message, data, mission_time):
@@ -36,7 +32,5 @@ class BeliefDiffWrapper(ACWrapper):
                              'threat_activation_time': data['threat_activation_time'][-1],
                              'threat_room': data['room_id'][-1],
                              'threshold': data.get('threshold', data['threshold:'])})
-            self.last = pd.DataFrame(new_data)
-            self.last['Trial'] = self.trial
-            self.data = pd.concat([self.data, self.last], ignore_index=True)
+            self.record(new_data, mission_time)
             return new_data
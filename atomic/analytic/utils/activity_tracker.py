@@ -89,6 +89,10 @@ def contains_overlapping_time_periods(activity_tracker_set):
     return contains_overlapping_set(time_periods)
 
 
+# The trackers stay a plain list, re-merged from scratch on every knowledge update of a JAG; only the overlap check
+# gating the merge is O(n log n) rather than O(n^2) (see contains_overlapping_set).  An interval structure merging as
+# trackers come in would not keep the list order (nor the adjacent trackers left apart for differing confidence) that
+# is_aware, is_addressing and awareness_time depend on
 def get_non_overlapping_activity_tracker_set(activity_tracker_set):
     if contains_overlapping_time_periods(activity_tracker_set):
         non_overlapping_set = []
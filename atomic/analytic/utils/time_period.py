@@ -102,6 +102,35 @@ def get_non_overlap_union(time_period_1, time_period_2):
 
 
 def contains_overlapping_set(time_periods):
+    """
+    Same as checking every pair with does_overlap, but in O(n log n): by does_overlap, an ongoing period (ending at
+    -1) overlaps a period only if that period contains its start (or is ongoing from the same start), i.e., it
+    behaves as the single point at its start, so a sweep over the periods sorted by start finds any overlap
+    """
+    bounds = []
+    for time_period in time_periods:
+        start = time_period.start
+        end = time_period.end
+        if end == -1:
+            end = start
+        elif end is None or end < start:
+            # does_overlap has no such simple reading of these
+            return contains_overlapping_pair(time_periods)
+        bounds.append((start, end))
+    bounds.sort()
+    latest_end = None
+    for start, end in bounds:
+        if latest_end is not None and start <= latest_end:
+            return True
+        if latest_end is None or end > latest_end:
+            latest_end = end
+    return False
+
+
+def contains_overlapping_pair(time_periods):
+    """
+    Checks every pair of time periods with does_overlap, in O(n^2)
+    """
     time_periods_copy = time_periods.copy()
     time_periods_copy.sort(reverse=True, key=lambda x: (x.start, x.end))
     while len(time_periods_copy) > 1:
@@ -1,28 +1,34 @@
 import csv
-from multiprocessing import Pool
+import logging
 import os
-import subprocess
 
 from atomic.parsing.replayer import filename_to_condition
+from atomic.parsing.rddl_replayer import parse_replay_args
+from atomic.parsing.trial_catalog import TrialCatalog
+from atomic.bin.model_inference import Analyzer, model_cmd_parser, use_clusters
 
 home = '/home/david/working/atomic'
 
 multi = True
+processes = 3
 profile = False
 analyze = False
 
-def run_inference(args):
-	fname, sub_args = args
-	root, log_name = sub_args
-	env = {'PYTHONPATH': ':'.join([os.path.join(home, '..', 'psychsim'), home, os.path.join(home, '..', 'model-learning')])}
-	cmd = ['python3', os.path.join(home, 'atomic', 'bin', 'model_inference.py'),
-		os.path.join(root, fname), '--ignore_rationality', '--ignore_horizon', '-d', 'INFO',
-		'-c', os.path.join(home, 'data', 'rewards', 'linear', 'phase1_clusters.csv'),
-		'--metadata', os.path.join(home, 'data', 'ASU_2020_08', 'Raw', log_name)]
+def run_inference(log_files, processes=1):
+	"""
+	Runs model inference over the given log files, replaying the given number of them in parallel
+	"""
+	arg_list = log_files + ['-d', 'INFO', '-p', str(processes),
+		'-c', os.path.join(home, 'data', 'rewards', 'linear', 'phase1_clusters.csv')]
 	if profile:
-		cmd.append('--profile')
-#	cmd += ['-n', '20']
-	subprocess.run(cmd, env=env)
+		arg_list.append('--profile')
+#	arg_list += ['-n', '20']
+	args = parse_replay_args(model_cmd_parser(), arg_list)
+	use_clusters(args['clusters'])
+	replayer = Analyzer(args['fname'], args['trials'], args['config'], rddl_file=args['rddl'], action_file=args['actions'],
+		aux_file=args['aux'], logger=logging, output=args['output'], resume=args['resume'],
+		catalog=TrialCatalog(args['catalog']) if args['catalog'] else None)
+	replayer.parameterized_replay(args)
 
 baseline = {'NoTriageNoSignal StaticMap': 0.19230769230769232, 'TriageNoSignal StaticMap': 0.15384615384615385, 
 	'TriageSignal DynamicMap': 0.38461538461538464, 'TriageSignal StaticMap': 0.2692307692307692}
@@ -101,9 +107,6 @@ if __name__ == '__main__':
 		for field in total:
 			total[field] /= len(analyzees)
 		print(total)
-	elif multi:
-		with Pool(processes=3) as pool:
-			pool.map(run_inference, files.items())
-	else:
-		for args in sorted(files.items()):
-			run_inference(args)
+	elif files:
+		log_files = [os.path.join(log_dir, log_name) for fname, (root, log_name) in sorted(files.items())]
+		run_inference(log_files, processes if multi else 1)
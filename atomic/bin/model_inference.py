@@ -20,6 +20,7 @@ from psychsim.pwl import WORLD, modelKey, stateKey
 
 from atomic.definitions.map_utils import get_default_maps
 from atomic.parsing.replay_features import *
+from atomic.parsing.results_log import DEFAULT_BUFFER_SIZE, ResultsLog
 from atomic.inference import *
 
 
@@ -28,10 +29,13 @@ def plot_data(data, color_field, title):
 
 
 class Analyzer(FeatureReplayer):
+    # The per-step decisions and debug_data (which holds on to the world of every step) stay in the worker processes
+    MERGED_ATTRIBUTES = dict(FeatureReplayer.MERGED_ATTRIBUTES, beliefs=merge_entries, model_logs=merge_entries)
 
-    def __init__(self, files=[], trials=None, config=None, maps=None, rddl_file=None, action_file=None, aux_file=None, logger=logging, output=None):
+    def __init__(self, files=[], trials=None, config=None, maps=None, rddl_file=None, action_file=None, aux_file=None, logger=logging, output=None,
+                 resume=False, catalog=None):
         super().__init__(files=files, trials=trials, config=config, maps=maps, rddl_file=rddl_file, action_file=action_file, aux_file=aux_file, output=output,
-            logger=logger)
+            logger=logger, catalog=catalog)
 
         if config:
             self.models = {key: json.loads(values) for key, values in self.config.items('models')}
@@ -39,10 +43,16 @@ class Analyzer(FeatureReplayer):
             self.model_list = [{dimension: value[index] for index, dimension in enumerate(self.models)}
                                for value in itertools.product(*self.models.values()) if len(value) > 0]
         self.beliefs = {}
-        self.model_data = pandas.DataFrame()
+        # Per-trial logs of model posteriors, written as the replay goes (or kept in memory, if there is no output file)
+        self.model_logs = {}
+        self.resume = resume
+        self.buffer_size = self.config.getint('run', 'model_buffer', fallback=DEFAULT_BUFFER_SIZE) if self.config \
+            else DEFAULT_BUFFER_SIZE
+        # Decide under all of the reward variants of a player at once, rather than one Agent.decide per model
+        self.batch_decisions = self.config.getboolean('run', 'batch_decisions', fallback=False) if self.config \
+            else False
         self.decisions = {}
         self.debug_data = {}
-        self.model_columns = None
 
     def pre_replay(self, parser, logger=logging):
         result = super().pre_replay(parser, logger)
@@ -68,6 +78,12 @@ class Analyzer(FeatureReplayer):
             self.beliefs[parser.jsonFile] = {name: Distribution({model['name']: 1/len(models) for model in models}) 
                 for name, models in player_models.items()}
             self.decisions[parser.jsonFile] = {name: {} for name in player_models}
+            log = self.model_logs[parser.jsonFile] = ResultsLog(
+                self.model_log_name(parser.jsonFile) if self.feature_output else None, self.buffer_size, self.resume)
+            if log.step is not None:
+                logger.warning(f'Resuming model inference after message {log.step}')
+                self.beliefs[parser.jsonFile] = {name: Distribution(belief)
+                    for name, belief in log.checkpoint['beliefs'].items()}
         except:
             logger.error('Unable to create player models')
             logger.error(traceback.format_exc())
@@ -79,20 +95,53 @@ class Analyzer(FeatureReplayer):
         self.debug_data[parser.jsonFile] = []
         return result
 
+    @property
+    def model_data(self):
+        """
+        :return: the model posteriors logged for all of the trials replayed so far
+        :rtype: pandas.DataFrame
+        """
+        frames = [log.dataframe() for log in self.model_logs.values() if log.rows > 0]
+        return pandas.concat(frames, ignore_index=True) if frames else pandas.DataFrame()
+
+    def model_log_name(self, fname):
+        """
+        :return: the name of the file logging the model posteriors for the given trial
+        """
+        root, ext = os.path.splitext(self.feature_output)
+        return os.path.join(f'{root}_models', f'{os.path.splitext(os.path.basename(fname))[0]}{ext}.gz')
+
+    def resumed(self, parser):
+        """
+        :return: True iff the current step's model posteriors were already logged by an earlier, interrupted replay
+        """
+        log = self.model_logs.get(parser.jsonFile)
+        return log is not None and log.step is not None and self.times[parser.jsonFile] <= log.step
+
     def pre_step(self, world, parser, logger=logging):
         super().pre_step(world, logger)
+        if self.resumed(parser):
+            return
         #<SIMULATE>
 #        debug_s = {ag_name: {'preserve_states': True} for ag_name in parser.agentToPlayer}
 #        world.step(real=False, debug=debug_s) # This is where the script hangs
         #</SIMULATE>
         for name, models in self.beliefs[parser.jsonFile].items():
             self.decisions[parser.jsonFile][name].clear()
+            if self.batch_decisions:
+                logger.debug(f'Generating decisions for {name} under {len(models)} models')
+                self.decisions[parser.jsonFile][name].update(decide_models(world.agents[name], models.domain(),
+                                                                           logger=logger))
+                continue
             for model in models.domain():
                 logger.debug(f'Generating decision for {name} under {model}')
                 self.decisions[parser.jsonFile][name][model] = world.agents[name].decide(selection='distribution', model=model)
 
     def post_step(self, world, actions, t, parser, debug, logger=logging):
         super().post_step(world, actions, t, parser, debug, logger)
+        if self.resumed(parser):
+            return
+        log = self.model_logs[parser.jsonFile]
         for name, models in self.decisions[parser.jsonFile].items():
             prob = {}
             for model, decision in models.items():
@@ -119,19 +168,32 @@ class Analyzer(FeatureReplayer):
                 record.update(agent.models[model]['parameters'])
                 record['Probability'] = prob[model]
                 record['Belief'] = self.beliefs[parser.jsonFile][name][model]
-                if self.model_columns is None:
-                    self.model_columns = list(record.keys())
-                self.model_data = self.model_data.append(record, ignore_index=True)
-        logger.warning(f'|Model data|={len(self.model_data)}')
+                log.append(record)
+        log.end_step(t, {'beliefs': {name: dict(belief.items())
+                                     for name, belief in self.beliefs[parser.jsonFile].items()}})
+        logger.warning(f'|Model data|={len(log)}')
         self.debug_data[parser.jsonFile].append({"WORLD": world,
                 "AGENT_DEBUG": self.decisions[parser.jsonFile],
                 "AGENT_ACTIONS": actions})
 
+    def post_replay(self, world, parser, logger=logging):
+        super().post_replay(world, parser, logger)
+        if parser.jsonFile in self.model_logs:
+            self.model_logs[parser.jsonFile].flush()
+
     def finish(self):
         super().finish()
-        if self.feature_output and len(self.model_data) > 0:
+        logs = [self.model_logs[fname] for fname in self.files if len(self.model_logs.get(fname, [])) > 0]
+        if self.feature_output and logs:
             root, ext = os.path.splitext(self.feature_output)
-            self.model_data.to_csv(f'{root}_models{ext}', index=False, columns=self.model_columns)
+            columns = []
+            for log in logs:
+                columns += [column for column in log.columns if column not in columns]
+            with open(f'{root}_models{ext}', 'w', newline='') as csvfile:
+                writer = csv.DictWriter(csvfile, columns)
+                writer.writeheader()
+                for log in logs:
+                    writer.writerows(log.read())
 
     def draw_plot(self):
         name = os.path.splitext(os.path.basename(self.parser.filename))[0]
@@ -183,6 +245,16 @@ def apply_cluster_rewards(reward_weights, models=None):
     models['reward'] = {'cluster{}'.format(cluster): vector
         for cluster, vector in reward_weights.items()}
 
+def use_clusters(fname):
+    """
+    Loads the reward clusters in the given file as the basis for the player models, along with the prior over
+    conditions of each cluster
+    """
+    reward_weights, cluster_map, condition_map = load_clusters(fname)
+    AnalysisParseProcessor.condition_dist = condition_map
+    apply_cluster_rewards(reward_weights)
+    return reward_weights, cluster_map, condition_map
+
 def model_to_cluster(model):
     try:
         return int(model.split('_')[-2][7:])
@@ -193,6 +265,7 @@ def model_cmd_parser():
     # Process command-line arguments
     parser = feature_cmd_parser()
     parser.add_argument('-c','--clusters', help='Name of CSV file containing reward clusters to use as basis for player models')
+    parser.add_argument('--resume', action='store_true', help='Continue the model inference of interrupted trials from their logged posteriors')
     return parser
 
 if __name__ == '__main__':
@@ -201,8 +274,7 @@ if __name__ == '__main__':
     if args['clusters']:
         import atomic.model_learning.linear.post_process.clustering as clustering
 
-        reward_weights, cluster_map, condition_map = load_clusters(args['clusters'])
-        AnalysisParseProcessor.condition_dist = condition_map
-        apply_cluster_rewards(reward_weights)
-    replayer = Analyzer(args['fname'], args['trials'], args['config'], rddl_file=args['rddl'], action_file=args['actions'], aux_file=args['aux'], logger=logging, output=args['output'])
+        reward_weights, cluster_map, condition_map = use_clusters(args['clusters'])
+    replayer = Analyzer(args['fname'], args['trials'], args['config'], rddl_file=args['rddl'], action_file=args['actions'], aux_file=args['aux'], logger=logging, output=args['output'], resume=args['resume'],
+                        catalog=TrialCatalog(args['catalog']) if args['catalog'] else None)
     replayer.parameterized_replay(args)
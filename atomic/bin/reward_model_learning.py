@@ -9,7 +9,7 @@ from atomic.model_learning.linear.post_process.players_data import process_playe
 from atomic.model_learning.linear.post_process.clustering import cluster_reward_weights
 from atomic.model_learning.linear.analyzer import RewardModelAnalyzer, OUTPUT_DIR, \
     NUM_TRAJECTORIES, TRAJ_LENGTH, HORIZON, MAX_EPOCHS, LEARNING_RATE, NORM_THETA, PRUNE_THRESHOLD, DIFF_THRESHOLD, \
-    PROCESSES, IMG_FORMAT, SEED
+    PROCESSES, PIPELINE, IMG_FORMAT, SEED
 
 __author__ = 'Pedro Sequeira'
 __email__ = 'pedrodbs@gmail.com'
@@ -76,6 +76,8 @@ if __name__ == '__main__':
 
     parser.add_argument('-p', '--processes', type=none_or_int, default=PROCESSES,
                         help='Number of processes/cores to use. If unspecified, all available cores will be used')
+    parser.add_argument('-pl', '--pipeline', type=str2bool, default=PIPELINE,
+                        help='Whether to replay, plot and sample the next file while optimizing the previous one.')
     parser.add_argument('-v', '--verbosity', action='count', default=0, help='Verbosity level.')
     parser.add_argument('--format', help='Format of images', default=IMG_FORMAT)
     parser.add_argument('-s', '--seed', type=int, default=SEED, help='Seed for random number generation.')
@@ -127,6 +129,7 @@ if __name__ == '__main__':
         seed=args.seed,
         verbosity=args.verbosity,
         processes=args.processes,
+        pipeline=args.pipeline,
         img_format=args.format
     )
     analyzer.process_files()
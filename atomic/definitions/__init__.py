@@ -1,5 +1,7 @@
 from enum import IntEnum
 
+from atomic.definitions.timestamps import timer_seconds
+
 
 class Directions(IntEnum):
     N = 0
@@ -22,12 +24,7 @@ INJECT_PSYCH_ACTIONS = False
 
 def extract_time(msg):
     ## If malformed time, skip
-    nums = msg['mission_timer'].split(':')
-    if any(not n.strip().isdigit() for n in nums):
+    remaining = timer_seconds(msg['mission_timer'])
+    if remaining is None:
         return None
-        
-    
-    ## Extract time
-    ts = [int(n) for n in nums]
-    timeInSec = MISSION_DURATION - (ts[0] * 60) - ts[1]
-    return timeInSec 
\ No newline at end of file
+    return MISSION_DURATION - remaining
@@ -1,5 +1,10 @@
+import functools
+import hashlib
 import logging
+import os
 import pathlib
+import pickle
+import tempfile
 import pandas as pd
 from collections import OrderedDict
 from atomic.definitions import Directions
@@ -12,8 +17,94 @@ FALCON_COORDS_FILE = str(MAPS_DIR / 'ASIST_FalconMap_Rooms_v1.1_EMH_OCN_VU-coord
 FALCON_PORTALS_FILE = str(MAPS_DIR / 'ASIST_FalconMap_Portals_v1.1_EMH_OCN_VU.csv')
 FALCON_ROOMS_FILE = str(MAPS_DIR / 'ASIST_FalconMap_Rooms_v1.1_EMH_OCN_VU.csv')
 
+# Directory of the parsed map tables shared across processes (empty to keep them only in memory)
+MAP_CACHE_DIR = os.environ.get('ATOMIC_MAP_CACHE', os.path.join(tempfile.gettempdir(), 'atomic_map_cache'))
+# Bump whenever the parsing of the map files changes
+MAP_CACHE_VERSION = 1
+
+# Tables parsed (or loaded) so far in this process, by kind and file, with the file's (mtime, size) at the time
+_tables = {}
+# Maps created so far in this process, by name and files, with the (mtime, size) of their files at the time
+_maps = {}
+
+
+class ReadOnlyDict(dict):
+    """
+    A dictionary shared by every user of a cached map, so it cannot be modified (copy it first)
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(f'{self.__class__.__name__} cannot be modified')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def copy(self):
+        return dict(self)
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+
+def read_only(table):
+    """
+    :return: a copy of the given table made of read-only dictionaries and tuples
+    """
+    if isinstance(table, dict):
+        return ReadOnlyDict((key, read_only(value)) for key, value in table.items())
+    elif isinstance(table, list):
+        return tuple(read_only(value) for value in table)
+    return table
+
+
+def file_stamp(fname):
+    stat = os.stat(fname)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_table(kind, fname, parse, logger=logging):
+    """
+    :param kind: the name of the kind of table in the file (e.g., adjacency)
+    :param parse: function returning the table in the file given as its fname keyword argument
+    :return: the read-only table in the given file, parsed only if neither this process nor the on-disk cache has
+    seen its current contents
+    """
+    if fname is None:
+        return None
+    stamp = file_stamp(fname)
+    entry = _tables.get((kind, fname))
+    if entry is not None and entry[0] == stamp:
+        return entry[1]
+    with open(fname, 'rb') as table_file:
+        digest = hashlib.sha256(table_file.read()).hexdigest()
+    cache_file = os.path.join(MAP_CACHE_DIR, f'{kind}_{MAP_CACHE_VERSION}_{digest}.pkl') if MAP_CACHE_DIR else None
+    table = None
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as table_file:
+                table = pickle.load(table_file)
+        except Exception:
+            logger.warning(f'Unable to load cached {kind} table of {fname}')
+    if table is None:
+        table = read_only(parse(fname=fname))
+        if cache_file:
+            try:
+                os.makedirs(MAP_CACHE_DIR, exist_ok=True)
+                # Written to a temporary file first, so concurrent processes never read a partial table
+                fd, tmp_name = tempfile.mkstemp(dir=MAP_CACHE_DIR, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as table_file:
+                    pickle.dump(table, table_file, pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_name, cache_file)
+            except OSError:
+                logger.warning(f'Unable to cache {kind} table of {fname} in {MAP_CACHE_DIR}')
+    _tables[(kind, fname)] = (stamp, table)
+    return table
+
 
 class MapData(object):
+    """
+    The tables of a map, shared (read-only) by everyone given the map by get_map
+    """
+
     def __init__(self, name, adjacency_file, room_file, victim_file, coords_file, portals_file, logger=logging):
         self.name = name
         self.adjacency_file = adjacency_file
@@ -23,45 +114,62 @@ class MapData(object):
         self.portals_file = portals_file
 
         # gets map data from the different files
-        self.adjacency = getSandRMap(fname=adjacency_file, logger=logger)
-        self.rooms = set(self.adjacency.keys())
-        self.rooms_list = list(self.rooms)
-        self.victims = getSandRVictims(fname=victim_file)
-        self.coordinates = getSandRCoords(fname=coords_file)
+        self.adjacency = load_table('adjacency', adjacency_file,
+                                    functools.partial(getSandRMap, logger=logger), logger)
+        self.rooms = frozenset(self.adjacency.keys())
+        self.rooms_list = tuple(self.rooms)
+        self.victims = load_table('victims', victim_file, getSandRVictims, logger)
+        self.coordinates = load_table('coordinates', coords_file, getSandRCoords, logger)
         self.init_loc = self.rooms_list[0]
 
 
+def get_map(name, adjacency_file, room_file, victim_file, coords_file, portals_file, logger=logging):
+    """
+    :return: the map with the given files, created only once per process (unless any of its files change)
+    :rtype: MapData
+    """
+    files = (adjacency_file, room_file, victim_file, coords_file, portals_file)
+    stamps = tuple(None if fname is None else file_stamp(fname) for fname in (adjacency_file, victim_file, coords_file))
+    entry = _maps.get((name, files))
+    if entry is None or entry[0] != stamps:
+        entry = _maps[(name, files)] = (stamps, MapData(name, *files, logger=logger))
+    return entry[1]
+
+
 def get_default_maps(logger=logging):
+    """
+    :return: the default maps, parsed only once per process and shared (read-only) by every caller
+    """
     return {
-#        'sparky': MapData('sparky', str(MAPS_DIR / 'sparky_adjacency.csv'), None,
+#        'sparky': get_map('sparky', str(MAPS_DIR / 'sparky_adjacency.csv'), None,
 #                          str(MAPS_DIR / 'sparky_vic_locs.csv'),
 #                          str(MAPS_DIR / 'sparky_coords.csv'), None, logger),
-#        'falcon': MapData('falcon', str(MAPS_DIR / 'falcon_adjacency_v1.1_OCN.csv'), None,
+#        'falcon': get_map('falcon', str(MAPS_DIR / 'falcon_adjacency_v1.1_OCN.csv'), None,
 #                          str(MAPS_DIR / 'falcon_vic_locs_v1.1_OCN.csv'),
 #                          FALCON_COORDS_FILE, None, logger),
-        'FalconEasy': MapData('FalconEasy',
+        'FalconEasy': get_map('FalconEasy',
                               str(FALCON_MAP_DIR / 'falcon_easy_adjacency.csv'), FALCON_ROOMS_FILE,
                               str(FALCON_MAP_DIR / 'ASIST_FalconMap_Easy_Victims_v1.1_OCN_VU.csv'),
                               FALCON_COORDS_FILE, FALCON_PORTALS_FILE, logger),
-        'FalconMed': MapData('FalconMed',
+        'FalconMed': get_map('FalconMed',
                              str(FALCON_MAP_DIR / 'falcon_medium_adjacency.csv'), FALCON_ROOMS_FILE,
                              str(FALCON_MAP_DIR / 'ASIST_FalconMap_Medium_Victims_v1.1_OCN_VU.csv'),
                              FALCON_COORDS_FILE, FALCON_PORTALS_FILE, logger),
-        'FalconHard': MapData('FalconHard',
+        'FalconHard': get_map('FalconHard',
                               str(FALCON_MAP_DIR / 'falcon_hard_adjacency.csv'), FALCON_ROOMS_FILE,
                               str(FALCON_MAP_DIR / 'ASIST_FalconMap_Hard_Victims_v1.1_OCN_VU.csv'),
                               FALCON_COORDS_FILE, FALCON_PORTALS_FILE, logger),
-        'saturnA': MapData('saturnA',
+        'saturnA': get_map('saturnA',
                            str(SATURN_MAP_DIR / 'coordsNeighbs.csv'), 
                            str(SATURN_MAP_DIR / 'coordsNeighbs.csv'),
                            str(SATURN_MAP_DIR / 'saturnAPilotVictims.csv'), None, 
                            str(SATURN_MAP_DIR / 'saturn_doors.csv'), logger),   
-        'saturnB': MapData('saturnB',
+        'saturnB': get_map('saturnB',
                            str(SATURN_MAP_DIR / 'coordsNeighbs.csv'), 
                            str(SATURN_MAP_DIR / 'coordsNeighbs.csv'),
                            str(SATURN_MAP_DIR / 'saturnBPilotVictims.csv'), None, 
                            str(SATURN_MAP_DIR / 'saturn_doors.csv'), logger),                           
-#        'simple': MapData('simple',
+#        'simple': get_map('simple',
 #            str(MAPS_DIR / 'simple_adjacency.csv'), None, str(MAPS_DIR / 'simple_victims.csv'), None, None, logger),
     }
 
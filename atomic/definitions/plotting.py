@@ -13,6 +13,7 @@ from psychsim.world import World
 from model_learning.util.plot import distinct_colors, plot_bar
 from atomic.definitions.features import get_num_victims_location_key, get_location_key
 from atomic.definitions.victims import GOLD_STR, GREEN_STR, RED_STR, WHITE_STR
+from atomic.model_learning.snapshots import get_step_state
 from atomic.model_learning.stats import get_actions_frequencies, get_locations_frequencies
 
 __author__ = 'Pedro Sequeira'
@@ -103,13 +104,15 @@ def plot_trajectories(agents, trajectories, locations, neighbors, output_img, co
     t_colors = distinct_colors(len(trajectories))
     for i, trajectory in enumerate(trajectories):
         loc_feat = get_location_key(agents[i])
-        state = copy.deepcopy(trajectory[0][0].state)
+        world, state = get_step_state(trajectory, 0)
+        state = copy.deepcopy(state)
         state.select(True)  # select most likely state
-        source = trajectory[0][0].getFeature(loc_feat, state, True)
+        source = world.getFeature(loc_feat, state, True)
         for t in range(1, len(trajectory)):
-            state = copy.deepcopy(trajectory[t][0].state)
+            world, state = get_step_state(trajectory, t)
+            state = copy.deepcopy(state)
             state.select(True)
-            target = trajectory[t][0].getFeature(loc_feat, state, True)
+            target = world.getFeature(loc_feat, state, True)
             label = (agents[i].name if multiagent else 'T{:02d}'.format(i)) if t == len(trajectory) - 1 else None
             g.add_edge(source, target, color=color_to_html_format(t_colors[i]),
                        arrow_size=EDGE_ARROW_SIZE, arrow_width=EDGE_ARROW_WIDTH,
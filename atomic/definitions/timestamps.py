@@ -0,0 +1,154 @@
+"""
+Parsing of the two clocks carried by testbed messages: the ISO-8601 timestamp (e.g., 2021-06-07T19:34:23.123Z) and the
+mission timer (minutes : seconds remaining, e.g., 14 : 59).
+
+Both have a fixed format, so they are parsed by slicing rather than by a general-purpose date parser (which remains the
+fallback for timestamps in any other format), and both are memoized, since the same timer value (and, across the ACs,
+the same message) comes up again and again.  stamp_message parses the clocks of a message once, ahead of its consumers
+(e.g., in the decoder stage of the ingestion pipeline), and keeps them aside, leaving the message itself unchanged, so
+that every later consumer finds them until the message is released:
+
+    stamp_message(msg)
+    message_epoch_ms(msg)  # milliseconds since the epoch (None if no timestamp)
+    message_timer(msg)  # (minutes, seconds) remaining (None if no well-formed mission timer)
+    release_message(msg)
+
+Consumers of messages that were never stamped get the same clocks, parsed on the spot.
+"""
+import datetime
+import functools
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+_DAY_MS = 24*60*60*1000
+
+# The clocks of the messages stamped and not yet released, by id (along with the message itself, which keeps the id
+# from being reused while the message is stamped)
+_stamped = {}
+
+
+@functools.lru_cache(maxsize=64)
+def _date_ms(date):
+    return (datetime.date(int(date[0:4]), int(date[5:7]), int(date[8:10])).toordinal() - _EPOCH_ORDINAL) * _DAY_MS
+
+
+def _parse_iso(stamp):
+    if stamp[4] != '-' or stamp[7] != '-' or stamp[10] not in 'T ' or stamp[13] != ':' or stamp[16] != ':':
+        return None
+    millis = _date_ms(stamp[:10]) + int(stamp[11:13])*3600000 + int(stamp[14:16])*60000 + int(stamp[17:19])*1000
+    end = 19
+    if len(stamp) > end and stamp[end] == '.':
+        end += 1
+        while end < len(stamp) and stamp[end].isdigit():
+            end += 1
+        millis += float(f'0{stamp[19:end]}')*1000
+    offset = stamp[end:]
+    if offset == '' or offset == 'Z':
+        return millis
+    elif len(offset) == 6 and offset[0] in '+-' and offset[3] == ':':
+        minutes = int(offset[1:3])*60 + int(offset[4:6])
+        return millis - minutes*60000 if offset[0] == '+' else millis + minutes*60000
+    return None
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_timestamp(stamp):
+    """
+    :return: the milliseconds since the epoch of the given timestamp (taken as UTC if it has no time zone)
+    :rtype: float
+    """
+    try:
+        millis = _parse_iso(stamp)
+    except (IndexError, ValueError):
+        millis = None
+    if millis is None:
+        # Not the testbed format
+        from dateutil import parser
+        moment = parser.parse(stamp)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=datetime.timezone.utc)
+        millis = moment.timestamp()*1000
+    return millis
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_timer(timer):
+    """
+    :return: the minutes and seconds remaining on the given mission timer (None if malformed, e.g., "Mission Timer not
+    initialized.")
+    :rtype: (int, int)
+    """
+    nums = timer.split(':')
+    if len(nums) < 2 or any(not n.strip().isdigit() for n in nums):
+        return None
+    return int(nums[0]), int(nums[1])
+
+
+def timer_seconds(timer):
+    """
+    :return: the seconds remaining on the given mission timer (None if malformed)
+    :rtype: int
+    """
+    remaining = parse_timer(timer)
+    return None if remaining is None else remaining[0]*60 + remaining[1]
+
+
+def parse_clocks(msg):
+    """
+    Parses the clocks of the given message, either as read from the message bus (with the timestamp in its msg part and
+    the mission timer in its data) or as flattened by the JSON parser
+    :return: the milliseconds since the epoch (None if no timestamp) and the minutes and seconds remaining on the
+    mission timer (None if no well-formed mission timer)
+    :rtype: (float, (int, int))
+    """
+    header = msg.get('msg')
+    data = msg.get('data')
+    stamp = header.get('timestamp') if isinstance(header, dict) else msg.get('timestamp')
+    timer = data.get('mission_timer') if isinstance(data, dict) else msg.get('mission_timer')
+    try:
+        millis = None if stamp is None else parse_timestamp(stamp)
+    except (TypeError, ValueError, OverflowError):
+        millis = None
+    return millis, parse_timer(timer) if isinstance(timer, str) else None
+
+
+def stamp_message(msg):
+    """
+    Parses the clocks of the given message and keeps them aside until release_message (the message is unchanged)
+    :return: the clocks, as returned by parse_clocks
+    :rtype: (float, (int, int))
+    """
+    clocks = parse_clocks(msg)
+    _stamped[id(msg)] = (msg, clocks)
+    return clocks
+
+
+def release_message(msg):
+    """
+    Drops the clocks kept aside for the given message (if stamped)
+    """
+    _stamped.pop(id(msg), None)
+
+
+def message_clocks(msg):
+    """
+    :return: the clocks of the given message, as kept aside by stamp_message (or parsed now, if not stamped)
+    :rtype: (float, (int, int))
+    """
+    stamped = _stamped.get(id(msg))
+    if stamped is not None and stamped[0] is msg:
+        return stamped[1]
+    return parse_clocks(msg)
+
+
+def message_epoch_ms(msg):
+    """
+    :return: the milliseconds since the epoch of the given message
+    """
+    return message_clocks(msg)[0]
+
+
+def message_timer(msg):
+    """
+    :return: the minutes and seconds remaining on the mission timer of the given message
+    """
+    return message_clocks(msg)[1]
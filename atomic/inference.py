@@ -5,8 +5,10 @@ to improve task performance
 """
 import copy
 
+import numpy as np
+
 from psychsim.probability import Distribution
-from psychsim.pwl import modelKey, rewardKey, isStateKey, state2agent, state2feature
+from psychsim.pwl import CONSTANT, modelKey, rewardKey, isStateKey, state2agent, state2feature
 from psychsim.action import ActionSet
 
 # Possible player model parameterizations
@@ -94,6 +96,124 @@ def create_player_models(world, players, victims=None):
         models[player_name] = new_models
     return models
 
+def linear_reward(agent, model):
+    """
+    :return: the weight on each state feature if the given model's reward is a single linear function of the state
+    (as for the reward variants built by create_player_models), otherwise None
+    :rtype: Dict[str, float]
+    """
+    R = agent.getReward(model)
+    if not R.isLeaf():
+        return None
+    return dict(R.getLeaf()[rewardKey(agent.name, True)])
+
+def project_features(agent, belief, action, horizon, features):
+    """
+    Projects the given belief forward over the horizon, as in Agent.value, with the agent performing the given action
+    in its next turn
+    :return: the expected value of each of the given features in the state reached at each step, and the projected
+    belief state
+    :rtype: (List[Dict[str, float]], VectorDistributionSet)
+    """
+    current = copy.deepcopy(belief)
+    subkeys = belief.keys()
+    start = {agent.name: action}
+    steps = []
+    for t in range(horizon):
+        turn = agent.world.next(current)
+        actions = {name: start.pop(name) for name in turn if name in start}
+        agent.world.step(actions, current, keySubset=subkeys, horizon=horizon-t)
+        steps.append({key: 1. if key == CONSTANT else current[key].expectation() for key in features})
+    return steps, current
+
+# (agent, horizon) of the groups of models whose batched decision did not match Agent.decide
+_UNBATCHED = set()
+
+def decide_models(agent, models, state=None, check=True, logger=None):
+    """
+    Computes the decision (with selection='distribution') of the given agent under each of the given models, with the
+    same result as calling Agent.decide once per model.  Models that differ only in their (linear) reward and
+    rationality share the same beliefs, horizon, and legal actions, so the projection of each action over the horizon
+    is done once for all of them, and the value of each action under all of the reward vectors is then computed
+    together.  Any other model (e.g., with a policy, a value function, a nonlinear reward, or a discount other than 1,
+    whose weighting of later steps depends on the version of PsychSim) falls back to its own call to Agent.decide.
+    :param models: the names of the models to decide under
+    :type models: List[str]
+    :param state: the current state (default is the world state)
+    :param check: If True, also call Agent.decide for one model of each group and, if its decision differs from the
+    batched one, decide under the models of that group (and any later group with the same horizon) with Agent.decide
+    from then on
+    :type check: bool
+    :return: model name -> decision (a dictionary with a Distribution over actions under 'action')
+    :rtype: Dict[str, dict]
+    """
+    if state is None:
+        state = agent.world.state
+    decisions = {}
+    groups = {}
+    for model in models:
+        weights = None
+        if not agent.getAttribute('policy', model) and not agent.getAttribute('V', model):
+            weights = linear_reward(agent, model)
+        signature = (agent.name, agent.getAttribute('horizon', model))
+        if weights is None or agent.getAttribute('discount', model) != 1 or signature in _UNBATCHED:
+            decisions[model] = agent.decide(state, model=model, selection='distribution')
+        else:
+            # Models share a projection if they share a belief state and horizon
+            key = (id(agent.getAttribute('beliefs', model)),) + signature
+            groups.setdefault(key, []).append((model, weights))
+    for (beliefs, name, horizon), members in groups.items():
+        first = members[0][0]
+        belief = agent.getBelief(state, first)
+        actions = agent.getLegalActions(belief)
+        features = sorted({key for model, weights in members for key in weights})
+        if len(actions) < 2 or any(key != CONSTANT and key not in belief for key in features):
+            # Nothing to share
+            for model, weights in members:
+                decisions[model] = agent.decide(state, model=model, selection='distribution')
+            continue
+        actions = sorted(actions)
+        projections = [project_features(agent, belief, action, horizon, features) for action in actions]
+        # One row of reward weights per model; the projected features of each action at each step
+        W = np.array([[weights.get(key, 0.) for key in features] for model, weights in members])
+        F = np.array([[[step[key] for key in features] for step in steps] for steps, final in projections])
+        # Expected reward of each model for each action at each step, summed over the horizon
+        R = np.einsum('mf,atf->mat', W, F)
+        EV = R.sum(axis=2)
+        batch = {}
+        for row, (model, weights) in enumerate(members):
+            # The same structure as Agent.value (where every entry of __S__ is the one state projected in place)
+            V = {action: {'__EV__': EV[row, col], '__ER__': list(R[row, col]), '__S__': [final]*horizon,
+                          '__beliefs__': final}
+                 for col, (action, (steps, final)) in enumerate(zip(actions, projections))}
+            values = {action: entry['__EV__'] for action, entry in V.items()}
+            batch[model] = {'V*': max(values.values()), 'V': V,
+                            'action': Distribution(values, agent.getAttribute('rationality', model))}
+        if check:
+            expected = agent.decide(state, model=first, selection='distribution')
+            if not same_decision(expected, batch[first]):
+                if logger is not None:
+                    logger.warning(f'Batched decision of {agent.name} under {first} differs from Agent.decide, '
+                                   f'deciding under its models of horizon {horizon} one at a time')
+                _UNBATCHED.add((name, horizon))
+                batch = {model: agent.decide(state, model=model, selection='distribution')
+                         for model, weights in members if model != first}
+            batch[first] = expected
+        decisions.update(batch)
+    return decisions
+
+def same_decision(expected, actual, tolerance=1e-6):
+    """
+    :return: True iff the two decisions have the same distribution over actions (up to the given tolerance)
+    :rtype: bool
+    """
+    expected, actual = expected['action'], actual['action']
+    if not isinstance(expected, Distribution):
+        expected = Distribution({expected: 1})
+    if set(expected.domain()) != set(actual.domain()):
+        return False
+    return all(abs(expected[action] - actual[action]) < tolerance for action in expected.domain())
+
 def set_player_models(world, observer_name, players, victims=None):
     """
     :param world: the PsychSim World
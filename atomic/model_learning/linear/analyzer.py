@@ -2,8 +2,11 @@ import logging
 import os
 import copy
 import random
+import multiprocessing as mp
 import numpy as np
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from model_learning.util.plot import plot_bar
 from model_learning.algorithms.max_entropy import MaxEntRewardLearning, THETA_STR
 from model_learning.trajectory import sample_spread_sub_trajectories
@@ -11,11 +14,13 @@ from model_learning.util.io import get_file_name_without_extension, create_clear
     load_object
 from atomic.definitions.features import get_mission_seconds_key
 from atomic.model_learning.parse_processor import TrajectoryParseProcessor
+from atomic.model_learning.snapshots import get_step_feature
 from atomic.parsing.replayer import Replayer, SUBJECT_ID_TAG, COND_MAP_TAG
 from atomic.definitions.map_utils import get_default_maps
 from atomic.definitions.plotting import plot_environment, plot_trajectories, plot_agent_location_frequencies, \
     plot_agent_action_frequencies
 from atomic.model_learning.linear.rewards import create_reward_vector
+from atomic.model_learning.linear.scheduler import LearningScheduler
 
 __author__ = 'Pedro Sequeira'
 __email__ = 'pedrodbs@gmail.com'
@@ -36,9 +41,22 @@ DIFF_THRESHOLD = 5e-3  # 1e-3
 # data params
 OUTPUT_DIR = 'output/linear-reward-learning'
 PROCESSES = None
+PIPELINE = False
 IMG_FORMAT = 'pdf'  # 'png'
+# a pickled `WorldSnapshots` (versioned, see `WorldSnapshots.VERSION`), or a list of (world, action) pairs if saved
+# by earlier versions (both are loaded by `_check_results`)
 TRAJECTORY_FILE_NAME = 'trajectory.pkl.gz'
 RESULTS_FILE_NAME = 'result.pkl.gz'
+UTILIZATION_FILE_NAME = 'utilization.json'
+LOG_FILE_NAME = 'learning.log'
+LOG_FORMAT = '[%(asctime)s %(levelname)s] %(message)s'
+
+# the per-file state that saving the results of a file needs, once the analyzer has moved on to later files
+FILE_ATTRIBUTES = ['file_name', 'parser', 'map_table', 'conditions', 'triage_agent', '_output_dir']
+
+# pipelined optimizations run in a worker process started from a server process (or a fresh interpreter), since
+# forking this one, which then has other threads, is not safe
+LEARNER_START_METHOD = 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
 
 AGENT_RATIONALITY = 1 / 0.1  # inverse temperature
 
@@ -52,7 +70,7 @@ class RewardModelAnalyzer(Replayer):
                  num_trajectories=NUM_TRAJECTORIES, length=TRAJ_LENGTH,
                  normalize=NORM_THETA, learn_rate=LEARNING_RATE, epochs=MAX_EPOCHS,
                  diff=DIFF_THRESHOLD, prune=PRUNE_THRESHOLD, horizon=HORIZON,
-                 seed=0, verbosity=0, processes=PROCESSES, img_format=IMG_FORMAT):
+                 seed=0, verbosity=0, processes=PROCESSES, pipeline=PIPELINE, img_format=IMG_FORMAT):
         """
         Creates a new reward model learning replayer.
         :param list[str] replays: list of replay log files to process containing the player data.
@@ -70,6 +88,8 @@ class RewardModelAnalyzer(Replayer):
         :param int seed: seed for random number generation.
         :param int verbosity: verbosity level.
         :param int processes: the number of processes/cores to use. If `None`, all available cores will be used.
+        :param bool pipeline: whether to replay, plot and sample the next file while optimizing the reward of the
+        previous one (otherwise each file is fully processed before the next).
         :param str img_format: the format/extension of result images to be saved.
         """
         if maps is None:
@@ -91,6 +111,7 @@ class RewardModelAnalyzer(Replayer):
         self.verbosity = verbosity
         self.processes = processes
         self.img_format = img_format
+        self.scheduler = LearningScheduler(pipeline)
 
         self.results = {}
         self.trajectories = {}
@@ -99,6 +120,21 @@ class RewardModelAnalyzer(Replayer):
         self.trial_conditions = {}
 
         self._output_dir = None
+        self._learner = None
+
+    def process_files(self, *args, **kwargs):
+        self.scheduler = LearningScheduler(self.scheduler.pipeline)
+        try:
+            # everything done on the main thread besides preparing, saving and waiting for the optimization
+            with self.scheduler.phase('replay'):
+                super().process_files(*args, **kwargs)
+            self.scheduler.finish()
+        finally:
+            self.scheduler.shutdown()
+            if self._learner is not None:
+                self._learner.shutdown()
+                self._learner = None
+        self.scheduler.save_utilization(os.path.join(self.output, UTILIZATION_FILE_NAME))
 
     def _check_results(self):
 
@@ -145,7 +181,7 @@ class RewardModelAnalyzer(Replayer):
         create_clear_dir(self._output_dir, self.clear)
 
         # sets up log to file
-        change_log_handler(os.path.join(self._output_dir, 'learning.log'), self.verbosity)
+        change_log_handler(os.path.join(self._output_dir, LOG_FILE_NAME), self.verbosity)
 
         # replays trajectory
         super().replay(duration, logger)
@@ -185,30 +221,77 @@ class RewardModelAnalyzer(Replayer):
         locations = self.map_table.rooms_list
         coordinates = self.map_table.coordinates
 
-        # print map
-        plot_environment(self.world, locations, neighbors,
-                         os.path.join(self._output_dir, 'env.{}'.format(self.img_format)), coordinates)
+        with self.scheduler.phase('prepare'):
+            # print map
+            plot_environment(self.world, locations, neighbors,
+                             os.path.join(self._output_dir, 'env.{}'.format(self.img_format)), coordinates)
 
-        self.plot_player_data(coordinates, locations, neighbors, trajectory)
+            self.plot_player_data(coordinates, locations, neighbors, trajectory)
 
-        trajectories = self.collect_sub_trajectories(coordinates, locations, neighbors, trajectory)
+            trajectories = self.collect_sub_trajectories(coordinates, locations, neighbors, trajectory)
 
-        # create reward vector and optimize reward weights via MaxEnt IRL
-        logging.info('=================================')
-        logging.info('Starting Maximum Entropy IRL optimization using {} processes...'.format(
-            os.cpu_count() if self.processes is None else self.processes))
-        rwd_vector = create_reward_vector(
-            self.triage_agent, locations, self.world_map.moveActions[self.triage_agent.name])
+            # create reward vector and optimize reward weights via MaxEnt IRL
+            rwd_vector = create_reward_vector(
+                self.triage_agent, locations, self.world_map.moveActions[self.triage_agent.name])
+
+            alg = MaxEntRewardLearning(
+                'max-ent', self.triage_agent.name, rwd_vector, self.processes, self.normalize, self.learn_rate,
+                self.epochs, self.diff, True, self.prune, self.horizon, self.seed)
+
+        file_name = self.parser.filename
+
+        def save(result):
+            self.save_results(alg, result, rwd_vector, trajectory)
+            logging.info('Finished processing {}!'.format(file_name))
+            logging.info('=================================\n\n')
+
+        if not self.scheduler.pipeline:
+            self.scheduler.submit(
+                file_name, lambda: _learn(alg, trajectories, file_name, self.processes, self.verbosity), save)
+            return
 
-        alg = MaxEntRewardLearning(
-            'max-ent', self.triage_agent.name, rwd_vector, self.processes, self.normalize, self.learn_rate, self.epochs,
-            self.diff, True, self.prune, self.horizon, self.seed)
-        result = alg.learn(trajectories, self.parser.filename, self.verbosity > 0)
+        # the next file is replayed while optimizing, so keep what saving the results needs from this one
+        state = {name: getattr(self, name) for name in FILE_ATTRIBUTES}
+        log_file = os.path.join(self._output_dir, LOG_FILE_NAME)
+        if self._learner is None:
+            self._learner = ProcessPoolExecutor(1, mp_context=mp.get_context(LEARNER_START_METHOD))
 
-        self.save_results(alg, result, rwd_vector, trajectory)
+        def learn():
+            return self._learner.submit(
+                _learn, alg, trajectories, file_name, self.processes, self.verbosity, log_file).result()
 
-        logging.info('Finished processing {}!'.format(self.parser.filename))
-        logging.info('=================================\n\n')
+        def save_later(result):
+            with self._as_file(state, log_file):
+                save(result)
+
+        self.scheduler.submit(file_name, learn, save_later)
+
+    @contextmanager
+    def _as_file(self, state, log_file):
+        """
+        Restores the state of an earlier file (and its log) while saving its results.
+        :param dict state: the values of `FILE_ATTRIBUTES` for the file.
+        :param str log_file: the path to the file's log.
+        """
+        current = {name: getattr(self, name) for name in state}
+        log = logging.getLogger()
+        handlers = [handler for handler in log.handlers if isinstance(handler, logging.FileHandler)]
+        file_handler = logging.FileHandler(log_file, 'a')
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        for handler in handlers:
+            log.removeHandler(handler)
+        log.addHandler(file_handler)
+        for name, value in state.items():
+            setattr(self, name, value)
+        try:
+            yield
+        finally:
+            for name, value in current.items():
+                setattr(self, name, value)
+            log.removeHandler(file_handler)
+            file_handler.close()
+            for handler in handlers:
+                log.addHandler(handler)
 
     def plot_player_data(self, coordinates, locations, neighbors, trajectory):
 
@@ -230,12 +313,13 @@ class RewardModelAnalyzer(Replayer):
         # only consider first half of mission
         idx = 0
         for idx in range(len(trajectory)):
-            secs = trajectory[idx][0].getFeature(get_mission_seconds_key(), unique=True)
+            secs = get_step_feature(trajectory, idx, get_mission_seconds_key(), unique=True)
             if secs >= 5 * 60:
                 break
 
-        # collect sub-trajectories from player's trajectory
-        trajectories = sample_spread_sub_trajectories(trajectory[:idx], self.num_trajectories, self.length)
+        # collect sub-trajectories from player's trajectory (rebuilding the worlds of only the sampled steps)
+        trajectories = [list(sub_trajectory) for sub_trajectory in
+                        sample_spread_sub_trajectories(trajectory[:idx], self.num_trajectories, self.length)]
 
         logging.info('Collected {} trajectories of length {} from original trajectory (length {}).'.format(
             self.num_trajectories, self.length, idx + 1))
@@ -263,3 +347,33 @@ class RewardModelAnalyzer(Replayer):
             logging.info('Optimized reward weights: {}'.format(rwd_weights))
         plot_bar(OrderedDict(zip(rwd_vector.names, rwd_weights)), 'Optimal Reward Weights $θ^*$',
                  os.path.join(self._output_dir, 'learner-theta.{}'.format(self.img_format)), plot_mean=False)
+
+
+def _learn(alg, trajectories, file_name, processes, verbosity, log_file=None):
+    """
+    Optimizes the reward weights of a file's player via MaxEnt IRL.
+    :param MaxEntRewardLearning alg: the learning algorithm.
+    :param list trajectories: the sub-trajectories sampled from the player's trajectory.
+    :param str file_name: the name of the file whose data is being optimized.
+    :param int processes: the number of processes used by the algorithm, `None` for all CPUs.
+    :param int verbosity: the verbosity level.
+    :param str log_file: the path to the file's log, given when running in a worker process of its own (whose
+    messages would otherwise be lost), where the log is then appended to.
+    :rtype: ModelLearningResult
+    :return: the result of the optimization.
+    """
+    if log_file is not None:
+        log = logging.getLogger()
+        for handler in log.handlers[:]:
+            log.removeHandler(handler)
+            handler.close()
+        formatter = logging.Formatter(LOG_FORMAT)
+        for handler in [logging.FileHandler(log_file, 'a'), logging.StreamHandler()]:
+            handler.setFormatter(formatter)
+            log.addHandler(handler)
+        log.level = logging.WARN if verbosity == 0 else logging.INFO if verbosity == 1 else logging.DEBUG
+
+    logging.info('=================================')
+    logging.info('Starting Maximum Entropy IRL optimization using {} processes...'.format(
+        os.cpu_count() if processes is None else processes))
+    return alg.learn(trajectories, file_name, verbosity > 0)
@@ -13,6 +13,7 @@ from atomic.parsing.replayer import SUBJECT_ID_TAG, COND_MAP_TAG, TRIAL_TAG, CON
 from atomic.definitions.world_map import WorldMap
 from atomic.model_learning.linear.rewards import create_reward_vector
 from atomic.model_learning.linear.analyzer import RewardModelAnalyzer
+from atomic.model_learning.snapshots import get_step_state
 
 __author__ = 'Pedro Sequeira'
 __email__ = 'pedrodbs@gmail.com'
@@ -75,7 +76,7 @@ def cluster_reward_weights(analyzer, output_dir,
 
     # gets rwd feature names with dummy info
     agent_name = analyzer.agent_names[file_names[0]]
-    agent = analyzer.trajectories[file_names[0]][-1][0].agents[agent_name]
+    agent = get_step_state(analyzer.trajectories[file_names[0]], -1)[0].agents[agent_name]
     locations = analyzer.map_tables[file_names[0]].rooms_list
     rwd_feat_names = create_reward_vector(agent, locations, WorldMap.get_move_actions(agent)).names
 
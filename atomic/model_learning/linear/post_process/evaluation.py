@@ -6,6 +6,7 @@ from atomic.definitions.world_map import WorldMap
 from atomic.model_learning.linear.post_process.clustering import load_cluster_reward_weights, load_datapoints_clusters
 from atomic.model_learning.linear.rewards import create_reward_vector
 from atomic.model_learning.linear.analyzer import RewardModelAnalyzer
+from atomic.model_learning.snapshots import get_step_state
 from model_learning.algorithms.max_entropy import THETA_STR
 from model_learning.clustering.linear import save_mean_cluster_weights
 from model_learning.evaluation.linear import cross_evaluation
@@ -62,7 +63,7 @@ def evaluate_reward_models(analyzer, output_dir, cluster_rwds_file=None, datapoi
     # first gets data needed to compute players' "observed" policies
     trajectories = [analyzer.trajectories[filename] for filename in file_names]
     agent_names = [analyzer.agent_names[filename] for filename in file_names]
-    agents = [trajectories[i][-1][0].agents[agent_names[i]] for i in range(len(trajectories))]
+    agents = [get_step_state(trajectories[i], -1)[0].agents[agent_names[i]] for i in range(len(trajectories))]
     map_locs = [analyzer.map_tables[filename].rooms_list for filename in file_names]
     rwd_vectors = [create_reward_vector(agents[i], map_locs[i], WorldMap.get_move_actions(agents[i]))
                    for i in range(len(agents))]
@@ -7,6 +7,7 @@ from model_learning.util.plot import plot_bar
 from atomic.definitions.features import get_mission_seconds_key
 from atomic.definitions.plotting import plot_trajectories
 from atomic.model_learning.linear.analyzer import RewardModelAnalyzer
+from atomic.model_learning.snapshots import get_step_state
 from atomic.model_learning.stats import get_actions_frequencies, get_actions_durations, get_locations_frequencies
 
 __author__ = 'Pedro Sequeira'
@@ -42,7 +43,8 @@ def process_players_data(analyzer, output_dir, clear=False, verbosity=1):
         map_table = analyzer.map_tables[files[0]]
         locations = map_table.rooms_list
         trajectories = [analyzer.trajectories[filename] for filename in files]
-        agents = [trajectories[i][-1][0].agents[analyzer.agent_names[files[i]]] for i in range(len(files))]
+        agents = [get_step_state(trajectories[i], -1)[0].agents[analyzer.agent_names[files[i]]]
+                  for i in range(len(files))]
 
         # saves mean location frequencies
         location_data = get_locations_frequencies(trajectories, agents, locations)
@@ -65,7 +67,7 @@ def process_players_data(analyzer, output_dir, clear=False, verbosity=1):
         # saves all player trajectories
         plot_trajectories(agents, trajectories, locations, map_table.adjacency,
                           os.path.join(output_dir, '{}-trajectories.{}'.format(map_name, analyzer.img_format)),
-                          map_table.coordinates, title='Player Trajectories')
+                          map_table.coordinates, get_step_state(trajectories[0], -1)[1], title='Player Trajectories')
 
     # saves trajectory length
     traj_len_data = OrderedDict(
@@ -78,8 +80,8 @@ def process_players_data(analyzer, output_dir, clear=False, verbosity=1):
     mission_time_data = {}
     for file_name in file_names:
         mission_time_feat = get_mission_seconds_key()
-        world = analyzer.trajectories[file_name][-1][0]
-        state = copy.deepcopy(world.state)
+        world, state = get_step_state(analyzer.trajectories[file_name], -1)
+        state = copy.deepcopy(state)
         state.select(True)
         mission_time_data[analyzer.get_player_name(file_name)] = world.getFeature(mission_time_feat, state, True)
     mission_time_data = {name: mission_time_data[name] for name in sorted(mission_time_data)}
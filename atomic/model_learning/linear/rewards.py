@@ -44,10 +44,158 @@ def create_reward_vector(agent, locations, move_actions):
     features.extend([ActionLinearRewardFeature(
         'Move ' + next(iter(action))['object'], agent, action) for action in move_actions])
 
-    return LinearRewardVector(features)
+    return LocationRewardVector(features)
 
 
-class LocationVictimColorReward(LinearRewardFeature):
+class LocationRewardVector(LinearRewardVector):
+    """
+    A linear reward vector that computes the values of all its location-based features (see `LocationFeatureMatrix`)
+    together, for any number of states at once. The values of the other features are computed one at a time.
+    """
+
+    def __init__(self, rwd_features):
+        """
+        Creates a new reward vector with the given features.
+        :param list[LinearRewardFeature] rwd_features: the reward features.
+        """
+        super().__init__(rwd_features)
+        self._location_idxs = [i for i, feat in enumerate(rwd_features) if isinstance(feat, LocationCounterReward)]
+        self._other_feats = [(i, feat) for i, feat in enumerate(rwd_features)
+                             if not isinstance(feat, LocationCounterReward)]
+        self._num_feats = len(rwd_features)
+        self.location_matrix = LocationFeatureMatrix([rwd_features[i] for i in self._location_idxs]) \
+            if len(self._location_idxs) > 0 else None
+
+    def get_values(self, state):
+        return self.get_values_matrix([state])[0]
+
+    def get_values_matrix(self, states):
+        """
+        Gets the values of all the features in the given states.
+        :param list[VectorDistributionSet] states: the states.
+        :rtype: np.ndarray
+        :return: an array of shape (num_states, num_features) with the features' values in each state.
+        """
+        values = np.zeros((len(states), self._num_feats))
+        if self.location_matrix is not None:
+            values[:, self._location_idxs] = self.location_matrix.get_values(states)
+        for i, feat in self._other_feats:
+            values[:, i] = [feat.get_value(state) for state in states]
+        return values
+
+    def get_expected_values(self, states, probs):
+        """
+        Gets the expected values of the features over a distribution of states.
+        :param list[VectorDistributionSet] states: the states.
+        :param np.ndarray probs: the probability (or weight) of each state.
+        :rtype: np.ndarray
+        :return: an array of shape (num_features,) with the expected features' values.
+        """
+        return np.asarray(probs) @ self.get_values_matrix(states)
+
+
+class LocationFeatureMatrix(object):
+    """
+    Computes the values of location-based reward features (`LocationCounterReward`) in many states at once. Each state
+    is encoded by a dense row with the probability of the agent being in each location, and by a dense matrix with the
+    expected value of each feature's counter at each location the agent may be in. The features' values are then the
+    (location-wise) products of the two, summed over the locations. The agent's location values, and each feature's
+    counter at each location, are looked up once for all states, instead of in every state for every feature.
+    """
+
+    def __init__(self, features):
+        """
+        Creates a new feature matrix.
+        :param list[LocationCounterReward] features: the features, all over the location of the same agent.
+        """
+        self.features = features
+        self.world = features[0].world
+        self.location_feat = features[0].location_feat
+        assert all(feat.location_feat == self.location_feat for feat in features), \
+            'Features have to be over the same location feature'
+        self.locations = list(features[0].all_locations)
+        self.counter_keys = [[feat.counter_key(loc) for feat in features] for loc in self.locations]
+        self.counter_values = [feat.counter_value for feat in features]
+        self.normalize_factors = np.array([feat.normalize_factor for feat in features])
+        self._location_idxs = {loc: i for i, loc in enumerate(self.locations)}
+        self._value_idxs = {}
+
+    def _location_idx(self, value):
+        # gets index of location from its (float) value in a state
+        try:
+            return self._value_idxs[value]
+        except KeyError:
+            idx = self._value_idxs[value] = self._location_idxs[self.world.float2value(self.location_feat, value)]
+            return idx
+
+    def encode(self, states):
+        """
+        Encodes the given states.
+        :param list[VectorDistributionSet] states: the states.
+        :rtype: (np.ndarray, np.ndarray)
+        :return: a tuple (loc_probs, counters), where `loc_probs` has shape (num_states, num_locations) and contains
+        the probability of the agent being in each location, and `counters` has shape (num_states, num_locations,
+        num_features) and contains the expected value of each feature's counter at each location (only where the
+        location's probability is nonzero).
+        """
+        loc_probs = np.zeros((len(states), len(self.locations)))
+        counters = np.zeros((len(states), len(self.locations), len(self.features)))
+        # expected counter values by distribution, for the distributions shared among states (e.g., by snapshots)
+        expected = {}
+        for s, state in enumerate(states):
+            distributions = state.distributions
+            key_map = state.keyMap
+            for loc_kv, loc_p in distributions[key_map[self.location_feat]].items():
+                l = self._location_idx(loc_kv[self.location_feat])
+                if loc_probs[s, l] == 0:
+                    # expected counter values at this location (once, even if the location appears more than once)
+                    for f, key in enumerate(self.counter_keys[l]):
+                        dist = distributions[key_map[key]]
+                        try:
+                            counters[s, l, f] = expected[id(dist), l, f]
+                        except KeyError:
+                            counter_value = self.counter_values[f]
+                            counters[s, l, f] = expected[id(dist), l, f] = \
+                                sum(counter_value(kv[key]) * p for kv, p in dist.items())
+                loc_probs[s, l] += loc_p
+        return loc_probs, counters
+
+    def get_values(self, states):
+        """
+        Gets the values of the features in the given states.
+        :param list[VectorDistributionSet] states: the states.
+        :rtype: np.ndarray
+        :return: an array of shape (num_states, num_features) with the features' values in each state.
+        """
+        loc_probs, counters = self.encode(states)
+        return np.einsum('sl,slf->sf', loc_probs, counters) * self.normalize_factors
+
+
+class LocationCounterReward(LinearRewardFeature):
+    """
+    A reward feature whose value depends on the value of a counter at the agent's current location.
+    """
+
+    def counter_key(self, loc):
+        """
+        Gets the counter of this feature at the given location.
+        :param str loc: the location.
+        :rtype: str
+        :return: the named key of the counter's feature.
+        """
+        raise NotImplementedError
+
+    def counter_value(self, count):
+        """
+        Gets the value of this feature given the counter's value at the agent's location.
+        :param float count: the counter's value.
+        :rtype: float
+        :return: the feature's value (before normalization).
+        """
+        raise NotImplementedError
+
+
+class LocationVictimColorReward(LocationCounterReward):
     """
     A binary reward feature that is True (1) if the agent is currently in a location where there is a victim of
     a given color, False (0) otherwise.
@@ -86,6 +234,12 @@ class LocationVictimColorReward(LinearRewardFeature):
         # returns weighted average
         return np.array(values).dot(np.array(probs)) * self.normalize_factor
 
+    def counter_key(self, loc):
+        return get_num_victims_location_key(loc, self.color)
+
+    def counter_value(self, count):
+        return int(count >= 1)
+
     def set_reward(self, agent, weight, model=None):
         rwd_feat = rewardKey(agent.name)
 
@@ -103,7 +257,7 @@ class LocationVictimColorReward(LinearRewardFeature):
         agent.setReward(makeTree(rwd_tree), weight * self.normalize_factor, model)
 
 
-class LocationVisitedReward(LinearRewardFeature):
+class LocationVisitedReward(LocationCounterReward):
     """
     A binary reward feature that is True (1) if the agent has visited the current location before, False (0) otherwise.
     """
@@ -140,6 +294,12 @@ class LocationVisitedReward(LinearRewardFeature):
         # returns weighted average
         return np.array(values).dot(np.array(probs)) * self.normalize_factor
 
+    def counter_key(self, loc):
+        return get_num_visits_location_key(self.agent, loc)
+
+    def counter_value(self, count):
+        return int(count > 1)
+
     def set_reward(self, agent, weight, model=None):
         rwd_feat = rewardKey(agent.name)
 
@@ -0,0 +1,154 @@
+import json
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+__author__ = 'Pedro Sequeira'
+__email__ = 'pedrodbs@gmail.com'
+
+LEARN_PHASE = 'learn'
+SAVE_PHASE = 'save'
+WAIT_PHASE = 'wait'
+
+
+class LearningScheduler(object):
+    """
+    Pipelines the phases of reward learning across the files of a study. The optimization of each file runs in a
+    background thread (where it mostly waits on the processes doing the work), so that replaying, plotting and
+    sampling the next file on the main thread overlap with it. Results are saved on the main thread (plotting is not
+    thread-safe), in the order the files were submitted, as soon as each optimization finishes. Also keeps the time
+    spent in each phase, to report how busy each one kept the machine (time spent in a phase nested in another, in the
+    same thread, counts only toward the inner one; `wait` is the time the main thread spent waiting for an
+    optimization).
+    """
+
+    def __init__(self, pipeline=False, max_pending=1):
+        """
+        Creates a new scheduler.
+        :param bool pipeline: whether to overlap optimization with the other phases. If `False`, each file is
+        optimized and saved as soon as it is submitted, one after another.
+        :param int max_pending: the maximum number of files submitted but not yet saved (each holding on to its
+        trajectories), beyond which submitting waits for the oldest one to be saved.
+        """
+        self.pipeline = pipeline
+        self.max_pending = max_pending
+        self.busy = {}
+        self._pending = deque()
+        self._executor = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = timer()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Adds the time spent in the block to the given phase.
+        :param str name: the name of the phase.
+        """
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.)  # time spent in nested phases
+        start = timer()
+        try:
+            yield
+        finally:
+            elapsed = timer() - start
+            nested = stack.pop()
+            if len(stack) > 0:
+                stack[-1] += elapsed
+            with self._lock:
+                self.busy[name] = self.busy.get(name, 0.) + elapsed - nested
+
+    def _learn(self, learn):
+        with self.phase(LEARN_PHASE):
+            return learn()
+
+    def submit(self, file_name, learn, save):
+        """
+        Schedules the optimization of a file.
+        :param str file_name: the name of the file whose data is being optimized.
+        :param learn: function performing the optimization, returning its result.
+        :param save: function saving the result of the optimization, called on the thread that called `submit` or
+        `finish`.
+        """
+        if not self.pipeline:
+            try:
+                result = self._learn(learn)
+            except Exception:
+                logging.exception('Reward learning failed for {}'.format(file_name))
+                return
+            self._save(file_name, result, save)
+            return
+        while len(self._pending) >= self.max_pending:
+            self._save_oldest()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1)
+        self._pending.append((file_name, self._executor.submit(self._learn, learn), save))
+        self.save_finished()
+
+    def save_finished(self):
+        """
+        Saves the results of the optimizations that have finished (in the order they were submitted).
+        """
+        while len(self._pending) > 0 and self._pending[0][1].done():
+            self._save_oldest()
+
+    def _save_oldest(self):
+        file_name, future, save = self._pending.popleft()
+        try:
+            with self.phase(WAIT_PHASE):
+                result = future.result()
+        except Exception:
+            logging.exception('Reward learning failed for {}'.format(file_name))
+            return
+        self._save(file_name, result, save)
+
+    def _save(self, file_name, result, save):
+        with self.phase(SAVE_PHASE):
+            try:
+                save(result)
+            except Exception:
+                logging.exception('Could not save reward learning results for {}'.format(file_name))
+
+    def finish(self):
+        """
+        Waits for all the scheduled optimizations and saves their results.
+        """
+        while len(self._pending) > 0:
+            self._save_oldest()
+        self.shutdown()
+
+    def shutdown(self):
+        """
+        Stops the background thread, abandoning the results of the optimizations not yet saved.
+        """
+        if self._executor is not None:
+            for _, future, _ in self._pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._pending.clear()
+
+    def utilization(self):
+        """
+        Gets the time spent in each phase since the scheduler was created.
+        :rtype: dict[str, dict[str, float]]
+        :return: for each phase, the seconds spent in it and the fraction of the elapsed time that represents.
+        """
+        wall = timer() - self._start
+        with self._lock:
+            return {name: {'seconds': seconds, 'utilization': seconds / wall if wall > 0 else 0.}
+                    for name, seconds in sorted(self.busy.items())}
+
+    def save_utilization(self, file_path):
+        """
+        Logs the time spent in each phase and saves it in a json file.
+        :param str file_path: the path to the json file.
+        """
+        utilization = self.utilization()
+        for name, stats in utilization.items():
+            logging.info('Phase {}: {:.1f}s ({:.0%} of the time)'.format(name, stats['seconds'], stats['utilization']))
+        with open(file_path, 'w') as fp:
+            json.dump(utilization, fp, indent=4)
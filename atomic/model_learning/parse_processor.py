@@ -1,5 +1,5 @@
 from atomic.parsing import ParsingProcessor
-from model_learning.trajectory import copy_world
+from atomic.model_learning.snapshots import WorldSnapshots
 
 __author__ = 'Pedro Sequeira'
 __email__ = 'pedrodbs@gmail.com'
@@ -7,16 +7,16 @@ __email__ = 'pedrodbs@gmail.com'
 
 class TrajectoryParseProcessor(ParsingProcessor):
     """
-    Simply keeps track of the world state and copies to a trajectory.
+    Simply keeps track of the world state and records it in a trajectory.
     """
     def __init__(self):
         super().__init__()
-        self.trajectory = []
-        self.prev_world = None
+        self.trajectory = WorldSnapshots()
+        self.prev_state = None
 
     def pre_step(self, world):
-        self.prev_world = copy_world(world)
+        self.prev_state = self.trajectory.snapshot(world)
 
     def post_step(self, world, act):
         if act is not None:
-            self.trajectory.append((self.prev_world, act))
+            self.trajectory.append((self.prev_state, act))
@@ -0,0 +1,158 @@
+import copy
+from collections.abc import Sequence
+from psychsim.pwl import VectorDistributionSet
+from model_learning.trajectory import copy_world
+
+__author__ = 'Pedro Sequeira'
+__email__ = 'pedrodbs@gmail.com'
+
+
+class WorldSnapshots(Sequence):
+    """
+    A trajectory of (world, action) pairs that keeps a single copy of the world, taken at the first step, and for each
+    step only the state distributions that changed since the previous one (unchanged distributions are shared among
+    steps). The world at each step is rebuilt, from the first copy and that step's state, only when it is accessed;
+    `state` and `action` give the recorded state and action without rebuilding it. Slicing returns a view sharing the
+    same snapshots.
+    Pickled trajectories record the `VERSION` of their format, and unpickling one of another version raises a
+    `ValueError`. Trajectories saved before this class existed are lists of (world, action) pairs, which
+    `get_step_state`, `get_step_feature` and `get_step_actions` accept as well.
+    """
+    # the version of the pickled format, to bump whenever the attributes change
+    VERSION = 1
+
+    def __init__(self, base=None, steps=None, indices=None):
+        """
+        Creates a new (empty) trajectory.
+        :param World base: the copy of the world from which to rebuild the world at each step.
+        :param list[(VectorDistributionSet, Distribution)] steps: the state and action at each step.
+        :param range indices: the steps in this view of the trajectory (`None` means all of them).
+        """
+        self.base = base
+        self.steps = [] if steps is None else steps
+        self.indices = indices
+
+    def _range(self):
+        return range(len(self.steps)) if self.indices is None else self.indices
+
+    def __len__(self):
+        return len(self._range())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return WorldSnapshots(self.base, self.steps, self._range()[index])
+        state, action = self.steps[self._range()[index]]
+        return self.rebuild(state), action
+
+    def __getstate__(self):
+        return dict(self.__dict__, version=self.VERSION)
+
+    def __setstate__(self, state):
+        state = dict(state)
+        version = state.pop('version', None)
+        if version != self.VERSION:
+            raise ValueError('Cannot load trajectory saved in format version {} (expected {})'.format(
+                version, self.VERSION))
+        self.__dict__.update(state)
+
+    def state(self, index):
+        """
+        Gets the state recorded at some step of the trajectory, without rebuilding the world.
+        :param int index: the step in this view of the trajectory.
+        :rtype: VectorDistributionSet
+        :return: the recorded state, which is shared with the trajectory (and possibly other steps), so it should not be
+        modified.
+        """
+        return self.steps[self._range()[index]][0]
+
+    def action(self, index):
+        """
+        Gets the action performed at some step of the trajectory, without rebuilding the world.
+        :param int index: the step in this view of the trajectory.
+        :rtype: Distribution
+        :return: the action at the step.
+        """
+        return self.steps[self._range()[index]][1]
+
+    def snapshot(self, world):
+        """
+        Records the current state of the given world.
+        :param World world: the world whose state we want to record.
+        :rtype: VectorDistributionSet
+        :return: the world's state, sharing the distributions that have not changed since the last step appended.
+        """
+        if self.base is None:
+            self.base = copy_world(world)
+        previous = self.steps[-1][0] if len(self.steps) > 0 else self.base.state
+        same_keys = previous.keyMap == world.state.keyMap
+        state = VectorDistributionSet()
+        state.keyMap = previous.keyMap if same_keys else dict(world.state.keyMap)
+        for substate, distribution in world.state.distributions.items():
+            old = previous.distributions.get(substate) if same_keys else None
+            state.distributions[substate] = old if old is not None and old == distribution else \
+                copy.deepcopy(distribution)
+        return state
+
+    def append(self, step):
+        """
+        Adds a step to the end of the trajectory.
+        :param (VectorDistributionSet, Distribution) step: the state (as returned by `snapshot`) and action at the step.
+        """
+        assert self.indices is None, 'Cannot append to a view of a trajectory'
+        self.steps.append(step)
+
+    def rebuild(self, state):
+        """
+        Rebuilds the world at some step of the trajectory.
+        :param VectorDistributionSet state: the state recorded at the step.
+        :rtype: World
+        :return: a copy of the world with (a copy of) the given state.
+        """
+        # leave the first step's state out of the copy, as it is replaced anyway
+        base_state, self.base.state = self.base.state, VectorDistributionSet()
+        try:
+            world = copy_world(self.base)
+        finally:
+            self.base.state = base_state
+        world.state = copy.deepcopy(state)
+        return world
+
+
+def get_step_state(trajectory, index):
+    """
+    Gets the state at some step of a trajectory, without rebuilding the world if it is a `WorldSnapshots`.
+    :param trajectory: the trajectory, a sequence of (world, action) pairs.
+    :param int index: the step of the trajectory.
+    :rtype: (World, VectorDistributionSet)
+    :return: a world from which to get features in the state, and the state at the step (which should not be modified).
+    """
+    if isinstance(trajectory, WorldSnapshots):
+        return trajectory.base, trajectory.state(index)
+    world = trajectory[index][0]
+    return world, world.state
+
+
+def get_step_feature(trajectory, index, key, unique=False):
+    """
+    Gets the value of a state feature at some step of a trajectory, without rebuilding the world if it is a
+    `WorldSnapshots`.
+    :param trajectory: the trajectory, a sequence of (world, action) pairs.
+    :param int index: the step of the trajectory.
+    :param str key: the feature's state key.
+    :param bool unique: whether to return the feature's single value rather than its distribution.
+    :return: the feature's value or distribution at the step.
+    """
+    world, state = get_step_state(trajectory, index)
+    return world.getFeature(key, state, unique)
+
+
+def get_step_actions(trajectory):
+    """
+    Gets the actions performed along a trajectory, without rebuilding the worlds if it is a `WorldSnapshots`.
+    :param trajectory: the trajectory, a sequence of (world, action) pairs.
+    :rtype: list[Distribution]
+    :return: the action at each step.
+    """
+    if isinstance(trajectory, WorldSnapshots):
+        return [trajectory.action(t) for t in range(len(trajectory))]
+    return [a_dist for _, a_dist in trajectory]
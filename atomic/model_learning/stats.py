@@ -4,6 +4,7 @@ from psychsim.agent import Agent
 from psychsim.probability import Distribution
 from psychsim.world import World
 from atomic.definitions.features import get_num_visits_location_key, get_mission_seconds_key
+from atomic.model_learning.snapshots import get_step_actions, get_step_feature
 
 __author__ = 'Pedro Sequeira'
 __email__ = 'pedrodbs@gmail.com'
@@ -24,11 +25,11 @@ def get_locations_frequencies(trajectories, agents, locations):
 
     data = np.zeros(len(locations))
     for i in range(len(trajectories)):
-        world = trajectories[i][-1][0]
+        trajectory = trajectories[i]
         traj_data = []
         for loc in locations:
             loc_freq_feat = get_num_visits_location_key(agents[i], loc)
-            traj_data.append(world.getFeature(loc_freq_feat).expectation())
+            traj_data.append(get_step_feature(trajectory, len(trajectory) - 1, loc_freq_feat).expectation())
         data += traj_data
     return dict(zip(locations, data))
 
@@ -49,7 +50,7 @@ def get_actions_frequencies(trajectories, agents):
     for i in range(len(trajectories)):
         # collect agent data
         ag_data = {}
-        for _, a_dist in trajectories[i]:
+        for a_dist in get_step_actions(trajectories[i]):
             for a, p in a_dist.items():
                 a = str(a).replace('{}-'.format(agents[i].name), '').replace('_', ' ')  # get clean action name
                 if a not in ag_data:
@@ -81,14 +82,15 @@ def get_actions_durations(trajectories, agents):
     clock_key = get_mission_seconds_key()
     for i in range(len(trajectories)):
         trajectory = trajectories[i]
+        actions = get_step_actions(trajectory)
         for t in range(len(trajectory) - 1):
 
             # compute clock diff
-            duration = trajectory[t + 1][0].getFeature(clock_key, unique=True) - \
-                       trajectory[t][0].getFeature(clock_key, unique=True)
+            duration = get_step_feature(trajectory, t + 1, clock_key, unique=True) - \
+                       get_step_feature(trajectory, t, clock_key, unique=True)
 
             # get action and register duration
-            a_dist = trajectory[t][1]
+            a_dist = actions[t]
             for a, p in a_dist.items():
                 a = str(a).replace('{}-'.format(agents[i].name), '').replace('_', ' ') # get clean action name
                 if a not in data:
@@ -6,6 +6,7 @@ from psychsim.world import World
 from psychsim.agent import Agent
 
 from atomic.analytic import make_ac_handlers
+from atomic.definitions.timestamps import message_timer
 from atomic.teamwork.asi import make_asi, make_team
 
 
@@ -159,18 +160,13 @@ class ASISTWorld(World):
             self.asi.update_interventions(AC, delta)
 
     def update_state(self, msg):
-        try:
-            self.now = tuple([int(item) for item in msg['data']['mission_timer'].split(':')])
-        except ValueError:
-            pass
-        except KeyError:
-            pass
-        else:
+        timer = message_timer(msg)
+        if timer is not None:
+            self.now = timer
             if self.start_time is None:
                 self.start_time = self.now
                 self.logger.debug(f'Starting at time {self.now}')
-            if self.now is not None:
-                self.setState(WORLD, 'clock', 900-self.now[0]*60-self.now[1], recurse=True)
+            self.setState(WORLD, 'clock', 900-self.now[0]*60-self.now[1], recurse=True)
 
     def process_event(self, msg):
         if msg['msg']['sub_type'] == 'Event:PlanningStage':
@@ -10,6 +10,7 @@ import logging
 import pandas as pd
 import numpy as np
 from abc import ABC, abstractmethod
+from atomic.parsing.row_buffer import RowBuffer
 
 
 class Feature(ABC):
@@ -22,7 +23,7 @@ class Feature(ABC):
         self.history = list()
         super().__init__()
         self.rooms_to_track = []
-        self.dataframe = pd.DataFrame(columns=['time'])
+        self.rows = RowBuffer(['time'])
     
     def processMsg(self, msg):
         self.msg_type = msg['sub_type']
@@ -54,10 +55,19 @@ class Feature(ABC):
         ## Regardless of message type, add a row
         row = {'time': tuple(map(int, self.msg_time.split(':')))}
         row.update(row_dict)
-        self.dataframe = self.dataframe.append(row, ignore_index=True)
+        self.rows.append(row)
         
     def addCol(self, colName):
-        self.dataframe[colName] = np.zeros((len(self.dataframe)))
+        self.rows.set_column(colName, 0.)
+
+    @property
+    def dataframe(self):
+        return self.rows.dataframe()
+
+    @dataframe.setter
+    def dataframe(self, frame):
+        self.rows = RowBuffer(key=self.rows.key)
+        self.rows.frame = frame
     
     def getDataframe(self):
         return self.dataframe
@@ -150,7 +160,7 @@ class CountVisitsPerRole(Feature):
             for room, role_counts in self.roomToRoleToCount.items():
                 for role, count in role_counts.items():
                     label = f'{role}_visits_{room}'
-                    if label not in self.dataframe.columns:
+                    if label not in self.rows.column_names:
                         self.addCol(label)
                     row_dict[label] = count
             self.addRow(row_dict)
@@ -375,6 +385,8 @@ class DialogueLabels(Feature):
     def __init__(self, logger=logging):
         super().__init__('count utterances per player per label', logger)
         self.utterances = {}
+        # Only the latest row of each player is kept
+        self.rows = RowBuffer(['time'], key='Participant')
 
     def processMsg(self, msg):
         super().processMsg(msg)
@@ -391,8 +403,6 @@ class DialogueLabels(Feature):
             for player, utterances in self.utterances.items():
                 row = {'Participant': player, 'Utterance Total': sum(self.utterances[player].values())}
                 row.update(utterances)
-                if len(self.dataframe) > 0:
-                    self.dataframe = self.dataframe[self.dataframe['Participant'] != player]
                 self.addRow(row)
 
     def printValue(self):
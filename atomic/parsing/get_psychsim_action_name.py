@@ -13,7 +13,9 @@ The class has a static method thar reads in a conversion file and another static
 returns the psychsim action name (with a player argument and any others if specified in the conversion file).
 '''
 import csv
+import itertools
 import pandas as pd
+from atomic.parsing.stage_profile import profiled
 
 class Msg2ActionEntry:
     def __init__(self, psysim_name, psysim_args, msg_type, conditions):
@@ -57,16 +59,42 @@ class Msg2ActionEntry:
                 if msg[var] != val:
                     return None
                 
-        psyim_act_name = '(%s, %s' %(self.psysim_name, player)
-        if len(self.psysim_args) > 0:
-            psyim_act_name  = psyim_act_name + ', ' +   ', '.join( [msg[arg] for arg in self.psysim_args])
-        psyim_act_name = psyim_act_name + ')'
-        return psyim_act_name 
+        return self.get_action_name(msg)
+
+    def get_action_name(self, msg):
+        ## Names are interned, so each distinct action is formatted only once
+        key = (self.psysim_name, msg['playername']) + tuple(msg[arg] for arg in self.psysim_args)
+        psyim_act_name = Msg2ActionEntry.action_names.get(key)
+        if psyim_act_name is None:
+            psyim_act_name = '(%s, %s' %(self.psysim_name, key[1])
+            if len(self.psysim_args) > 0:
+                psyim_act_name  = psyim_act_name + ', ' +   ', '.join(key[2:])
+            psyim_act_name = psyim_act_name + ')'
+            Msg2ActionEntry.action_names[key] = psyim_act_name
+        return psyim_act_name
+
+    def get_signature(self):
+        '''
+        Returns the message fields tested by each condition: (var, None, None) for a simple condition, and
+        (var, column, row_key) for one that looks up auxiliary data
+        '''
+        signature = []
+        for var, val in self.conditions.items():
+            if '(' in val:
+                signature.append((var, val[:val.index('(')], val[val.index('(')+1 : val.index(')')]))
+            else:
+                signature.append((var, None, None))
+        return tuple(signature)
     
 ##################### CLASS METHODS    
     
     conversions = []
     auxiliary_data = None
+    ## Compiled from conversions on first use: sub_type -> list of (signature, field values -> conversion index),
+    ## or None for a sub_type whose conditions can only be evaluated by scanning
+    dispatch = None
+    dispatch_size = 0
+    action_names = {}
     
     @classmethod
     def read_psysim_msg_conversion(cls, fname, aux_data_file=None):
@@ -77,10 +105,72 @@ class Msg2ActionEntry:
             for row in reader:
                 conversion = Msg2ActionEntry(row['psysim'], row['args'], row['msg_type'], row['conditions'])            
                 Msg2ActionEntry.conversions.append(conversion)
-                
+        Msg2ActionEntry.dispatch = None
+
+    @classmethod
+    def compile(cls):
+        '''
+        Compiles the conversions into a dispatch table. For each message sub_type, the conversions are grouped by the
+        fields their conditions test, and each group maps the values of those fields to the first conversion (in file
+        order) that they satisfy. Auxiliary data conditions are expanded into every (row, value) pair they accept.
+        '''
+        aux = None
+        if cls.auxiliary_data is not None and cls.auxiliary_data.index.is_unique:
+            aux = cls.auxiliary_data.to_dict('index')
+        dispatch = {}
+        for index, conv in enumerate(cls.conversions):
+            if conv.msg_type in dispatch and dispatch[conv.msg_type] is None:
+                continue
+            groups = dispatch.setdefault(conv.msg_type, {})
+            signature = conv.get_signature()
+            choices = []
+            for (var, column, row_key), val in zip(signature, conv.conditions.values()):
+                if column is None:
+                    choices.append([val])
+                elif aux is None or column not in cls.auxiliary_data.columns:
+                    # Lookup fails (or is ambiguous) for every message, so leave it to the scan to fail the same way
+                    dispatch[conv.msg_type] = None
+                    break
+                else:
+                    # Missing auxiliary values (NaN) never equal a message field
+                    choices.append([(row, values[column]) for row, values in aux.items() if not pd.isna(values[column])])
+            else:
+                table = groups.setdefault(signature, {})
+                for key in itertools.product(*choices):
+                    table.setdefault(key, index)
+        cls.dispatch = {msg_type: None if groups is None else list(groups.items())
+                        for msg_type, groups in dispatch.items()}
+        cls.dispatch_size = len(cls.conversions)
 
     @classmethod    
+    @profiled('get_action')
     def get_action(cls, msg):
+        if len(cls.conversions) == 0:
+            return None
+        if cls.dispatch is None or cls.dispatch_size != len(cls.conversions):
+            cls.compile()
+        if 'playername' not in msg:
+            # Same error as scanning
+            raise KeyError('playername')
+        groups = cls.dispatch.get(msg['sub_type'], [])
+        if groups is None:
+            return cls.scan(msg)
+        best = None
+        try:
+            for signature, table in groups:
+                index = table.get(tuple(msg[var] if column is None else (msg[row_key], msg[var])
+                                        for var, column, row_key in signature))
+                if index is not None and (best is None or index < best):
+                    best = index
+        except (KeyError, TypeError):
+            # Missing or unhashable fields: whether scanning raises an error depends on the order of the checks
+            return cls.scan(msg)
+        if best is None:
+            return None
+        return cls.conversions[best].get_action_name(msg)
+
+    @classmethod
+    def scan(cls, msg):
         for conv in Msg2ActionEntry.conversions:
             ret = conv.get_psysim_name(msg)
             if ret is not None:
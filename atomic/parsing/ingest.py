@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Asynchronous ingestion of testbed messages into an ASISTWorld (or anything else with a process_msg method).
+
+The pipeline has three stages joined by bounded queues: a reader, which reads batches of lines from a log file (in a
+worker thread) or receives them from a live message bus; a decoder, which parses the JSON of each line; and an
+updater, which hands the decoded messages, in order, to the world in a single worker thread of its own.  Reading and
+decoding the next messages therefore overlap with the PsychSim stepping on the current ones, while a full queue
+suspends the stage feeding it, so a slow world holds back the reader instead of letting messages pile up in memory.
+
+In live mode, the callback of the message bus client (e.g., paho's on_message, which runs in the client's own thread)
+feeds a LiveSource, which blocks that thread while the pipeline is full:
+
+    source = LiveSource()
+    thread = threading.Thread(target=asyncio.run, args=(ingest(world, source.read),))
+    thread.start()
+    client.on_message = lambda client, userdata, message: source.feed(message.payload, message.topic)
+    ...
+    source.close()
+    thread.join()
+"""
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import logging
+import threading
+import traceback
+
+from atomic.definitions.timestamps import release_message, stamp_message
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_QUEUE_SIZE = 8
+
+# Marks the end of the messages on a queue
+_DONE = None
+
+
+async def read_file(fname, queue, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Reader stage for log files
+    :param queue: the queue on which to put batches of lines, each as the number of the first line, the lines, and the
+    topics of their messages (None if the messages carry their own)
+    :type queue: asyncio.Queue
+    """
+    loop = asyncio.get_running_loop()
+    with open(fname, 'rt') as json_file:
+        line_no = 0
+        while True:
+            lines = await loop.run_in_executor(None, lambda: list(itertools.islice(json_file, batch_size)))
+            if len(lines) == 0:
+                break
+            await queue.put((line_no, lines, None))
+            line_no += len(lines)
+    await queue.put(_DONE)
+
+
+class LiveSource(object):
+    """
+    Reader stage for messages delivered by a message bus client running in another thread
+    :ivar capacity: The maximum number of messages fed but not yet passed on to the decoder
+    :type capacity: int
+    :ivar count: The number of messages fed so far
+    :type count: int
+    """
+
+    def __init__(self, capacity=DEFAULT_BATCH_SIZE*DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.slots = threading.Semaphore(capacity)
+        self.ready = threading.Event()
+        self.loop = None
+        self.inbox = None
+        self.stopped = False
+        self.count = 0
+
+    async def read(self, queue):
+        """
+        Runs the reader stage, passing on the messages fed to this source (in batches of those that arrived while
+        the decoder was busy) until it is closed
+        """
+        self.loop = asyncio.get_running_loop()
+        self.inbox = asyncio.Queue()
+        self.ready.set()
+        try:
+            while True:
+                item = await self.inbox.get()
+                batch = []
+                while item is not _DONE:
+                    batch.append(item)
+                    if len(batch) == self.batch_size or self.inbox.empty():
+                        break
+                    item = self.inbox.get_nowait()
+                if batch:
+                    await queue.put((batch[0][0], [payload for line_no, payload, topic in batch],
+                                     [topic for line_no, payload, topic in batch]))
+                    for _ in batch:
+                        self.slots.release()
+                if item is _DONE:
+                    await queue.put(_DONE)
+                    return
+        finally:
+            # Do not leave the client waiting on a pipeline that is gone
+            self.stopped = True
+            for _ in range(self.capacity):
+                self.slots.release()
+
+    def feed(self, payload, topic=None):
+        """
+        Passes a message on to the pipeline, waiting while the pipeline is full (call from any thread other than the
+        pipeline's own)
+        :param payload: the JSON of the message
+        :type payload: str or bytes
+        :param topic: the topic on which the message arrived (added to the message if it has none)
+        """
+        self.ready.wait()
+        self.slots.acquire()
+        if self.stopped:
+            raise RuntimeError('Message ingestion pipeline has stopped')
+        self.loop.call_soon_threadsafe(self.inbox.put_nowait, (self.count, payload, topic))
+        self.count += 1
+
+    def close(self):
+        """
+        Ends the messages, letting the pipeline finish once it has processed the messages already fed
+        """
+        self.ready.wait()
+        if not self.stopped:
+            self.loop.call_soon_threadsafe(self.inbox.put_nowait, _DONE)
+
+
+async def decode_messages(inbox, outbox, strict=False, logger=logging, label=''):
+    """
+    Decoder stage, which also parses the clocks of each message, kept aside until the message has been processed (see
+    timestamps.stamp_message)
+    :param inbox: the queue of batches of lines (as put by read_file)
+    :param outbox: the queue on which to put each batch of decoded messages (None for lines that could not be
+    decoded), along with the number of the first line
+    """
+    while True:
+        batch = await inbox.get()
+        if batch is _DONE:
+            await outbox.put(_DONE)
+            return
+        first, lines, topics = batch
+        msgs = []
+        for line in lines:
+            try:
+                msgs.append(json.loads(line))
+            except Exception:
+                if strict:
+                    raise
+                else:
+                    logger.error(traceback.format_exc())
+                    logger.error(f'Error in reading line {first+len(msgs)} of {label}')
+                    msgs.append(None)
+        if topics is not None:
+            for msg, topic in zip(msgs, topics):
+                if msg and topic is not None:
+                    msg.setdefault('topic', topic)
+        for msg in msgs:
+            if isinstance(msg, dict):
+                stamp_message(msg)
+        await outbox.put((first, msgs))
+
+
+def process_msgs(world, first, msgs, strict=False, logger=logging, label='', sources=None):
+    """
+    Hands the given messages, in order, to the given world
+    :param first: the line number of the first message
+    :param msgs: the messages (None, or empty, for those to skip)
+    :param sources: if not None, the set to which to add the source of each message
+    :type sources: set
+    """
+    try:
+        for line_no, msg in enumerate(msgs, first):
+            if not msg:
+                continue
+            if sources is not None:
+                sources.add(msg['msg']['source'])
+            try:
+                world.process_msg(msg)
+            except Exception:
+                if strict:
+                    raise
+                else:
+                    logger.error(traceback.format_exc())
+                    logger.error(f'Error in handling line {line_no} of {label}')
+    finally:
+        for msg in msgs:
+            if isinstance(msg, dict):
+                release_message(msg)
+
+
+async def update_world(world, inbox, executor, strict=False, logger=logging, label='', sources=None, progress=None):
+    """
+    Updater stage, processing each batch of messages in the given executor
+    :param progress: if not None, function to call with the number of lines handled after each batch
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await inbox.get()
+        if item is _DONE:
+            return
+        first, msgs = item
+        await loop.run_in_executor(executor, process_msgs, world, first, msgs, strict, logger, label, sources)
+        if progress is not None:
+            progress(len(msgs))
+
+
+async def ingest(world, reader, strict=False, logger=logging, label='', sources=None, progress=None,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Runs the whole pipeline until the reader runs out of messages
+    :param reader: coroutine function running the reader stage, given the queue on which to put batches of lines
+    (e.g., functools.partial(read_file, fname) or LiveSource().read)
+    :param strict: if True, the first message that cannot be decoded or processed stops the pipeline and raises the
+    exception (otherwise, it is logged and skipped)
+    :param label: the name of the message source to use in error messages
+    :param queue_size: the maximum number of batches waiting between two stages
+    """
+    lines = asyncio.Queue(queue_size)
+    msgs = asyncio.Queue(queue_size)
+    # A single thread, so the world sees one message at a time, in order
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        tasks = [asyncio.ensure_future(reader(lines)),
+                 asyncio.ensure_future(decode_messages(lines, msgs, strict, logger, label)),
+                 asyncio.ensure_future(update_world(world, msgs, executor, strict, logger, label, sources,
+                                                    progress))]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            task.result()
+
+
+def ingest_file(world, fname, batch_size=DEFAULT_BATCH_SIZE, **kwargs):
+    """
+    Runs the pipeline over the messages in the given log file (keyword arguments as for ingest)
+    """
+    kwargs.setdefault('label', fname)
+    return asyncio.run(ingest(world, lambda queue: read_file(fname, queue, batch_size), **kwargs))
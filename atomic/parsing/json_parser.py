@@ -3,8 +3,6 @@
 import os
 import functools
 import json
-from collections import Counter
-import numpy as np
 
 try:
     from tqdm import tqdm
@@ -13,27 +11,18 @@ except ImportError:
 print = functools.partial(print, flush=True)
 from atomic.definitions import GOLD_STR, GREEN_STR, extract_time
 from atomic.parsing.map_parser import extract_map
+from atomic.parsing.metadata_index import get_index
+from atomic.parsing.room_index import room, RoomIndex, closest_room
+from atomic.parsing.room_graph import RoomGraph
+from atomic.parsing.message_store import MessageStore
+from atomic.parsing.stage_profile import profiled
+from atomic.parsing.trial_catalog import TrialCatalog
 from atomic.parsing.make_rddl_instance import generate_rddl_victims_from_list_named_vics
 from atomic.analytic.ihmc_wrapper import JAGWrapper
 from atomic.analytic.gallup_wrapper import GelpWrapper
 from atomic.analytic.corenll_wrapper import ComplianceWrapper
 from atomic.analytic.cmu_wrapper import TEDWrapper
 
-class room(object):
-    def __init__(self, name, coords):
-        [x0, z0, x1, z1] = coords
-        self.name = name
-        self.x0= min(x0, x1)
-        self.x1= max(x0, x1)
-        self.z0= min(z0, z1)
-        self.z1= max(z0, z1)
-
-    def in_room(self, _x, _z, epsilon = 0):
-        return (self.x0 - epsilon <= _x) and (_x <= self.x1 + epsilon) and (self.z0 - epsilon <= _z) and (_z <= self.z1 + epsilon)
-    
-    def __repr__(self):
-        return '%s %.0f %.0f %.0f %.0f' % (self.name, self.x0, self.x1, self.z0, self.z1)
-
 class victim(object):
     def __init__(self, loc, color, x, z):
         self.room = loc
@@ -121,6 +110,7 @@ class JSONReader(object):
         self.field_transformations = {'victim_id': make_victime_name, 'addressees': make_addressees}
         self.verbose = verbose
         self.rooms = {}
+        self.room_index = RoomIndex([])
         self.fname = fname
         if use_ihmc_locations:
             self.locations_from = LOCATION_MONITOR
@@ -131,6 +121,8 @@ class JSONReader(object):
         self.player_maps = {}
         self.player_marker = {}
         self.saved_victim_ids = []
+        self.index = None
+        self._store = None
             
     def registerFeatures(self, feats):
         for f in feats:
@@ -138,10 +130,20 @@ class JSONReader(object):
 
     def reset(self):
         self.messages = []
+        self._store = None
         self.mission_running = False
         self.player_to_curr_room = dict()
         
 
+    @property
+    def store(self):
+        """
+        :return: columnar view of the parsed messages, rebuilt whenever messages have been added since it was built
+        """
+        if self._store is None or self._store.messages is not self.messages or len(self._store) != len(self.messages):
+            self._store = MessageStore(self.messages)
+        return self._store
+
     def make_role_mappings(self, roles):
         for role_msg in roles:
             role = role_msg['new_role'].lower()[:3]
@@ -149,16 +151,15 @@ class JSONReader(object):
         print(self.participant_2_role)
         
 
+    @profiled('process_json_file')
     def process_json_file(self, fname):
         self.reset()
         
-        jsonfile = open(fname, 'rt')
-        self.jsonMsgs = [json.loads(line) for line in jsonfile.readlines()]
-        jsonfile.close()        
+        self.index = get_index(self.index, fname)
+        self.jsonMsgs = self.index.messages
         self.allMTypes = set()
         
-        roles = [m['data'] for m in self.jsonMsgs if m['msg']['sub_type']=='Event:RoleSelected']
-        self.make_role_mappings(roles)
+        self.make_role_mappings(self.index.roles)
         
 #        if tqdm and not self.verbose:
 #            iterable = tqdm(self.jsonMsgs)
@@ -182,32 +183,22 @@ class JSONReader(object):
             msg['time_sec'] = extract_time(msg)
             
     def read_semantic_map(self):        
-        jsonfile = open(self.fname, 'rt')
-        
-        self.semantic_map = None
-        for line in jsonfile.readlines():
-            jmsg = json.loads(line)
-            if 'semantic_map' in jmsg['data'].keys():
-                self.semantic_map = jmsg['data']['semantic_map']
-                break
-        else:
+        self.index = get_index(self.index, self.fname)
+        self.semantic_map = self.index.semantic_map
+        if self.semantic_map is None:
             raise ValueError('Unable to find semantic map')
-        jsonfile.close()
 
         # Sudeepta's map transformation code
         room_dict, room_connections = extract_map(self.semantic_map)
         
         if self.USE_COLLAPSED_MAP:
-            ## Overwrite room_edges and store name lookup and new room names
+            ## Overwrite room_graph and store name lookup and new room names
             from atomic.parsing.remap_connections import transformed_connections
-            self.room_edges = []
             edges, self.room_name_lookup, new_map, orig_map = transformed_connections(self.semantic_map)
-            for a,b in edges:
-                self.room_edges.append((a,b))
-                self.room_edges.append((b,a))     
+            self.room_graph = RoomGraph.from_undirected(edges)
             self.new_room_names = new_map['new_locations']
         else:
-            self.room_edges = room_connections
+            self.room_graph = RoomGraph(room_connections)
 
         ## Whether we're using the collapsed map or not, we keep track of the coordinates of the ORIGINAL rooms            
         for rid, coords in room_dict.items():
@@ -217,32 +208,23 @@ class JSONReader(object):
             z1 = coords[1]['z']
             rm = room(rid, [x0, z0, x1, z1])
             self.rooms[rid] = rm
+        self.room_index = RoomIndex(self.rooms.values())
             
     def get_victims(self):
         self.read_semantic_map()
-        
-        jsonfile = open(self.fname, 'rt')
-        jsonMsgs = [json.loads(line) for line in jsonfile.readlines()]
-        jsonfile.close()
-        
-        for jmsg in jsonMsgs:
-            mtype = jmsg['msg']['sub_type']
-            m = jmsg['data']
-            if mtype == 'Mission:VictimList':
-                return self.make_victims_list(m['mission_victim_list'])
-            
-        return None
+        if self.index.victim_list is None:
+            return None
+        return self.make_victims_list(self.index.victim_list)
         
     
     def is_2steps_connected(self, rm1, rm2):
-        nbrs_of_1 = set([other for (rma, other) in self.room_edges if rma == rm1])
-        nbrs_of_2 = set([other for (rma, other) in self.room_edges if rma == rm2])
-        common_nbrs = nbrs_of_1.intersection(nbrs_of_2)
+        common_nbrs = self.room_graph.common_neighbors(rm1, rm2)
         if len(common_nbrs) == 0:
             return False, None
-        return True, common_nbrs.pop()
+        return True, common_nbrs[0]
         
     
+    @profiled('process_message')
     def process_message(self, jmsg):        
         mtype = jmsg['msg']['sub_type']
         
@@ -259,7 +241,8 @@ class JSONReader(object):
             return
         elif mtype not in self.msg_types:
             return
-        m = jmsg['data']
+        # The decoded messages are shared with the file's index, so annotate a copy
+        m = dict(jmsg['data'])
         m['sub_type'] = mtype
         
         if 'jag' in m.keys():
@@ -330,7 +313,7 @@ class JSONReader(object):
             distance_away = -1
             if (prev_rm == ''):
                 distance_away = 1
-            elif (prev_rm, room_name) in self.room_edges:
+            elif self.room_graph.has_edge(prev_rm, room_name):
                 distance_away = 1
             else:
                 connected, common_nbr = self.is_2steps_connected(prev_rm, room_name)
@@ -338,7 +321,7 @@ class JSONReader(object):
                     distance_away = 2                    
             
             ## If new and old rooms not connected
-#            if (prev_rm != '') and (self.room_edges is not None) and ((prev_rm,room_name) not in self.room_edges):
+#            if (prev_rm != '') and (self.room_graph is not None) and (not self.room_graph.has_edge(prev_rm, room_name)):
             if distance_away < 0:
                 if self.verbose: print('Error: %s and %s not connected' %(prev_rm, room_name))
                 
@@ -398,7 +381,7 @@ class JSONReader(object):
             ## If event room doesn't match player's last room
             if event_room != prev_rm:
                 ## If connected, inject an Event:location message
-                conn = (prev_rm, m['room_name']) in self.room_edges
+                conn = self.room_graph.has_edge(prev_rm, m['room_name'])
                 if conn:
                     injected_msg = {'sub_type':'Event:location', 'playername':player, 
                                      'old_room_name': prev_rm, 'room_name':event_room, 'mission_timer':m['mission_timer']}
@@ -409,7 +392,7 @@ class JSONReader(object):
                 else:
                     if self.verbose: 
                         print('Error: Player %s last moved to %s but event %s is in %s. 1-away %s' 
-                          %(player, prev_rm, mtype, event_room, self.one_step_removed(self.player_to_curr_room[player], event_room)))
+                          %(player, prev_rm, mtype, event_room, self.room_graph.one_step_removed(self.player_to_curr_room[player], event_room)))
         
         if self.verbose and (not is_location_event) and ('room_name' in m.keys()):
             print('%s did %s in %s (orig %s) to %s %s' %(player, mtype, m['room_name'], m.get('orig_room_name', ''), m.get('victim_id', ''),
@@ -467,96 +450,21 @@ class JSONReader(object):
                 (e.g., a victim that was triaged but never evacuated by the transporter (maybe it was evac'd by someone else))
     '''
     def collect_msg_seq(self, msg1_condition, msg2_condition, time_limit):
-        positives = []
-        negatives = []
-        msg1_matches = []
-        
-        for msg in self.messages:
-            msg1_match = np.all([msg.get(key, '') == val for key, val in msg1_condition.items() if val is not None])
-            if msg1_match:
-                msg1_matches.append(msg)
-                continue
-            
-            ## If no msg 1 matches
-            if len(msg1_matches) == 0:
-                continue
-            
-            msg2_match = np.all([msg.get(key, '') == val for key, val in msg2_condition.items()])
-            if not msg2_match:
-                continue
-            
-            ## If we're here, there are msg1 matches and msg matches msg2
-            to_pop = []
-            for m1 in msg1_matches:
-                wildcards = {key:m1[key] for key,val in msg1_condition.items() if val is None}
-                wildcard_match = np.all([msg.get(key, '') == val for key, val in wildcards.items()])
-
-                if not wildcard_match:
-                    continue
-                to_pop.append(m1)
-                tdiff = msg['time_sec'] - m1['time_sec']
-                if tdiff <= time_limit:
-                    positives.append([m1, msg, tdiff])
-                else:
-                    negatives.append([m1, msg, tdiff])
-                
-            ## Clear prev_msg1
-            for m1 in to_pop:
-                msg1_matches.remove(m1)
-        
-        
-        ## Add any un-paired msg1s to the negatives
-        for m1 in msg1_matches:
-            negatives.append([m1, None, -1])
-        return positives, negatives
+        return self.store.collect_sequence(msg1_condition, msg2_condition, time_limit)
         
         
     def collapse_messages(self, remove_types=[]):
-        collapsed_msgs = []
-        last_msg = {}
-        for msg in self.messages:
-            if msg['sub_type'] in remove_types:
-                continue
-            flds = ['sub_type', 'playername', 'room_name'] + self.typeToFields.get(msg['sub_type'], [])
-            fields_changed = np.any([ msg.get(fld, '') != last_msg.get(fld, '') for fld in flds  ])
-            if fields_changed:
-                last_msg = msg
-                collapsed_msgs.append(msg)
-                
-        return collapsed_msgs
+        return self.store.collapse(remove_types, self.typeToFields)
     
     def filter_out(self, keys, values, keep_keys=None):
-        filts = []
-        for msg in self.messages:
-            msg_vals = [str(msg.get(k, '')).lower() for k in keys]
-            values = [str(v).lower() for v in values]
-            if msg_vals != values:
-                if keep_keys is None:
-                    m = msg
-                else:
-                    m = {k:msg[k] for k in keep_keys}
-                filts.append(m)
-        
-        return filts
+        return self.store.filter(keys, values, keep_keys, negate=True)
     
     def filter(self, keys, values, keep_keys=None):
-        filts = []
-        for msg in self.messages:
-            msg_vals = [str(msg.get(k, '')).lower() for k in keys]
-            values = [str(v).lower() for v in values]
-            if msg_vals == values:
-                if keep_keys is None:
-                    m = msg
-                else:
-                    m = {k:msg[k] for k in keep_keys}
-                filts.append(m)
-        
-        return filts
+        return self.store.filter(keys, values, keep_keys)
     
     def filter_and_tally(self, keys, values, talley_key):
-        filts = self.filter(keys, values)
-        talley_vals = [msg[talley_key] for msg in filts]
-        return Counter(talley_vals)
+        store = self.store
+        return store.tally(store.match_lower(keys, values), talley_key)
 
     def make_victims_list(self,victim_list_dicts_in):
         victim_list_dicts_out = []
@@ -599,36 +507,13 @@ class JSONReader(object):
         rddl_inst_file.close()
         
     
-    def one_step_removed(self, rm1, rm2):
-        if (rm1, rm2) in self.room_edges:
-            return True
-        nbr1 = set([edge[1] for edge in self.room_edges if edge[1] == rm1])
-        nbr2 = set([edge[1] for edge in self.room_edges if edge[1] == rm2])
-        return len(nbr1.intersection(nbr2)) > 0
-
     def getClosestRoom(self, x, z, candidate_rooms=[]):
         if candidate_rooms == []:
-            candidate_rooms = self.rooms.values()
-        min_diff = 1e5
-        closest = None
-        for rm in candidate_rooms:
-            x_diff = 0
-            z_diff = 0
-            if x < rm.x0:
-                x_diff = rm.x0 - x
-            elif x > rm.x1:
-                x_diff = x - rm.x1
-            if z < rm.z0:
-                z_diff = rm.z0 - z
-            elif z > rm.z1:
-                z_diff = z - rm.z1
-            if (x_diff + z_diff) < min_diff:
-                min_diff = x_diff + z_diff
-                closest = rm
-        return closest, min_diff
+            return self.room_index.closest(x, z)
+        return closest_room(x, z, candidate_rooms)
 
     def getRoom(self, x, z): 
-        inrooms = [r for r in self.rooms.values() if r.in_room(x,z)]
+        inrooms = self.room_index.containing(x, z)
         if len(inrooms) == 1:
             return inrooms[0].name
 #        closest, min_diff = self.getClosestRoom(x, z, inrooms)
@@ -664,6 +549,7 @@ def getMessages(args):
     psychsimdir = '.'
     multitrial = False
     verbose = False
+    catalog = None
     
     # Grab inputs, where available
     for a,val in args.items():     
@@ -678,6 +564,8 @@ def getMessages(args):
             psychsimdir = args[a]
         elif a == '--verbose':
             verbose = True
+        elif a == '--catalog':
+            catalog = TrialCatalog(args[a] or None)
         elif a == '--help':
             print("USAGE:")
             print('--home: specify atomic home')
@@ -686,6 +574,7 @@ def getMessages(args):
             print("--multitrial <directory with message files to be processed>")
             print("--verbose : will provide extra info for each message, e.g. x/z coords") 
             print("--psychsimdir <directory to store processed message files>")
+            print("--catalog [SQLite file] : find the message files through a trial catalog instead of listing --multitrial")
             return
 
     reader = JSONReader(room_list, verbose)
@@ -694,7 +583,10 @@ def getMessages(args):
         if msgdir == '':
             print("ERROR: must provide message directory --multitrial <directory>")
             return
-        file_arr = os.listdir(msgdir)
+        if catalog is None:
+            file_arr = os.listdir(msgdir)
+        else:
+            file_arr = [os.path.basename(f) for f in catalog.files(msgdir, ext=None)]
         for fi, f in enumerate(file_arr):
             full_path = os.path.join(msgdir,f)
             if os.path.isfile(full_path):
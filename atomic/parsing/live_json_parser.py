@@ -12,23 +12,11 @@ except ImportError:
 print = functools.partial(print, flush=True)
 from atomic.definitions import GOLD_STR, GREEN_STR
 from atomic.parsing.map_parser import extract_map
+from atomic.parsing.metadata_index import get_index
+from atomic.parsing.room_index import room, RoomIndex, closest_room
+from atomic.parsing.room_graph import RoomGraph
 from atomic.parsing.make_rddl_instance import generate_rddl_victims_from_list
 
-class room(object):
-    def __init__(self, name, coords):
-        [x0, z0, x1, z1] = coords
-        self.name = name
-        self.x0= min(x0, x1)
-        self.x1= max(x0, x1)
-        self.z0= min(z0, z1)
-        self.z1= max(z0, z1)
-
-    def in_room(self, _x, _z, epsilon = 0):
-        return (self.x0 - epsilon <= _x) and (_x <= self.x1 + epsilon) and (self.z0 - epsilon <= _z) and (_z <= self.z1 + epsilon)
-    
-    def __repr__(self):
-        return '%s %.0f %.0f %.0f %.0f' % (self.name, self.x0, self.x1, self.z0, self.z1)
-
 class victim(object):
     def __init__(self, loc, color, x, z):
         self.room = loc
@@ -76,6 +64,7 @@ class JSONReader(object):
                         'Event:ItemEquipped': ['equippeditemname']}
         self.verbose = verbose
         self.rooms = {}
+        self.room_index = RoomIndex([])
         self.fname = fname
         if use_ihmc_locations:
             self.locations_from = LOCATION_MONITOR
@@ -86,6 +75,7 @@ class JSONReader(object):
         self.player_maps = {}
         self.player_marker = {}
         self.saved_victim_ids = []
+        self.index = None
         self.chat_msg = {} # use for chat (testing)
             
     def registerFeatures(self, feats):
@@ -101,9 +91,8 @@ class JSONReader(object):
     def process_json_file(self, fname):
         self.reset()
         
-        jsonfile = open(fname, 'rt')
-        self.jsonMsgs = [json.loads(line) for line in jsonfile.readlines()]
-        jsonfile.close()        
+        self.index = get_index(self.index, fname)
+        self.jsonMsgs = self.index.messages
         self.allMTypes = set()
         
 #        if tqdm and not self.verbose:
@@ -116,32 +105,22 @@ class JSONReader(object):
             self.allMTypes.add(jmsg['msg']['sub_type'])
             
     def read_semantic_map(self):        
-        jsonfile = open(self.fname, 'rt')
-        
-        self.semantic_map = None
-        for line in jsonfile.readlines():
-            jmsg = json.loads(line)
-            if 'semantic_map' in jmsg['data'].keys():
-                self.semantic_map = jmsg['data']['semantic_map']
-                break
-        else:
+        self.index = get_index(self.index, self.fname)
+        self.semantic_map = self.index.semantic_map
+        if self.semantic_map is None:
             raise ValueError('Unable to find semantic map')
-        jsonfile.close()
 
         # Sudeepta's map transformation code
         room_dict, room_connections = extract_map(self.semantic_map)
         
         if self.USE_COLLAPSED_MAP:
-            ## Overwrite room_edges and store name lookup and new room names
+            ## Overwrite room_graph and store name lookup and new room names
             from atomic.parsing.remap_connections import transformed_connections
-            self.room_edges = []
             edges, self.room_name_lookup, new_map, orig_map = transformed_connections(self.semantic_map)
-            for a,b in edges:
-                self.room_edges.append((a,b))
-                self.room_edges.append((b,a))     
+            self.room_graph = RoomGraph.from_undirected(edges)
             self.new_room_names = new_map['new_locations']
         else:
-            self.room_edges = room_connections
+            self.room_graph = RoomGraph(room_connections)
 
         ## Whether we're using the collapsed map or not, we keep track of the coordinates of the ORIGINAL rooms            
         for rid, coords in room_dict.items():
@@ -151,20 +130,18 @@ class JSONReader(object):
             z1 = coords[1]['z']
             rm = room(rid, [x0, z0, x1, z1])
             self.rooms[rid] = rm
+        self.room_index = RoomIndex(self.rooms.values())
 
     def add_rooms_map_live(self,mmsg):        
         room_dict, room_connections = extract_map(self.semantic_map)     
         if self.USE_COLLAPSED_MAP:
-            ## Overwrite room_edges and store name lookup and new room names
+            ## Overwrite room_graph and store name lookup and new room names
             from atomic.parsing.remap_connections import transformed_connections
-            self.room_edges = []
             edges, self.room_name_lookup, new_map, orig_map = transformed_connections(self.semantic_map)
-            for a,b in edges:
-                self.room_edges.append((a,b))
-                self.room_edges.append((b,a))     
+            self.room_graph = RoomGraph.from_undirected(edges)
             self.new_room_names = new_map['new_locations']
         else:
-            self.room_edges = room_connections
+            self.room_graph = RoomGraph(room_connections)
         ## Whether we're using the collapsed map or not, we keep track of the coordinates of the ORIGINAL rooms            
         for rid, coords in room_dict.items():
             x0 = coords[0]['x']
@@ -173,30 +150,21 @@ class JSONReader(object):
             z1 = coords[1]['z']
             rm = room(rid, [x0, z0, x1, z1])
             self.rooms[rid] = rm
+        self.room_index = RoomIndex(self.rooms.values())
 
         # NOT USED EXCEPT IN PKL    
     def get_victims(self):
         self.read_semantic_map()
-        jsonfile = open(self.fname, 'rt')
-        jsonMsgs = [json.loads(line) for line in jsonfile.readlines()]
-        jsonfile.close()
-        
-        for jmsg in jsonMsgs:
-            mtype = jmsg['msg']['sub_type']
-            m = jmsg['data']
-            if mtype == 'Mission:VictimList':
-                return self.make_victims_list(m['mission_victim_list'])
-            
-        return None
+        if self.index.victim_list is None:
+            return None
+        return self.make_victims_list(self.index.victim_list)
         
     
     def is_2steps_connected(self, rm1, rm2):
-        nbrs_of_1 = set([other for (rma, other) in self.room_edges if rma == rm1])
-        nbrs_of_2 = set([other for (rma, other) in self.room_edges if rma == rm2])
-        common_nbrs = nbrs_of_1.intersection(nbrs_of_2)
+        common_nbrs = self.room_graph.common_neighbors(rm1, rm2)
         if len(common_nbrs) == 0:
             return False, None
-        return True, common_nbrs.pop()
+        return True, common_nbrs[0]
         
     
     def process_message(self, jmsg): 
@@ -215,7 +183,8 @@ class JSONReader(object):
                 return
         elif mtype not in self.msg_types:
             return
-        m = jmsg['data']
+        # The decoded messages are shared with the file's index, so annotate a copy
+        m = dict(jmsg['data'])
         m['sub_type'] = mtype
         
         if mtype == "Event:MissionState":
@@ -285,7 +254,7 @@ class JSONReader(object):
             distance_away = -1
             if (prev_rm == ''):
                 distance_away = 1
-            elif (prev_rm, room_name) in self.room_edges:
+            elif self.room_graph.has_edge(prev_rm, room_name):
                 distance_away = 1
             else:
                 connected, common_nbr = self.is_2steps_connected(prev_rm, room_name)
@@ -293,7 +262,7 @@ class JSONReader(object):
                     distance_away = 2                    
             
             ## If new and old rooms not connected
-#            if (prev_rm != '') and (self.room_edges is not None) and ((prev_rm,room_name) not in self.room_edges):
+#            if (prev_rm != '') and (self.room_graph is not None) and (not self.room_graph.has_edge(prev_rm, room_name)):
             if distance_away < 0:
                 if self.verbose: print('Error: %s and %s not connected' %(prev_rm, room_name))
                 
@@ -361,7 +330,7 @@ class JSONReader(object):
             ## If event room doesn't match player's last room
             if event_room != prev_rm:
                 ## If connected, inject an Event:location message
-                conn = (prev_rm, m['room_name']) in self.room_edges
+                conn = self.room_graph.has_edge(prev_rm, m['room_name'])
                 if conn:
                     injected_msg = {'sub_type':'Event:location', 'playername':player, 
                                      'old_room_name': prev_rm, 'room_name':event_room, 'mission_timer':m['mission_timer']}
@@ -371,7 +340,7 @@ class JSONReader(object):
                     if self.verbose: print('Injected', injected_msg, 'to reconcile', m)
                 else:
                     if self.verbose: print('Error: Player %s last moved to %s but event %s is in %s. 1-away %s' 
-                          %(player, prev_rm, mtype, event_room, self.one_step_removed(self.player_to_curr_room[player], event_room)))
+                          %(player, prev_rm, mtype, event_room, self.room_graph.one_step_removed(self.player_to_curr_room[player], event_room)))
         
         if self.verbose and (not is_location_event) and ('room_name' in m.keys()):
             print('%s did %s in %s (orig %s) to %s %s' %(player, mtype, m['room_name'], m.get('orig_room_name', ''), m.get('victim_id', ''),
@@ -428,36 +397,13 @@ class JSONReader(object):
         rddl_inst_file.close()
         
     
-    def one_step_removed(self, rm1, rm2):
-        if (rm1, rm2) in self.room_edges:
-            return True
-        nbr1 = set([edge[1] for edge in self.room_edges if edge[1] == rm1])
-        nbr2 = set([edge[1] for edge in self.room_edges if edge[1] == rm2])
-        return len(nbr1.intersection(nbr2)) > 0
-
     def getClosestRoom(self, x, z, candidate_rooms=[]):
         if candidate_rooms == []:
-            candidate_rooms = self.rooms.values()
-        min_diff = 1e5
-        closest = None
-        for rm in candidate_rooms:
-            x_diff = 0
-            z_diff = 0
-            if x < rm.x0:
-                x_diff = rm.x0 - x
-            elif x > rm.x1:
-                x_diff = x - rm.x1
-            if z < rm.z0:
-                z_diff = rm.z0 - z
-            elif z > rm.z1:
-                z_diff = z - rm.z1
-            if (x_diff + z_diff) < min_diff:
-                min_diff = x_diff + z_diff
-                closest = rm
-        return closest, min_diff
+            return self.room_index.closest(x, z)
+        return closest_room(x, z, candidate_rooms)
 
     def getRoom(self, x, z): 
-        inrooms = [r for r in self.rooms.values() if r.in_room(x,z)]
+        inrooms = self.room_index.containing(x, z)
         if len(inrooms) == 1:
             return inrooms[0].name
 #        closest, min_diff = self.getClosestRoom(x, z, inrooms)
@@ -8,8 +8,7 @@ Created on Thu Apr  2 20:35:23 2020
 import logging
 from atomic.parsing import GameLogParser
 from atomic.parsing.live_json_parser import JSONReader
-from atomic.definitions import MISSION_DURATION
-import numpy as np
+from atomic.parsing.time_bins import build_action_table, NOOP
 
 
 class MsgQCreator(GameLogParser):
@@ -49,83 +48,18 @@ class MsgQCreator(GameLogParser):
         self.createActionQs()
         
 
-    def _getGroupedMsgs(self, player, maxTime):
-        nextMsg = self.nextMsgIdx[player]
-        groupedMsgs = []
-        while nextMsg < len(self.playerToMsgs[player]):
-            msg = self.playerToMsgs[player][nextMsg]
-            
-            if 'mission_timer' not in msg or ':' not in msg['mission_timer']:
-                nextMsg = nextMsg + 1
-                continue
-            
-            ## If malformed time, skip
-            nums = msg['mission_timer'].split(':')
-            if any(not n.strip().isdigit() for n in nums):
-                nextMsg = nextMsg + 1
-                continue
-            
-            ## Extract time
-            ts = [int(n) for n in nums]
-            timeInSec = MISSION_DURATION - (ts[0] * 60) - ts[1]
-            
-            ## If message is later than our cutoff time, break
-            if timeInSec > maxTime:
-                break
-            
-            ## If message is earlier than our cutoff time, include it and increment index
-            groupedMsgs.append(nextMsg)
-            nextMsg = nextMsg + 1
-            
-            
-        self.nextMsgIdx[player] = nextMsg
-        return groupedMsgs
-    
-
     def createActionQs(self):
-        self.nextMsgIdx = {p:0 for p in self.players}
+        players = list(self.players)
+        self.action_table = build_action_table([self.playerToMsgs[player] for player in players], self.grouping_res)
         self.actions = []
-
-        ## For every time interval
-        for timeNow in np.arange(0, MISSION_DURATION+1, self.grouping_res):
-            self.logger.debug('=== Seconds %d to %d' %(timeNow, timeNow + self.grouping_res))
-            
-            ## For each player, get the actions they did in this interval
-            playerToMs = {p:self._getGroupedMsgs(p, timeNow + self.grouping_res) for p in self.players}
-            
-            ## Determine the largest number of actions a player did in this interval
-            maxNumActs = np.max([len(msgs) for msgs in playerToMs.values()])
-            
-            ## If all players have processed all their messages, we're done.
-            allDone = True
-            for player, msgIdx in self.nextMsgIdx.items():
-                if msgIdx < len(self.playerToMsgs[player]):
-                    allDone = False
-                    break
-            if allDone:
-                if self.verbose: print('Everyone done')
-                break
-            
-            ## Add noops to players who don't have enough actions
-            for player in self.players:
-                if len(playerToMs[player]) < maxNumActs:
-                    playerToMs[player].extend(np.repeat([-1], maxNumActs - len(playerToMs[player]), 0))
-                    
-            for ai in range(maxNumActs):
-                step_actions = {}
-                for player in self.players:
-                    msgIdx = playerToMs[player][ai]
-                    if msgIdx == -1:
-                        msg = {'sub_type':'noop'}
-                    else:
-                        try:
-                            msg = self.playerToMsgs[player][msgIdx]
-                        except IndexError:
-                            logging.error(f'Player "{player}" has {len(self.playerToMsgs[player])} messages, '\
-                                f'so index {msgIdx} (during {timeNow}-{timeNow+self.grouping_res}) is too high.')
-                            msg = {'sub_type':'noop'}
-                    msg['realname'] = player
-                    msg['playername'] = self.playerToAgent[player]
-                    step_actions[self.playerToAgent[player]] = msg
-                self.actions.append(step_actions)
-                        
+        for row in self.action_table:
+            step_actions = {}
+            for player, msgIdx in zip(players, row):
+                if msgIdx == NOOP:
+                    msg = {'sub_type':'noop'}
+                else:
+                    msg = self.playerToMsgs[player][msgIdx]
+                msg['realname'] = player
+                msg['playername'] = self.playerToAgent[player]
+                step_actions[self.playerToAgent[player]] = msg
+            self.actions.append(step_actions)
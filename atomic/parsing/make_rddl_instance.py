@@ -12,6 +12,7 @@ import json
 import os
 from atomic.parsing.map_parser import read_semantic_map
 from atomic.parsing.remap_connections import transformed_connections
+from atomic.parsing.room_graph import RoomGraph
 
 SIMPLE_COLLAPSE = 0
 MAX_NBR_COLLAPSE = 1
@@ -173,14 +174,12 @@ def make_rddl_inst_fol(edges, room_name_lookup, collapse_method,
     ''' Create a RDDL instance from a RDDL template containing everything but the locations and adjacency info
         which are obtained from a semantic map.    '''
 
+    graph = edges if isinstance(edges, RoomGraph) else RoomGraph(edges)
+    if collapse_method == SIMPLE_COLLAPSE:
+        graph = graph.relabel(lambda rm: rm.split('_')[0])
+
     neighbors = {}
-    for r1, r2 in edges:
-        if collapse_method == SIMPLE_COLLAPSE:
-            r1 = r1.split('_')[0]
-            r2 = r2.split('_')[0]
-            if r1 == r2:
-                continue
-            
+    for r1, r2 in graph:
         if r1 not in neighbors:
             neighbors[r1] = set()
         if r2 not in neighbors:
@@ -245,10 +244,10 @@ if __name__ == '__main__':
     collapse_method = MAX_NBR_COLLAPSE
     map_file = '../maps/Saturn/Saturn_1.5_3D_sm_v1.0.json'
     MAX_NBRS = 8
-    edges = []
     
     if collapse_method == SIMPLE_COLLAPSE:
         rooms, edges = read_semantic_map(map_file)
+        room_graph = RoomGraph(edges)
         room_name_lookup = {rm:rm for rm in rooms.keys()}
     elif collapse_method == MAX_NBR_COLLAPSE:
 #        orig_map = json.load(open(map_file,'r'))
@@ -258,12 +257,8 @@ if __name__ == '__main__':
         metadata_file = os.path.join(ddir, jsonFile)
         orig_map = get_map_from_metadata(metadata_file)
         one_way_edges, room_name_lookup, new_map, orig_map = transformed_connections(orig_map)
-        has_edge = set( [a for a,b in one_way_edges] + [b for a,b in one_way_edges] )
-        isolated_rooms = [rm for rm in room_name_lookup.values() if rm not in has_edge]        
-        
-        for a,b in one_way_edges:
-            edges.append((a,b))
-            edges.append((b,a))
+        room_graph = RoomGraph.from_undirected(one_way_edges)
+        isolated_rooms = [rm for rm in room_name_lookup.values() if rm not in room_graph.adjacency]
             
     generate_victims = False
     rddl_template = '../../data/rddl_psim/study3/mv4_ver2_tmplt.rddl'
@@ -275,7 +270,7 @@ if __name__ == '__main__':
         for tag in ['A', 'B']:
             victim_pickles[tag] = os.path.join(os.path.dirname(__file__), '..', 'data', 'rddl_psim', 'victims'+tag+'.pickle')
 
-    make_rddl_inst_fol(edges, room_name_lookup, collapse_method, 
+    make_rddl_inst_fol(room_graph, room_name_lookup, collapse_method, 
                        rddl_template,
                        rddl_out,
                        victim_pickles, map_out_csv)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Columnar store of parsed trial messages with a vectorized query API.
+
+Every field becomes one integer array of categorical codes (a missing field is encoded like the empty string, as
+msg.get(field, '') would return it), plus a float array for fields whose values are all numeric (e.g., time_sec).
+Filters, tallies and sequence matching then reduce to numpy comparisons over those arrays, instead of Python loops
+over the message dicts that re-lowercase every value on every pass.
+"""
+import json
+from collections import Counter
+import numpy as np
+
+
+def _category_key(value):
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        # Lists/dicts (e.g., addressees, players_in_range) are compared by content
+        return ('__json__', json.dumps(value, sort_keys=True, default=str))
+
+
+class Column(object):
+    """
+    A single field of the store
+    :ivar codes: The categorical code of each message's value
+    :type codes: np.ndarray
+    :ivar present: Whether each message actually has the field
+    :type present: np.ndarray
+    :ivar values: The (first seen) value corresponding to each code
+    :type values: list
+    :ivar numeric: The value of each message as a float (NaN if absent), if all present values are numbers
+    :type numeric: np.ndarray
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.codes = np.zeros(size, dtype=np.int32)
+        self.present = np.zeros(size, dtype=bool)
+        self.values = ['']
+        self.lookup = {'': 0}
+        self.numeric = None
+        self._lower = None
+        self._lower_lookup = None
+
+    def encode(self, value):
+        key = _category_key(value)
+        code = self.lookup.get(key)
+        if code is None:
+            code = self.lookup[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code(self, value):
+        """
+        :return: the code of the given value (-1 if no message has that value)
+        """
+        return self.lookup.get(_category_key(value), -1)
+
+    def lower_codes(self):
+        """
+        :return: codes under case-insensitive string comparison (str(value).lower()), and the lookup from lowered
+        string to code
+        """
+        if self._lower is None:
+            self._lower_lookup = {}
+            translation = np.array([self._lower_lookup.setdefault(str(value).lower(), len(self._lower_lookup))
+                                    for value in self.values], dtype=np.int32)
+            self._lower = translation[self.codes]
+        return self._lower, self._lower_lookup
+
+
+class MessageStore(object):
+    """
+    Columnar view of a list of (flat) message dicts, queried with the same semantics as the JSONReader loops
+    :ivar messages: The original messages, in order
+    :type messages: List(dict)
+    :ivar columns: The column for each field appearing in any message
+    :type columns: Dict(str,Column)
+    """
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.size = len(messages)
+        self.columns = {}
+        numeric = {}
+        for i, msg in enumerate(messages):
+            for key, value in msg.items():
+                column = self.columns.get(key)
+                if column is None:
+                    column = self.columns[key] = Column(key, self.size)
+                    numeric[key] = True
+                column.codes[i] = column.encode(value)
+                column.present[i] = True
+                if numeric[key] and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                    numeric[key] = False
+        for key, column in self.columns.items():
+            if numeric[key]:
+                column.numeric = np.full(self.size, np.nan)
+                column.numeric[column.present] = [column.values[code] for code in column.codes[column.present]]
+
+    def __len__(self):
+        return self.size
+
+    def codes(self, key):
+        """
+        :return: the codes of the given field (all zero, i.e., '', if no message has it)
+        """
+        column = self.columns.get(key)
+        return np.zeros(self.size, dtype=np.int32) if column is None else column.codes
+
+    def code(self, key, value):
+        column = self.columns.get(key)
+        if column is None:
+            return 0 if _category_key(value) == '' else -1
+        return column.code(value)
+
+    def match(self, conditions, ignore_none=True):
+        """
+        :param conditions: field -> value that must be equal (msg.get(field, '') == value)
+        :param ignore_none: if True, conditions with a None value are wildcards and are ignored
+        :return: boolean mask of the messages satisfying all of the given conditions
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for key, value in conditions.items():
+            if value is not None or not ignore_none:
+                mask &= self.codes(key) == self.code(key, value)
+        return mask
+
+    def match_lower(self, keys, values):
+        """
+        :return: boolean mask of the messages whose fields equal the given values under str(.).lower()
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for key, value in zip(keys, values):
+            value = str(value).lower()
+            column = self.columns.get(key)
+            if column is None:
+                mask &= value == ''
+            else:
+                codes, lookup = column.lower_codes()
+                mask &= codes == lookup.get(value, -1)
+        return mask
+
+    def select(self, mask, keep_keys=None):
+        """
+        :return: the messages in the given mask (only the given fields of each, if keep_keys is not None)
+        """
+        indices = np.flatnonzero(mask)
+        if keep_keys is None:
+            return [self.messages[i] for i in indices]
+        return [{k: self.messages[i][k] for k in keep_keys} for i in indices]
+
+    def filter(self, keys, values, keep_keys=None, negate=False):
+        mask = self.match_lower(keys, values)
+        return self.select(~mask if negate else mask, keep_keys)
+
+    def tally(self, mask, key):
+        """
+        :return: the count of each value of the given field among the messages in the given mask
+        """
+        column = self.columns.get(key)
+        if not mask.any():
+            return Counter()
+        if column is None or not column.present[mask].all():
+            raise KeyError(key)
+        counts = np.bincount(column.codes[mask], minlength=len(column.values))
+        return Counter({column.values[code]: int(count) for code, count in enumerate(counts) if count})
+
+    def collect_sequence(self, msg1_condition, msg2_condition, time_limit, time_key='time_sec'):
+        """
+        Pairs each message matching msg1_condition with the next message matching msg2_condition that agrees with it
+        on the wildcard (None) fields of msg1_condition.  Same semantics as JSONReader.collect_msg_seq.
+        """
+        mask1 = self.match(msg1_condition)
+        mask2 = self.match(msg2_condition, ignore_none=False) & ~mask1
+        wildcards = [self.codes(key) for key, val in msg1_condition.items() if val is None]
+        times = self.columns[time_key].numeric if time_key in self.columns else None
+        positives = []
+        negatives = []
+        pending = {}
+        num_pending = 0
+        for i in np.flatnonzero(mask1 | mask2):
+            key = tuple(int(codes[i]) for codes in wildcards)
+            if mask1[i]:
+                pending.setdefault(key, []).append(i)
+                num_pending += 1
+            elif num_pending > 0 and key in pending:
+                msg = self.messages[i]
+                for j in pending.pop(key):
+                    tdiff = times[i] - times[j] if times is not None else msg[time_key] - self.messages[j][time_key]
+                    if tdiff <= time_limit:
+                        positives.append([self.messages[j], msg, tdiff])
+                    else:
+                        negatives.append([self.messages[j], msg, tdiff])
+                    num_pending -= 1
+        ## Add any un-paired msg1s to the negatives
+        for j in sorted(j for indices in pending.values() for j in indices):
+            negatives.append([self.messages[j], None, -1])
+        return positives, negatives
+
+    def collapse(self, remove_types=[], type_to_fields={}, base_fields=('sub_type', 'playername', 'room_name')):
+        """
+        Drops every message whose relevant fields (base_fields plus type_to_fields for its sub_type) are all
+        unchanged from the previously kept message.  Same semantics as JSONReader.collapse_messages.
+        """
+        removed = np.zeros(self.size, dtype=bool)
+        sub_types = self.codes('sub_type')
+        for sub_type in remove_types:
+            removed |= sub_types == self.code('sub_type', sub_type)
+        indices = np.flatnonzero(~removed)
+        if len(indices) == 0:
+            return []
+        sub_types = sub_types[indices]
+        # Which messages care about each field
+        relevant = {field: np.ones(len(indices), dtype=bool) for field in base_fields}
+        for sub_type, fields in type_to_fields.items():
+            is_type = sub_types == self.code('sub_type', sub_type)
+            for field in fields:
+                if field not in relevant:
+                    relevant[field] = np.zeros(len(indices), dtype=bool)
+                relevant[field] |= is_type
+        # A dropped message equals the last kept one on all its relevant fields, so comparing against the
+        # immediately preceding message is equivalent to comparing against the last kept one
+        changed = np.zeros(len(indices), dtype=bool)
+        for field, mask in relevant.items():
+            codes = self.codes(field)[indices]
+            diff = np.empty(len(indices), dtype=bool)
+            diff[0] = codes[0] != 0
+            diff[1:] = codes[1:] != codes[:-1]
+            changed |= diff & mask
+        return [self.messages[i] for i in indices[changed]]
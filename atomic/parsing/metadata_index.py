@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Single-pass index over a testbed .metadata file (one JSON message per line).
+
+The file is read and decoded exactly once.  That pass records the semantic map, the mission victim list, the
+role selections, the byte offsets of the mission start/stop messages and the byte offsets of every message,
+grouped by sub_type.  All later accessors are served from the index rather than from another read of the file.
+"""
+import json
+
+
+class MetadataIndex(object):
+    """
+    Per-file index of a .metadata log
+    :ivar fname: Name of the indexed log file
+    :type fname: str
+    :ivar semantic_map: The semantic map found in the log (None if there is none)
+    :type semantic_map: dict
+    :ivar victim_list: The first mission victim list found in the log (None if there is none)
+    :type victim_list: list
+    :ivar roles: The data of all Event:RoleSelected messages, in log order
+    :type roles: list
+    :ivar mission_start: Byte offset of the first Event:MissionState Start message (None if there is none)
+    :type mission_start: int
+    :ivar mission_stop: Byte offset of the last Event:MissionState Stop message (None if there is none)
+    :type mission_stop: int
+    :ivar offsets: Byte offsets of each message, keyed by sub_type
+    :type offsets: Dict(str,List(int))
+    :ivar messages: The decoded messages, in log order (shared by every reader of the index, so copy any part before
+    modifying it)
+    :type messages: list
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.semantic_map = None
+        self.victim_list = None
+        self.roles = []
+        self.mission_start = None
+        self.mission_stop = None
+        self.offsets = {}
+        self.messages = []
+        self.build()
+
+    def build(self):
+        """
+        Streams through the file once, decoding every line and filling in the index
+        """
+        offset = 0
+        with open(self.fname, 'rb') as jsonfile:
+            for line in jsonfile:
+                start = offset
+                offset += len(line)
+                if not line.strip():
+                    continue
+                jmsg = json.loads(line)
+                self._index_message(jmsg, start)
+                self.messages.append(jmsg)
+
+    def _index_message(self, jmsg, offset):
+        mtype = jmsg['msg']['sub_type']
+        data = jmsg['data']
+        self.offsets.setdefault(mtype, []).append(offset)
+        if self.semantic_map is None and 'semantic_map' in data:
+            self.semantic_map = data['semantic_map']
+        if mtype == 'Mission:VictimList':
+            if self.victim_list is None:
+                self.victim_list = data['mission_victim_list']
+        elif mtype == 'Event:RoleSelected':
+            self.roles.append(data)
+        elif mtype == 'Event:MissionState':
+            if data.get('mission_state') == 'Start':
+                if self.mission_start is None:
+                    self.mission_start = offset
+            elif data.get('mission_state') == 'Stop':
+                self.mission_stop = offset
+
+    @property
+    def sub_types(self):
+        return set(self.offsets.keys())
+
+    def count(self, sub_type=None):
+        """
+        :return: the number of messages of the given sub_type (all messages if sub_type is None)
+        """
+        if sub_type is None:
+            return sum(map(len, self.offsets.values()))
+        return len(self.offsets.get(sub_type, []))
+
+    def __iter__(self):
+        """
+        Iterates through the decoded messages, in log order
+        """
+        return iter(self.messages)
+
+    def __len__(self):
+        return self.count()
+
+
+def get_index(index, fname):
+    """
+    :param index: the index a reader built so far (None if it has none)
+    :type index: MetadataIndex
+    :param fname: the name of the log file the reader needs the index of
+    :return: the given index, if it is of the given file, or a new index of the file otherwise
+    :rtype: MetadataIndex
+    """
+    if index is None or index.fname != fname:
+        index = MetadataIndex(fname)
+    return index
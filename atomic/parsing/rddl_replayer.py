@@ -1,14 +1,23 @@
 from argparse import ArgumentParser
 import configparser
+import contextlib
 import cProfile
+import functools
 import logging
 import os.path
 import sys
+import time
 import glob
+import multiprocessing
 import traceback
+import pandas
 from atomic.definitions.map_utils import get_default_maps
 from atomic.parsing.get_psychsim_action_name import Msg2ActionEntry
+from atomic.parsing import stage_profile
 from atomic.parsing.parse_into_msg_qs import MsgQCreator
+from atomic.parsing.trial_catalog import CATALOG_FILE, TrialCatalog
+from atomic.parsing.world_cache import WorldCache
+from atomic.util.mp import get_pool_and_map
 from rddl2psychsim.conversion.converter import Converter
 try:
     import enlighten
@@ -26,16 +35,21 @@ TEAM_ID_TAG = 'Team'
 TRIAL_TAG = 'Trial'
 
 
-def accumulate_files(files, include_trials=None, ext='.metadata', logger=logging):
+def accumulate_files(files, include_trials=None, ext='.metadata', logger=logging, catalog=None):
     """
     Accumulate a list of files from a given list of names of files and directories
     :type files: List(str)
     :rtype: List(str)
     :type include_trials: Set/List(int)
+    :param catalog: If given, look up the contents of directories in this index, instead of listing them
+    :type catalog: TrialCatalog
     """
     result = []
     for fname in files:
-        if os.path.isdir(fname):
+        if catalog is not None and os.path.isdir(fname):
+            result += [os.path.join(fname, os.path.basename(name)) for name in catalog.files(fname, ext, include_trials)
+                       if os.path.join(fname, os.path.basename(name)) not in result]
+        elif os.path.isdir(fname):
             # We have a directory full of log files to process
             result += [os.path.join(fname, name) for name in sorted(os.listdir(fname))
                        if os.path.splitext(name)[1] == ext and os.path.join(fname, name) not in result]
@@ -73,11 +87,11 @@ def accumulate_files(files, include_trials=None, ext='.metadata', logger=logging
     return result
 
 
-def make_augmented_world(fname, visitation=True, victims=None, conditions={}):
-    # Team mission
+def convert_world(fname, visitation=True):
+    """
+    Converts the given RDDL file into a PsychSim world, optionally adding visitation flags for each player/room
+    """
     rddl_converter = Converter()
-    if 'MAP' in fname:
-        fname = fname.replace('MAP', conditions['CondWin'][-1])
     rddl_converter.convert_file(fname, verbose=False)
     if visitation:
         # Add visitation flags for each player/room
@@ -88,6 +102,23 @@ def make_augmented_world(fname, visitation=True, victims=None, conditions={}):
                 tree = makeTree({'if': equalRow(stateKey(player_name, 'pLoc', True), loc),
                                  True: setToConstantMatrix(var, 1), False: scaleMatrix(var, 0.99)})
                 rddl_converter.world.setDynamics(var, True, tree)
+    return rddl_converter
+
+
+@stage_profile.profiled('make_augmented_world')
+def make_augmented_world(fname, visitation=True, victims=None, conditions={}, cache=None):
+    """
+    :param cache: if provided, the converted world is a copy of the template stored there, and conversion happens
+    only if the RDDL file (with this augmentation) has not been converted before
+    :type cache: WorldCache
+    """
+    # Team mission
+    if 'MAP' in fname:
+        fname = fname.replace('MAP', conditions['CondWin'][-1])
+    if cache is None:
+        rddl_converter = convert_world(fname, visitation)
+    else:
+        rddl_converter = cache.get(cache.key(fname, visitation=visitation), lambda: convert_world(fname, visitation))
     if victims:
         victim_counts = {}
         for victim in victims:
@@ -116,6 +147,55 @@ def make_augmented_world(fname, visitation=True, victims=None, conditions={}):
                     rddl_converter.world.setFeature(var, victim_counts[room][value])
     return rddl_converter
 
+
+# The replayer whose files are being processed by the worker pool (inherited by the forked workers)
+_parallel_replayer = None
+
+
+def merge_entries(current, added):
+    """
+    Merges the entries a replay added to a dictionary (e.g., keyed by file)
+    """
+    current.update(added)
+    return current
+
+
+def merge_items(current, added):
+    """
+    Merges the items a replay appended to a list
+    """
+    current.extend(added)
+    return current
+
+
+def merge_rows(current, added):
+    """
+    Merges the rows a replay appended to a table
+    """
+    return pandas.concat([current, added], ignore_index=True)
+
+
+def _replay_in_worker(fname, num_steps):
+    """
+    Worker side of Replayer.process_files: replays a single file on the worker's copy of the replayer
+    :return: the file name, whether it was processed, the traceback of any uncaught exception, and the state the
+    replay added to the replayer
+    """
+    # Per-step progress bars from concurrent workers would garble the terminal
+    global pbar_manager
+    pbar_manager = None
+    replayer = _parallel_replayer
+    snapshot = replayer.state_snapshot()
+    try:
+        with replayer.profiling(fname):
+            success = replayer.process_file(fname, num_steps)
+        error = None
+    except:
+        success = False
+        error = traceback.format_exc()
+    return fname, success, error, replayer.state_delta(snapshot)
+
+
 class Replayer(object):
     """
     Base class for replaying log files
@@ -125,12 +205,27 @@ class Replayer(object):
     :type rddl_file: str
     :ivar action_file: Name of CSV file containing the mapping between JSON messages and PsychSim actions
     :type action_file: str
+    :ivar processes: Number of worker processes replaying files in parallel (1 is serial, less than 1 is one per core)
+    :type processes: int
+    :ivar failed: Files whose replay failed (with the traceback, if any) in the last parallel run
+    :type failed: Dict(str,str)
+    :ivar world_cache: Store of the worlds already converted from the RDDL file (persisted if given a directory)
+    :type world_cache: WorldCache
+    :ivar profile_stages: If True, record the time spent in each stage of each replay (see profile_name)
+    :type profile_stages: bool
+    :ivar stage_profiles: The summary of the stages of each replay profiled
+    :type stage_profiles: Dict(str,List(dict))
     """
     OBSERVER = 'ATOMIC'
+    # The attributes that the replay of a file adds its results to, each with the function merging what a replay in a
+    # worker process added to it into the same attribute of this replayer (see state_delta).  Anything else a replay
+    # changes stays in the worker process
+    MERGED_ATTRIBUTES = {'times': merge_entries, 'stage_profiles': merge_entries}
 
-    def __init__(self, files=[], trials=None, config=None, maps=None, rddl_file=None, action_file=None, aux_file=None, logger=logging):
+    def __init__(self, files=[], trials=None, config=None, maps=None, rddl_file=None, action_file=None, aux_file=None, logger=logging,
+                 processes=1, world_cache=None, catalog=None):
         # Extract files to process
-        self.files = accumulate_files(files, trials)
+        self.files = accumulate_files(files, trials, catalog=catalog)
         # Extract maps
 #        self.maps = get_default_maps(logger) if maps is None else maps
 
@@ -155,6 +250,12 @@ class Replayer(object):
 
         self.pbar = None
 
+        self.processes = processes
+        self.failed = {}
+        self.world_cache = WorldCache(world_cache, logger)
+        self.profile_stages = False
+        self.stage_profiles = {}
+
     def process_files(self, num_steps=0, fname=None):
         """
         :param num_steps: if nonzero, the maximum number of steps to replay from each log (default is 0)
@@ -167,10 +268,129 @@ class Replayer(object):
         else:
             files = [fname]
         # Get to work
-        for fname in files:
-            self.process_file(fname, num_steps)
+        if self.processes != 1 and len(files) > 1 and self.can_parallelize():
+            self.process_files_parallel(files, num_steps)
+        else:
+            for fname in files:
+                with self.profiling(fname):
+                    self.process_file(fname, num_steps)
         self.finish()
 
+    def can_parallelize(self):
+        """
+        :return: True iff the files can be replayed independently of each other (subclasses whose replay depends on
+        the outcome of earlier files should override)
+        """
+        if multiprocessing.get_start_method() != 'fork':
+            self.logger.warning('Parallel replay requires forked worker processes; replaying serially')
+            return False
+        return True
+
+    def process_files_parallel(self, files, num_steps):
+        """
+        Replays the given files in a pool of worker processes, each running process_file on its own copy of this
+        replayer.  The state each replay adds is merged back in the order of the given files, so the result does not
+        depend on which worker finishes first.  A file that raises an exception (or whose results cannot be sent
+        or merged back) is logged and recorded in failed, without stopping the others.
+        """
+        global _parallel_replayer
+        self.failed.clear()
+        if pbar_manager:
+            try:
+                pbar = pbar_manager.counter(total=len(files), unit='files', desc='Replay')
+            except ValueError:
+                # Probably not running in a terminal
+                pbar = None
+        else:
+            pbar = None
+        _parallel_replayer = self
+        pool, map_func = get_pool_and_map(self.processes, iterator=True)
+        try:
+            results = map_func(functools.partial(_replay_in_worker, num_steps=num_steps), files)
+            for i, fname in enumerate(files):
+                try:
+                    fname, success, error, delta = next(results)
+                except Exception:
+                    success = False
+                    error = traceback.format_exc()
+                else:
+                    self.merge_state(delta)
+                if not success:
+                    self.failed[fname] = error
+                    if error:
+                        self.logger.error(f'Replay of {os.path.basename(fname)} failed:\n{error}')
+                    else:
+                        self.logger.error(f'Replay of {os.path.basename(fname)} failed')
+                if pbar: pbar.update()
+                self.logger.info(f'Completed {i+1} out of {len(files)} files ({sum(self.times.values())} messages)')
+        finally:
+            _parallel_replayer = None
+            pool.close()
+            pool.join()
+            if pbar: pbar.close()
+
+    def state_snapshot(self):
+        """
+        :return: the keys (of dictionaries) or lengths (of lists and tables) of the MERGED_ATTRIBUTES, for state_delta
+        to find what was added since
+        """
+        return {attr: set(getattr(self, attr)) if isinstance(getattr(self, attr), dict) else len(getattr(self, attr))
+                for attr in self.MERGED_ATTRIBUTES}
+
+    def state_delta(self, snapshot):
+        """
+        :return: what was added to each of the MERGED_ATTRIBUTES since the given snapshot: new dictionary entries
+        (which are dropped from this replayer, as they now belong to the replayer that merges them), or the items or
+        rows appended
+        """
+        delta = {}
+        for attr, before in snapshot.items():
+            value = getattr(self, attr)
+            if isinstance(value, dict):
+                delta[attr] = {key: value.pop(key) for key in value.keys()-before}
+            elif isinstance(value, pandas.DataFrame):
+                delta[attr] = value.iloc[before:]
+            else:
+                delta[attr] = value[before:]
+        return delta
+
+    def merge_state(self, delta):
+        """
+        Adds the state returned by state_delta (from another copy of this replayer) into this one
+        """
+        for attr, added in delta.items():
+            if len(added) > 0:
+                setattr(self, attr, self.MERGED_ATTRIBUTES[attr](getattr(self, attr), added))
+
+    @contextlib.contextmanager
+    def profiling(self, fname):
+        """
+        Records the time spent in each stage of the replay of the given file within the block (if profile_stages is
+        set), saving the summary in the file named by profile_name
+        """
+        if not self.profile_stages:
+            yield None
+            return
+        profile = stage_profile.StageProfile()
+        try:
+            with stage_profile.activate(profile):
+                yield profile
+        finally:
+            self.stage_profiles[fname] = profile.summary()
+            try:
+                profile.save(self.profile_name(fname))
+            except OSError:
+                self.logger.error(f'Unable to save stage profile of {os.path.basename(fname)}')
+                self.logger.error(traceback.format_exc())
+            self.logger.info(f'Stages of {os.path.basename(fname)}: {profile}')
+
+    def profile_name(self, fname):
+        """
+        :return: the name of the file in which to save the stage profile of the replay of the given file (by default,
+        next to it)
+        """
+        return f'{os.path.splitext(fname)[0]}_stages.csv'
+
     def process_file(self, fname, num_steps):
         logger = self.logger.getLogger(os.path.splitext(os.path.basename(fname))[0])
         logger.debug('Full path: {}'.format(fname))
@@ -228,7 +448,11 @@ class Replayer(object):
             return None
         try:
             if self.rddl_file:
-                rddl_converter = make_augmented_world(self.rddl_file, visitation=True, victims=parser.jsonParser.victims, conditions=filename_to_condition(fname))
+                start = time.time()
+                misses = self.world_cache.misses
+                rddl_converter = make_augmented_world(self.rddl_file, visitation=True, victims=parser.jsonParser.victims, conditions=filename_to_condition(fname),
+                                                      cache=self.world_cache)
+                logger.info(f'{"Converted" if self.world_cache.misses > misses else "Loaded cached"} world in {time.time()-start:.2f}s')
                 return rddl_converter
 
             else:
@@ -289,6 +513,7 @@ class Replayer(object):
                     logger.info(f'Msg {msg} becomes {action_name}')
                 else:
                     logger.warning(f'Msg {i} {msg} has unknown action {action_name}')
+                    stage_profile.count('unknown actions')
                     if msg['sub_type'] == 'Event:location':
                         logger.warning(f'Unable to find message {i} move action for {player_name} from {msg["old_room_name"]} to {msg["room_name"]}')
                     action_name = Msg2ActionEntry.get_action({'playername':player_name, 'sub_type':'noop'})
@@ -320,53 +545,59 @@ class Replayer(object):
                             logger.error(f'{var} = {world.getFeature(var, unique=True)}')
                     if illegal:
                         logger.error(f'Action {action} in msg {i} is currently illegal')
+                        stage_profile.count('illegal actions')
                 actions[player_name] = action
                 if 'old_room_name' in msg and msg['old_room_name']:
                     old_rooms[player_name] = msg['old_room_name']
                 if 'room_name' in msg and action['verb'] != 'noop':
                     new_rooms[player_name] = msg['room_name']
-            for name, models in world.get_current_models().items():
-                if name in old_rooms and old_rooms[name] != world.getState(name, 'pLoc', unique=True):
-                    logger.error(f'Before message {i}, {name} is in {world.getState(name, "pLoc", unique=True)}, not {old_rooms[name]}')
-                for model in models:
-                    beliefs = world.agents[name].getAttribute('beliefs', model)
-                    if beliefs is not True:
-                        for player_name, room in old_rooms.items():
-                            if room and world.getState(player_name, 'pLoc', beliefs, True) != room:
-                                logger.error(f'Before message {i}, {model} believes {player_name} to be in {world.getState(player_name, "pLoc", beliefs, True)}, not {room}')
-            self.pre_step(world, parser, logger)
+            with stage_profile.stage('validation'):
+                for name, models in world.get_current_models().items():
+                    if name in old_rooms and old_rooms[name] != world.getState(name, 'pLoc', unique=True):
+                        logger.error(f'Before message {i}, {name} is in {world.getState(name, "pLoc", unique=True)}, not {old_rooms[name]}')
+                    for model in models:
+                        beliefs = world.agents[name].getAttribute('beliefs', model)
+                        if beliefs is not True:
+                            for player_name, room in old_rooms.items():
+                                if room and world.getState(player_name, 'pLoc', beliefs, True) != room:
+                                    logger.error(f'Before message {i}, {model} believes {player_name} to be in {world.getState(player_name, "pLoc", beliefs, True)}, not {room}')
+            with stage_profile.stage('pre_step'):
+                self.pre_step(world, parser, logger)
             logger.info(f'Actions: {", ".join(sorted(map(str, actions.values())))}')
-            world.step(actions, debug=debug)
+            with stage_profile.stage('step'):
+                world.step(actions, debug=debug)
             if len(actions) < len(parser.agentToPlayer):
                 logger.error(f'Missing action in msg {i} for {sorted(parser.agentToPlayer.keys()-actions.keys())}')
                 break
             player = world.agents['p3']
             logger.info(f'Completed step for message {i} (R={player.reward(model=player.get_true_model())})')
-            self.post_step(world, actions, i, parser, debug, logger)
-            for name, models in world.get_current_models().items():
-                if name in new_rooms and new_rooms[name] != world.getState(name, 'pLoc', unique=True):
-                    logger.warning(f'After message {i}, {name} is in {world.getState(name, "pLoc", unique=True)}, not {new_rooms[name]}, after doing {actions[name]}')
-                else:
-                    logger.debug(f'After message {i}, {name} is in correct location {world.getState(name, "pLoc", unique=True)}')
-                var = stateKey(name, f'(visited, {world.getState(name, "pLoc", unique=True)})')
-                if var in world.variables:
-                    if not world.getFeature(var, unique=True):
-                        logger.warning(f'After message {i}, {name} has not recorded visitation of {world.getState(name, "pLoc", unique=True)}')
-                        raise RuntimeError
+            with stage_profile.stage('post_step'):
+                self.post_step(world, actions, i, parser, debug, logger)
+            with stage_profile.stage('validation'):
+                for name, models in world.get_current_models().items():
+                    if name in new_rooms and new_rooms[name] != world.getState(name, 'pLoc', unique=True):
+                        logger.warning(f'After message {i}, {name} is in {world.getState(name, "pLoc", unique=True)}, not {new_rooms[name]}, after doing {actions[name]}')
                     else:
-                        logger.debug(f'After message {i}, {name} has correctly recorded visitation of {world.getState(name, "pLoc", unique=True)}')
-                for model in models:
-                    beliefs = world.agents[name].getAttribute('beliefs', model)
-                    if beliefs is not True:
-                        for player_name, room in new_rooms.items():
-                            if world.getState(player_name, 'pLoc', beliefs, True) != room:
-                                raise ValueError(f'After message {i}, {model} believes {player_name} to be in {world.getState(player_name, "pLoc", beliefs, True)}, not {room}')
-            # Look for count changes
-            for var, count in sorted(old_count.items()):
-                new_count = world.getFeature(var, unique=True)
-                if new_count != count:
-                    logging.info(f'Victim count change for {var[len(prefix):-1]}: {count} -> {new_count}')
-                    old_count[var] = new_count
+                        logger.debug(f'After message {i}, {name} is in correct location {world.getState(name, "pLoc", unique=True)}')
+                    var = stateKey(name, f'(visited, {world.getState(name, "pLoc", unique=True)})')
+                    if var in world.variables:
+                        if not world.getFeature(var, unique=True):
+                            logger.warning(f'After message {i}, {name} has not recorded visitation of {world.getState(name, "pLoc", unique=True)}')
+                            raise RuntimeError
+                        else:
+                            logger.debug(f'After message {i}, {name} has correctly recorded visitation of {world.getState(name, "pLoc", unique=True)}')
+                    for model in models:
+                        beliefs = world.agents[name].getAttribute('beliefs', model)
+                        if beliefs is not True:
+                            for player_name, room in new_rooms.items():
+                                if world.getState(player_name, 'pLoc', beliefs, True) != room:
+                                    raise ValueError(f'After message {i}, {model} believes {player_name} to be in {world.getState(player_name, "pLoc", beliefs, True)}, not {room}')
+                # Look for count changes
+                for var, count in sorted(old_count.items()):
+                    new_count = world.getFeature(var, unique=True)
+                    if new_count != count:
+                        logging.info(f'Victim count change for {var[len(prefix):-1]}: {count} -> {new_count}')
+                        old_count[var] = new_count
 
     def post_replay(self, world, parser, logger=logging):
         pass
@@ -381,6 +612,11 @@ class Replayer(object):
         pass
 
     def parameterized_replay(self, args, simulate=False):
+        if args.get('processes') is not None:
+            self.processes = args['processes']
+        self.profile_stages = args.get('profile_stages', self.profile_stages)
+        if args.get('world_cache'):
+            self.world_cache = WorldCache(args['world_cache'], self.logger)
         if args['profile']:
             return cProfile.runctx('self.process_files(args["number"])', {'self': self, 'args': args}, {}, sort=1)
         elif args['1']:
@@ -389,6 +625,9 @@ class Replayer(object):
             return self.process_files(args['number'])
 
 
+RDDL_Replayer = Replayer
+
+
 def parse_replay_config(fname, parser):
     """
     Extracts command-line arguments from an INI file (first argument)
@@ -400,17 +639,20 @@ def parse_replay_config(fname, parser):
     if language == 'RDDL':
         root = os.path.join(os.path.dirname(__file__), '..', '..')
         mapping = {'rddl': ('domain', 'filename'), 'actions': ('domain', 'actions'), 'aux': ('domain', 'aux'),
-                   'debug': ('run', 'debug'), 'profile': ('run', 'profile'), 'number': ('run', 'steps')}
+                   'debug': ('run', 'debug'), 'profile': ('run', 'profile'), 'number': ('run', 'steps'),
+                   'processes': ('run', 'processes'), 'world_cache': ('run', 'world_cache'),
+                   'profile_stages': ('run', 'profile_stages'), 'catalog': ('run', 'catalog')}
         for flag, entry in mapping.items():
             if config.has_option(entry[0], entry[1]):
                 default = parser.get_default(flag)
                 if isinstance(default, bool):
                     args[flag] = config.getboolean(entry[0], entry[1])
-                elif isinstance(default, int):
+                elif isinstance(default, int) or flag == 'processes':
+                    # processes has no default, so that it does not override the replayer's own
                     args[flag] = config.getint(entry[0], entry[1])
                 else:
                     args[flag] = config.get(entry[0], entry[1])
-                    if flag in {'rddl', 'actions', 'aux'}:
+                    if flag in {'rddl', 'actions', 'aux', 'world_cache'}:
                         args[flag] = os.path.join(root, args[flag])
     elif language == 'none':
         pass
@@ -461,9 +703,17 @@ def replay_parser():
                         help='Trials to include (default is all)')
     parser.add_argument('-d', '--debug', default='WARNING', help='Level of logging detail')
     parser.add_argument('--profile', action='store_true', help='Run profiler')
+    parser.add_argument('--profile_stages', action='store_true',
+                        help='Record the time spent in each stage of each replay, in a CSV file next to the output')
+    parser.add_argument('-p', '--processes', type=int,
+                        help='Number of files to replay in parallel (default is the replayer\'s own, normally 1, '
+                             'meaning serial; 0 means one per core)')
     parser.add_argument('--rddl', help='Name of RDDL file containing domain specification')
     parser.add_argument('--actions', help='Name of CSV file containing JSON to PsychSim action mapping')
     parser.add_argument('--aux', help='Name of auxiliary CSV file for collapsed map')
+    parser.add_argument('--world_cache', help='Directory for caching the worlds converted from the RDDL file across runs')
+    parser.add_argument('--catalog', nargs='?', const=CATALOG_FILE,
+                        help='Find the log files in directories through this trial catalog (SQLite file)')
     return parser
 
 
@@ -485,5 +735,6 @@ def parse_replay_args(parser, arg_list=None):
 if __name__ == '__main__':
     # Process command-line arguments
     args = parse_replay_args(replay_parser())
-    replayer = RDDL_Replayer(args['fname'], args['trials'], args['config'], None, args['rddl'], args['actions'], args['aux'], logging)
+    replayer = Replayer(args['fname'], args['trials'], args['config'], None, args['rddl'], args['actions'], args['aux'], logging,
+                        catalog=TrialCatalog(args['catalog']) if args['catalog'] else None)
     replayer.parameterized_replay(args)
@@ -27,9 +27,12 @@ COUNT_ACTIONS_ARGS = [
 class FeatureReplayer(RDDL_Replayer):
     DEFAULT_FEATURES = {'RecordScore', 'MarkerPlacement', 'DialogueLabels', 'RecordMap', 'CountAction', 'CountEnterExit', 
         'CountTriageInHallways', 'CountVisitsPerRole', 'PlayerRoomPercentage'}
+    MERGED_ATTRIBUTES = dict(RDDL_Replayer.MERGED_ATTRIBUTES, completed=merge_items, feature_data=merge_rows)
 
-    def __init__(self, files=[], trials=None, config=None, maps=None, rddl_file=None, action_file=None, aux_file=None, logger=logging, output=None):
-        super().__init__(files=files, trials=trials, config=config, maps=maps, rddl_file=rddl_file, action_file=action_file, aux_file=aux_file, logger=logger)
+    def __init__(self, files=[], trials=None, config=None, maps=None, rddl_file=None, action_file=None, aux_file=None, logger=logging, output=None,
+                 catalog=None):
+        super().__init__(files=files, trials=trials, config=config, maps=maps, rddl_file=rddl_file, action_file=action_file, aux_file=aux_file, logger=logger,
+                         catalog=catalog)
         self.completed = []
         # Feature count bookkeeping
         self.feature_output = output
@@ -85,6 +88,19 @@ class FeatureReplayer(RDDL_Replayer):
         else:
             self.metrics = {}
 
+    def profile_name(self, fname):
+        if self.feature_output:
+            root, ext = os.path.splitext(self.feature_output)
+            return os.path.join(f'{root}_stages', f'{os.path.splitext(os.path.basename(fname))[0]}.csv')
+        return super().profile_name(fname)
+
+    def can_parallelize(self):
+        if self.metrics:
+            # Metrics are trained on all of the training trials before testing on the later ones
+            self.logger.warning('Evaluating metrics requires replaying the trials in order; replaying serially')
+            return False
+        return super().can_parallelize()
+
     def _create_derived_features(self, parser, logger=logging):
         # processes room names
         all_loc_name = list(parser.jsonParser.rooms.keys())
@@ -185,5 +201,6 @@ if __name__ == '__main__':
     # Process command-line arguments
     parser = feature_cmd_parser()
     args = parse_replay_args(parser)
-    replayer = FeatureReplayer(args['fname'], args['trials'], args['config'], rddl_file=args['rddl'], action_file=args['actions'], aux_file=args['aux'], logger=logging, output=args['output'])
+    replayer = FeatureReplayer(args['fname'], args['trials'], args['config'], rddl_file=args['rddl'], action_file=args['actions'], aux_file=args['aux'], logger=logging, output=args['output'],
+                               catalog=TrialCatalog(args['catalog']) if args['catalog'] else None)
     replayer.parameterized_replay(args)
@@ -15,6 +15,8 @@ except ImportError:
 import matplotlib.pyplot as plt    
 
 from atomic.parsing.asist_world import ASISTWorld
+from atomic.parsing.ingest import ingest_file
+from atomic.parsing.trial_catalog import CATALOG_FILE, TrialCatalog
 
 COND_MAP_TAG = 'CondWin'
 COND_TRAIN_TAG = 'CondBtwn'
@@ -23,16 +25,22 @@ TEAM_ID_TAG = 'Team'
 TRIAL_TAG = 'Trial'
 
 
-def accumulate_files(files, include_trials=None, ext='.metadata', logger=logging, group_by_team=False):
+def accumulate_files(files, include_trials=None, ext='.metadata', logger=logging, group_by_team=False,
+                     catalog=None):
     """
     Accumulate a list of files from a given list of names of files and directories
     :type files: List(str)
     :rtype: List(str)
     :type include_trials: Set/List(int)
+    :param catalog: If given, look up the contents of directories in this index, instead of listing them
+    :type catalog: TrialCatalog
     """
     result = []
     for fname in files:
-        if os.path.isdir(fname):
+        if catalog is not None and os.path.isdir(fname):
+            result += [os.path.join(fname, os.path.basename(name)) for name in catalog.files(fname, ext, include_trials)
+                       if os.path.join(fname, os.path.basename(name)) not in result]
+        elif os.path.isdir(fname):
             # We have a directory full of log files to process
             result += [os.path.join(fname, name) for name in sorted(os.listdir(fname))
                        if os.path.splitext(name)[1] == ext and os.path.join(fname, name) not in result]
@@ -82,11 +90,15 @@ class Replayer(object):
     Base class for replaying log files
     :ivar files: List of names of the log files to process
     :type files: List(str)
+    :ivar pipeline: If True, read and decode each log through the asynchronous pipeline of atomic.parsing.ingest,
+    overlapping them with the processing of the messages (otherwise, process one line at a time)
+    :type pipeline: bool
     """
 
-    def __init__(self, files=[], trials=None, config=None, strict=False, logger=logging):
+    def __init__(self, files=[], trials=None, config=None, strict=False, logger=logging, catalog=None,
+                 pipeline=False):
         # Extract files to process
-        self.files = accumulate_files(files, trials, group_by_team=True)
+        self.files = accumulate_files(files, trials, group_by_team=True, catalog=catalog)
 
         if isinstance(config, str):
             self.config = configparser.ConfigParser()
@@ -95,6 +107,7 @@ class Replayer(object):
             self.config = config
         self.logger = logger
         self.strict = strict
+        self.pipeline = pipeline
 
         # Per-file PsychSim objects
         self.worlds = {}
@@ -151,6 +164,10 @@ class Replayer(object):
                 self.pbar = None
         else:
             self.pbar = None
+        if self.pipeline:
+            ingest_file(self.worlds[fname], fname, strict=self.strict, logger=self.logger, sources=self.sources,
+                        progress=self.pbar.update if self.pbar else None)
+            return
         with open(fname, 'rt') as json_file:
             for line_no, line in enumerate(json_file):
                 if self.pbar: 
@@ -294,6 +311,10 @@ def replay_parser(files_optional=False):
     parser.add_argument('-d', '--debug', default='WARNING', help='Level of logging detail')
     parser.add_argument('--profile', action='store_true', help='Run profiler')
     parser.add_argument('--strict', action='store_true', help='Throw exceptions without catching them')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Read and decode the logs in an asynchronous pipeline, overlapping the processing of messages')
+    parser.add_argument('--catalog', nargs='?', const=CATALOG_FILE,
+                        help='Find the log files in directories through this trial catalog (SQLite file)')
     return parser
 
 
@@ -312,5 +333,6 @@ def parse_replay_args(parser, arg_list=None):
 if __name__ == '__main__':
     # Process command-line arguments
     args = parse_replay_args(replay_parser())
-    replayer = Replayer(args['fname'], args['trials'], config=args['config'], strict=args['strict'], logger=logging)
+    replayer = Replayer(args['fname'], args['trials'], config=args['config'], strict=args['strict'], logger=logging,
+                        catalog=TrialCatalog(args['catalog']) if args['catalog'] else None, pipeline=args['pipeline'])
     replayer.parameterized_replay(args)
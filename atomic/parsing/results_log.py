@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Append-only, gzip-compressed CSV log of the rows produced at each step of a replay, written as the replay goes.
+
+Rows are kept in a bounded buffer and written out (as a complete gzip member, with its own CSV header, appended to the
+file) at the end of the first step that fills it.  The columns of the log are all of those seen so far, so a member
+may have more columns than the ones before it; reading the log fills in the columns missing from earlier rows.  Each
+write is followed by a checkpoint file recording the size of the log, the last step written, and whatever the caller
+needs to pick up the replay from that step.  A log reopened with resume=True truncates anything written after the last
+checkpoint (e.g., by a write cut short), so an interrupted replay can continue from the last step written without
+duplicating or losing any rows.  A log with no file name keeps its rows in memory instead.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import zlib
+
+import pandas as pd
+
+DEFAULT_BUFFER_SIZE = 1000
+READ_SIZE = 1 << 20
+
+
+class ResultsLog(object):
+    """
+    :ivar fname: The name of the compressed CSV file (None to keep the rows in memory)
+    :type fname: str
+    :ivar buffer_size: The number of buffered rows that triggers a write at the end of a step
+    :type buffer_size: int
+    :ivar columns: The columns of the log, in the order they first appeared in the rows appended
+    :type columns: List[str]
+    :ivar step: The last step written to the file (None if none have been)
+    :type step: int
+    :ivar checkpoint: The data saved with the last step written to the file
+    :ivar rows: The number of rows written to the file
+    :type rows: int
+    """
+
+    def __init__(self, fname, buffer_size=DEFAULT_BUFFER_SIZE, resume=False):
+        self.fname = fname
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.pending = None
+        self.columns = None
+        self.step = None
+        self.checkpoint = None
+        self.rows = 0
+        self.kept = []
+        if fname is None:
+            return
+        if os.path.dirname(fname):
+            os.makedirs(os.path.dirname(fname), exist_ok=True)
+        saved = None
+        if resume and os.path.exists(self.checkpoint_name):
+            with open(self.checkpoint_name, 'r') as checkpoint_file:
+                saved = json.load(checkpoint_file)
+            if (os.path.getsize(fname) if os.path.exists(fname) else 0) < saved['size']:
+                # The log is missing rows that the checkpoint says were written
+                saved = None
+        if saved is None:
+            for name in [fname, self.checkpoint_name]:
+                if os.path.exists(name):
+                    os.remove(name)
+        else:
+            if os.path.exists(fname):
+                with open(fname, 'r+b') as log_file:
+                    log_file.truncate(saved['size'])
+            self.columns = saved['columns']
+            self.step = saved['step']
+            self.checkpoint = saved['checkpoint']
+            self.rows = saved['rows']
+
+    @property
+    def checkpoint_name(self):
+        return f'{self.fname}.checkpoint'
+
+    def __len__(self):
+        return self.rows + len(self.buffer)
+
+    def append(self, row):
+        if self.columns is None:
+            self.columns = list(row.keys())
+        elif any(column not in self.columns for column in row):
+            self.columns += [column for column in row if column not in self.columns]
+        self.buffer.append(row)
+
+    def end_step(self, step, checkpoint=None):
+        """
+        Marks the end of the rows of the given step, writing out the buffer if it is full
+        :param checkpoint: JSON-serializable data needed to resume the replay after this step
+        """
+        self.pending = (step, checkpoint)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes out the rows of all of the steps ended so far
+        """
+        if self.pending is None:
+            return
+        if self.fname is None:
+            self.kept += self.buffer
+            self.rows += len(self.buffer)
+            self.buffer.clear()
+            self.step, self.checkpoint = self.pending
+            self.pending = None
+            return
+        if self.buffer:
+            with io.StringIO(newline='') as text:
+                writer = csv.DictWriter(text, self.columns)
+                writer.writeheader()
+                writer.writerows(self.buffer)
+                data = gzip.compress(text.getvalue().encode('utf-8'))
+            with open(self.fname, 'ab') as log_file:
+                log_file.write(data)
+                log_file.flush()
+                os.fsync(log_file.fileno())
+            self.rows += len(self.buffer)
+            self.buffer.clear()
+        self.step, self.checkpoint = self.pending
+        self.pending = None
+        saved = {'size': os.path.getsize(self.fname) if os.path.exists(self.fname) else 0, 'columns': self.columns,
+                 'step': self.step, 'rows': self.rows, 'checkpoint': self.checkpoint}
+        with open(f'{self.checkpoint_name}.tmp', 'w') as checkpoint_file:
+            json.dump(saved, checkpoint_file)
+        os.replace(f'{self.checkpoint_name}.tmp', self.checkpoint_name)
+
+    def read(self):
+        """
+        :return: the rows written to the file so far, as dictionaries of strings with all of the columns (or the rows
+        themselves, if kept in memory)
+        :rtype: Iterator[Dict[str, str]]
+        """
+        if self.fname is None:
+            yield from self.kept
+        elif self.rows > 0:
+            for member in self.members():
+                for row in csv.DictReader(io.StringIO(member, newline='')):
+                    yield {column: row.get(column, '') for column in self.columns}
+
+    def members(self):
+        """
+        :return: the CSV text of each gzip member of the file (i.e., of each write), in order
+        :rtype: Iterator[str]
+        """
+        with open(self.fname, 'rb') as log_file:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            text = []
+            data = log_file.read(READ_SIZE)
+            while data:
+                text.append(decompressor.decompress(data))
+                if decompressor.eof:
+                    yield b''.join(text).decode('utf-8')
+                    # The rest of the data read belongs to the next member
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    text = []
+                    if data:
+                        continue
+                data = log_file.read(READ_SIZE)
+
+    def dataframe(self):
+        """
+        :return: the rows written to the file so far, with the column types inferred by pandas (rather than as strings)
+        :rtype: pd.DataFrame
+        """
+        if self.fname is None:
+            return pd.DataFrame(self.kept, columns=self.columns)
+        elif self.rows > 0:
+            frames = [pd.read_csv(io.StringIO(member)) for member in self.members()]
+            return pd.concat(frames, ignore_index=True).reindex(columns=self.columns)
+        else:
+            return pd.DataFrame(columns=self.columns)
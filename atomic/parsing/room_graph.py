@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Room connectivity graph, built once per map and shared by the JSON readers and the RDDL map generator.
+
+Replaces the lists of (room, room) edge tuples that used to be scanned for every membership and neighbor test.
+"""
+from collections import deque
+
+
+class RoomGraph(object):
+    """
+    Directed graph over room names, with O(1) edge and neighbor lookups
+    :ivar adjacency: The neighbors of each room (dict keys, kept in insertion order so results are deterministic)
+    :type adjacency: Dict(str,Dict(str,None))
+    """
+
+    def __init__(self, edges=()):
+        self.adjacency = {}
+        self.edges = []
+        self._within = {}
+        self._distances = None
+        for a, b in edges:
+            self.add_edge(a, b)
+
+    @classmethod
+    def from_undirected(cls, edges):
+        """
+        Creates a graph with both directions of each of the given edges (e.g., as returned by transformed_connections)
+        """
+        graph = cls()
+        for a, b in edges:
+            graph.add_edge(a, b)
+            graph.add_edge(b, a)
+        return graph
+
+    @classmethod
+    def from_adjacency(cls, adjacency):
+        """
+        Creates a graph from a table of room -> {direction: neighbor} (e.g., as built by extract_adjacency or
+        getSandRMap)
+        """
+        graph = cls()
+        for a, neighbors in adjacency.items():
+            graph.add_room(a)
+            for b in neighbors.values():
+                graph.add_edge(a, b)
+        return graph
+
+    def add_room(self, room):
+        if room not in self.adjacency:
+            self.adjacency[room] = {}
+            self._invalidate()
+
+    def add_edge(self, a, b):
+        self.add_room(a)
+        self.add_room(b)
+        if b not in self.adjacency[a]:
+            self.adjacency[a][b] = None
+            self.edges.append((a, b))
+            self._invalidate()
+
+    def _invalidate(self):
+        self._within.clear()
+        self._distances = None
+
+    def relabel(self, rename):
+        """
+        :return: a new graph with every room renamed by the given function (self-loops created by merging are dropped)
+        """
+        graph = RoomGraph()
+        for room in self.adjacency:
+            graph.add_room(rename(room))
+        for a, b in self.edges:
+            a, b = rename(a), rename(b)
+            if a != b:
+                graph.add_edge(a, b)
+        return graph
+
+    @property
+    def rooms(self):
+        return self.adjacency.keys()
+
+    def __contains__(self, edge):
+        a, b = edge
+        return b in self.adjacency.get(a, ())
+
+    def __iter__(self):
+        return iter(self.edges)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def has_edge(self, a, b):
+        return b in self.adjacency.get(a, ())
+
+    def one_step_removed(self, a, b):
+        """
+        :return: True iff there is an edge from a to b, or a and b are the same room, with an edge into it
+        """
+        # The second case keeps the result of the edge lists, whose targets were only ever matched against each room
+        return b in self.adjacency.get(a, ()) or (a == b and any(a in nbrs for nbrs in self.adjacency.values()))
+
+    def neighbors(self, room):
+        """
+        :return: the rooms directly reachable from the given room
+        """
+        return self.adjacency.get(room, {}).keys()
+
+    def common_neighbors(self, a, b):
+        """
+        :return: the rooms that are neighbors of both given rooms, in the order of a's neighbors
+        """
+        nbrs_b = self.adjacency.get(b, {})
+        return [nbr for nbr in self.neighbors(a) if nbr in nbrs_b]
+
+    def within(self, room, k):
+        """
+        :return: the set of rooms reachable from the given room in at most k steps (cached)
+        """
+        key = (room, k)
+        if key not in self._within:
+            if k <= 0 or room not in self.adjacency:
+                reachable = frozenset([room])
+            else:
+                previous = self.within(room, k-1)
+                reachable = set(previous)
+                for other in previous:
+                    reachable.update(self.adjacency[other])
+                reachable = frozenset(reachable)
+            self._within[key] = reachable
+        return self._within[key]
+
+    @property
+    def distances(self):
+        """
+        :return: the all-pairs shortest-path distances (in steps), computed by BFS from every room on first access;
+        unreachable pairs are absent
+        """
+        if self._distances is None:
+            self._distances = {room: self._bfs(room) for room in self.adjacency}
+        return self._distances
+
+    def _bfs(self, source):
+        dist = {source: 0}
+        queue = deque([source])
+        while queue:
+            room = queue.popleft()
+            for nbr in self.adjacency[room]:
+                if nbr not in dist:
+                    dist[nbr] = dist[room] + 1
+                    queue.append(nbr)
+        return dist
+
+    def distance(self, a, b):
+        """
+        :return: the number of steps on the shortest path from a to b (None if b is unreachable from a)
+        """
+        return self.distances.get(a, {}).get(b)
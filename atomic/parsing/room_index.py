@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Spatial index over the rooms of a semantic map, shared by the offline and live JSON readers.
+
+Rooms are axis-aligned rectangles in (x, z).  They are bucketed into a uniform grid over the map extents, so a
+point-in-room query only tests the handful of rooms overlapping the point's cell, and a nearest-room query only
+scans the rooms that can possibly be closest to some point in that cell.
+"""
+import math
+
+
+class room(object):
+    def __init__(self, name, coords):
+        [x0, z0, x1, z1] = coords
+        self.name = name
+        self.x0= min(x0, x1)
+        self.x1= max(x0, x1)
+        self.z0= min(z0, z1)
+        self.z1= max(z0, z1)
+
+    def in_room(self, _x, _z, epsilon = 0):
+        return (self.x0 - epsilon <= _x) and (_x <= self.x1 + epsilon) and (self.z0 - epsilon <= _z) and (_z <= self.z1 + epsilon)
+
+    def distance(self, x, z):
+        """
+        :return: the Manhattan distance from the given point to the closest point in this room (0 if inside)
+        """
+        x_diff = 0
+        z_diff = 0
+        if x < self.x0:
+            x_diff = self.x0 - x
+        elif x > self.x1:
+            x_diff = x - self.x1
+        if z < self.z0:
+            z_diff = self.z0 - z
+        elif z > self.z1:
+            z_diff = z - self.z1
+        return x_diff + z_diff
+
+    def __repr__(self):
+        return '%s %.0f %.0f %.0f %.0f' % (self.name, self.x0, self.x1, self.z0, self.z1)
+
+
+def closest_room(x, z, candidate_rooms, max_diff=1e5):
+    """
+    Linear scan for the room closest to the given point (ties go to the earliest room in the given order)
+    :return: the closest room (None if none is closer than max_diff) and its distance
+    """
+    min_diff = max_diff
+    closest = None
+    for rm in candidate_rooms:
+        diff = rm.distance(x, z)
+        if diff < min_diff:
+            min_diff = diff
+            closest = rm
+    return closest, min_diff
+
+
+class RoomIndex(object):
+    """
+    Uniform grid of room buckets over the extents of a set of rooms
+    :ivar rooms: The indexed rooms, in their original order
+    :type rooms: List(room)
+    :ivar cell_size: The width (in blocks) of each grid cell
+    :type cell_size: float
+    """
+    DEFAULT_CELL_SIZE = 4
+
+    def __init__(self, rooms, cell_size=DEFAULT_CELL_SIZE):
+        self.rooms = list(rooms)
+        self.cell_size = cell_size
+        self.cells = {}
+        self.nearest_candidates = None
+        if self.rooms:
+            self.x_min = min(rm.x0 for rm in self.rooms)
+            self.z_min = min(rm.z0 for rm in self.rooms)
+            self.x_max = max(rm.x1 for rm in self.rooms)
+            self.z_max = max(rm.z1 for rm in self.rooms)
+            for rm in self.rooms:
+                for i in range(self._cell(rm.x0, self.x_min), self._cell(rm.x1, self.x_min)+1):
+                    for j in range(self._cell(rm.z0, self.z_min), self._cell(rm.z1, self.z_min)+1):
+                        self.cells.setdefault((i, j), []).append(rm)
+            self.num_x = self._cell(self.x_max, self.x_min)+1
+            self.num_z = self._cell(self.z_max, self.z_min)+1
+        else:
+            self.x_min = self.z_min = self.x_max = self.z_max = 0
+            self.num_x = self.num_z = 0
+
+    def _cell(self, value, origin):
+        return int(math.floor((value - origin) / self.cell_size))
+
+    def _in_extents(self, x, z):
+        return self.x_min <= x <= self.x_max and self.z_min <= z <= self.z_max
+
+    def containing(self, x, z):
+        """
+        :return: the rooms (in their original order) that contain the given point
+        """
+        if not self._in_extents(x, z):
+            return []
+        return [rm for rm in self.cells.get((self._cell(x, self.x_min), self._cell(z, self.z_min)), [])
+                if rm.in_room(x, z)]
+
+    def closest(self, x, z, max_diff=1e5):
+        """
+        Same result as a linear scan with closest_room over all of the indexed rooms
+        :return: the closest room (None if none is closer than max_diff) and its distance
+        """
+        if not self._in_extents(x, z):
+            # Off the grid, so there are no precomputed candidates; this is rare enough to just scan
+            return closest_room(x, z, self.rooms, max_diff)
+        if self.nearest_candidates is None:
+            self._build_nearest_candidates()
+        return closest_room(x, z, self.nearest_candidates[(self._cell(x, self.x_min), self._cell(z, self.z_min))],
+                            max_diff)
+
+    def _build_nearest_candidates(self):
+        """
+        For each cell, keeps only the rooms that can be the closest one to some point in the cell: a room whose
+        minimum distance to the cell exceeds another room's maximum distance to the cell never can.  Candidates stay
+        in their original order, so ties break exactly as in the linear scan.
+        """
+        self.nearest_candidates = {}
+        for i in range(self.num_x):
+            cx0 = self.x_min + i*self.cell_size
+            cx1 = cx0 + self.cell_size
+            for j in range(self.num_z):
+                cz0 = self.z_min + j*self.cell_size
+                cz1 = cz0 + self.cell_size
+                ranges = [(max(rm.x0-cx1, cx0-rm.x1, 0) + max(rm.z0-cz1, cz0-rm.z1, 0),
+                           max(rm.x0-cx0, cx1-rm.x1, 0) + max(rm.z0-cz0, cz1-rm.z1, 0)) for rm in self.rooms]
+                limit = min(far for near, far in ranges)
+                self.nearest_candidates[(i, j)] = [rm for rm, (near, far) in zip(self.rooms, ranges) if near <= limit]
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Append-only table of rows that builds a pandas DataFrame only when one is requested.
+
+Appending a row to a DataFrame copies the whole frame, so the features that add a row per message used to take time
+quadratic in the length of the trial.  A RowBuffer instead stores each column sparsely (the rows that have it and
+their values) in growable lists, and converts the rows added since the last request into a DataFrame in one go.
+"""
+import pandas as pd
+
+
+class RowBuffer(object):
+    """
+    :ivar frame: The rows already materialized (None if none have been), which callers may have modified in place
+    :type frame: pd.DataFrame
+    :ivar size: The number of rows appended since the last materialization
+    :type size: int
+    :ivar key: If not None, a row replaces any earlier row with the same value in this column
+    :type key: str
+    """
+
+    def __init__(self, columns=(), key=None):
+        self.frame = None
+        self.initial_columns = list(columns)
+        self.key = key
+        self._clear()
+
+    def _clear(self):
+        self.size = 0
+        # column -> (row indices, values), in order of first appearance
+        self.columns = {col: ([], []) for col in self.initial_columns}
+        self.deleted = set()
+        self.keyed = {}
+
+    def __len__(self):
+        return (0 if self.frame is None else len(self.frame)) + self.size - len(self.deleted)
+
+    def append(self, row):
+        if self.key is not None and self.key in row:
+            value = row[self.key]
+            if value in self.keyed:
+                self.deleted.add(self.keyed[value])
+            elif self.frame is not None and self.key in self.frame.columns:
+                self.frame = self.frame[self.frame[self.key] != value].reset_index(drop=True)
+            self.keyed[value] = self.size
+        for col, value in row.items():
+            try:
+                indices, values = self.columns[col]
+            except KeyError:
+                indices, values = self.columns[col] = ([], [])
+            indices.append(self.size)
+            values.append(value)
+        self.size += 1
+
+    def set_column(self, col, value):
+        """
+        Sets the given column of every row so far to the given value (same as frame[col] = value)
+        """
+        if self.frame is None:
+            self.columns[col] = (list(range(self.size)), [value]*self.size)
+        else:
+            # Rare enough (once per new column) to just materialize any pending rows first
+            self.dataframe()[col] = value
+
+    @property
+    def column_names(self):
+        names = [] if self.frame is None else list(self.frame.columns)
+        return names + [col for col in self.columns if col not in names]
+
+    def dataframe(self):
+        """
+        :return: all of the rows as a DataFrame; the same object is returned until more rows are appended, so changes
+        made to it are kept
+        """
+        if self.frame is None or self.size > 0:
+            new = pd.DataFrame({col: pd.Series(values, index=indices, dtype=object if len(values) == 0 else None)
+                               .reindex(range(self.size)) for col, (indices, values) in self.columns.items()},
+                               index=range(self.size))
+            if self.deleted:
+                new = new.drop(index=list(self.deleted))
+            if self.frame is None:
+                self.frame = new.reset_index(drop=True)
+            elif len(new) > 0:
+                self.frame = pd.concat([self.frame, new], ignore_index=True)
+            self._clear()
+        return self.frame
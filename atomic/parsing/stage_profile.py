@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Timers and counters for the stages of a replay (parsing messages, converting the world, stepping it, the checks and
+hooks around each step), cheap enough to leave in place in production runs.
+
+Code marks its stages with the profiled decorator (for functions) or the stage context manager (for blocks), and
+bumps counters with count.  While no StageProfile is active, each of these costs a single global lookup; while one is,
+the time spent in every stage is added to it.  Time spent in a stage nested inside another counts toward both.
+
+    with activate(StageProfile()) as profile:
+        ...
+    profile.save('trial_stages.csv')
+"""
+import contextlib
+import csv
+import functools
+import os
+from timeit import default_timer as timer
+
+# The profile recording the current replay (None when not profiling)
+_active = None
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+class StageProfile(object):
+    """
+    :ivar times: The total seconds spent in each stage
+    :type times: Dict[str,float]
+    :ivar calls: The number of times each stage was entered
+    :type calls: Dict[str,int]
+    :ivar counts: The value of each counter
+    :type counts: Dict[str,int]
+    :ivar elapsed: The total seconds for which this profile has been active
+    :type elapsed: float
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.calls = {}
+        self.counts = {}
+        self.elapsed = 0.
+
+    def add(self, stage, seconds):
+        self.times[stage] = self.times.get(stage, 0.) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def summary(self):
+        """
+        :return: a row for each stage (slowest first), then one for each counter
+        :rtype: List[Dict[str,Any]]
+        """
+        rows = [{'stage': stage, 'calls': self.calls[stage], 'seconds': seconds,
+                 'ms/call': 1000*seconds/self.calls[stage],
+                 'fraction': seconds/self.elapsed if self.elapsed > 0 else None}
+                for stage, seconds in sorted(self.times.items(), key=lambda item: -item[1])]
+        rows.append({'stage': 'total', 'calls': 1, 'seconds': self.elapsed, 'ms/call': 1000*self.elapsed,
+                     'fraction': 1.})
+        rows += [{'stage': name, 'calls': value} for name, value in sorted(self.counts.items())]
+        return rows
+
+    def save(self, fname):
+        """
+        Writes the summary as a CSV file
+        """
+        if os.path.dirname(fname):
+            os.makedirs(os.path.dirname(fname), exist_ok=True)
+        with open(fname, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, ['stage', 'calls', 'seconds', 'ms/call', 'fraction'])
+            writer.writeheader()
+            writer.writerows(self.summary())
+
+    def __str__(self):
+        return ', '.join(f'{stage} {seconds:.2f}s' for stage, seconds in
+                         sorted(self.times.items(), key=lambda item: -item[1]))
+
+
+class _Stage(object):
+    __slots__ = ['profile', 'name', 'start']
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = timer()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.profile.add(self.name, timer()-self.start)
+
+
+def stage(name):
+    """
+    :return: a context manager timing its block as part of the given stage
+    """
+    if _active is None:
+        return _NO_STAGE
+    return _Stage(_active, name)
+
+
+def profiled(name):
+    """
+    Decorator timing each call of the function as part of the given stage
+    """
+    def decorator(fun):
+        @functools.wraps(fun)
+        def wrapper(*args, **kwargs):
+            profile = _active
+            if profile is None:
+                return fun(*args, **kwargs)
+            start = timer()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                profile.add(name, timer()-start)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.count(name, n)
+
+
+@contextlib.contextmanager
+def activate(profile):
+    """
+    Records the stages in the given profile (if not None) for the duration of the block
+    :type profile: StageProfile
+    """
+    global _active
+    previous = _active
+    _active = profile
+    start = timer()
+    try:
+        yield profile
+    finally:
+        _active = previous
+        if profile is not None:
+            profile.elapsed += timer()-start
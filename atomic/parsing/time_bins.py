@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Time-binning of player messages into the synchronized steps replayed by the offline and live MsgQCreator.
+
+Each player's messages are consumed in order, in bins of grouping_res seconds of mission time; a message with a later
+time than the current bin holds back all of that player's subsequent messages until its own bin.  Each bin becomes as
+many steps as the busiest player had messages in it, with the other players padded with noops.  Rather than walking
+the bins and messages one at a time, the mission timers are parsed once per distinct value (see timestamps) and the bin of every
+message is computed with array operations.
+"""
+import numpy as np
+
+from atomic.definitions import MISSION_DURATION
+from atomic.definitions.timestamps import timer_seconds
+
+NOOP = -1
+
+
+def mission_times(msgs, duration=MISSION_DURATION):
+    """
+    Parses the mission timer (minutes:seconds remaining) of each message into seconds elapsed
+    :return: the seconds elapsed at each message, and whether each message has a well-formed timer
+    :rtype: np.ndarray, np.ndarray
+    """
+    times = np.zeros(len(msgs), dtype=np.int64)
+    valid = np.zeros(len(msgs), dtype=bool)
+    for i, msg in enumerate(msgs):
+        timer = msg.get('mission_timer')
+        if timer is None:
+            continue
+        remaining = timer_seconds(timer)
+        if remaining is not None:
+            times[i] = duration - remaining
+            valid[i] = True
+    return times, valid
+
+
+def message_bins(times, valid, grouping_res, num_bins):
+    """
+    :return: the bin in which each valid message is consumed (num_bins if never), and the bin in which the last
+    message (valid or not) is consumed
+    """
+    times = times[valid]
+    if len(times) == 0:
+        return np.zeros(0, dtype=np.int64), 0
+    # A message is held back until the bin covering the latest time among it and its predecessors
+    bins = np.maximum(np.ceil(np.maximum.accumulate(times) / grouping_res).astype(np.int64) - 1, 0)
+    bins = np.minimum(bins, num_bins)
+    return bins, bins[-1]
+
+
+def build_action_table(player_msgs, grouping_res, duration=MISSION_DURATION):
+    """
+    :param player_msgs: the messages of each player, in order
+    :type player_msgs: List(List(dict))
+    :return: a table with one row per step and one column per player, containing the index of that player's message
+    (or NOOP) at that step
+    :rtype: np.ndarray
+    """
+    num_bins = len(np.arange(0, duration+1, grouping_res))
+    consumed = []
+    done = 0
+    for msgs in player_msgs:
+        times, valid = mission_times(msgs, duration)
+        bins, last = message_bins(times, valid, grouping_res, num_bins)
+        consumed.append((np.flatnonzero(valid), bins))
+        done = max(done, last)
+    # Binning stops at the bin in which all players have consumed all of their messages (that bin is not emitted)
+    stop = min(done, num_bins)
+    counts = np.zeros((len(player_msgs), num_bins+1), dtype=np.int64)
+    for player, (indices, bins) in enumerate(consumed):
+        counts[player] = np.bincount(bins, minlength=num_bins+1)
+    steps_per_bin = counts[:, :stop].max(axis=0) if len(player_msgs) > 0 else np.zeros(stop, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(steps_per_bin)))
+    table = np.full((offsets[-1], len(player_msgs)), NOOP, dtype=np.int64)
+    for player, (indices, bins) in enumerate(consumed):
+        emitted = bins < stop
+        indices = indices[emitted]
+        bins = bins[emitted]
+        # Position of each message among those of the same player in the same bin
+        rank = np.arange(len(bins)) - np.searchsorted(bins, bins, side='left')
+        table[offsets[bins] + rank, player] = indices
+    return table
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+A persistent index of the trial log files in an archive, so that finding the files to replay does not require listing
+(and parsing the name of) every file on every run.
+
+The catalog is a single SQLite file (by default in the temporary directory, or wherever ATOMIC_TRIAL_CATALOG says)
+recording the path, size and modification time of each file, along with the conditions encoded in its name by the
+ASIST naming convention (Trial, Team, Member, CondBtwn, CondWin, Vers, ...).  Refreshing a directory only stats its
+files if the directory itself has changed since the last refresh.  Since adding, removing or renaming a file changes
+the modification time of its directory, but rewriting an existing file in place does not, a file rewritten in place is
+only picked up by a refresh with rescan=True.  The content hash of a file is only computed when first asked for (by
+digest), unless the catalog is created with hash_files=True.  Selecting files by condition is then an indexed query:
+
+    catalog = TrialCatalog()
+    files = catalog.files('/data/study-3', CondBtwn='ASI-UAZ-TA1', trials={448, 449})
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+
+CATALOG_FILE = os.environ.get('ATOMIC_TRIAL_CATALOG', os.path.join(tempfile.gettempdir(), 'atomic_trial_catalog.db'))
+CATALOG_VERSION = 1
+
+# Columns holding the conditions most commonly selected on (any other condition is matched against the JSON column)
+CONDITION_COLUMNS = {'Trial': 'trial', 'Team': 'team', 'Member': 'member', 'CondBtwn': 'cond_btwn',
+                     'CondWin': 'cond_win', 'Vers': 'vers'}
+
+SCHEMA = ['CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL)',
+          'CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, directory TEXT NOT NULL, ext TEXT NOT NULL, '
+          'size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, sha256 TEXT, trial TEXT, trial_number INTEGER, '
+          'team TEXT, member TEXT, cond_btwn TEXT, cond_win TEXT, vers TEXT, conditions TEXT NOT NULL)',
+          'CREATE INDEX IF NOT EXISTS files_directory ON files (directory, ext)',
+          'CREATE INDEX IF NOT EXISTS files_trial ON files (trial_number)',
+          'CREATE INDEX IF NOT EXISTS files_team ON files (team)',
+          'CREATE INDEX IF NOT EXISTS files_condition ON files (cond_btwn, cond_win)']
+
+
+def file_hash(fname, block_size=1 << 20):
+    """
+    :return: the SHA-256 digest of the contents of the given file
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(fname, 'rb') as log_file:
+        for block in iter(lambda: log_file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def condition_value(value):
+    """
+    :return: the given condition value as it appears in the filename (e.g., ASI-UAZ-TA1, rather than the list of its
+    parts that filename_to_condition returns)
+    :rtype: str
+    """
+    if isinstance(value, list):
+        return '-'.join(value)
+    return value
+
+
+def trial_number(trial):
+    """
+    :return: the number of a trial identifier (e.g., 448 for T000448), or None for the non-numbered ones (e.g.,
+    Training)
+    :rtype: int
+    """
+    try:
+        return int(trial[1:])
+    except (TypeError, ValueError):
+        return None
+
+
+class TrialCatalog(object):
+    """
+    :ivar db_file: The name of the SQLite file holding the catalog
+    :type db_file: str
+    :ivar hash_files: If True, record the content hash of each new or modified file when refreshing (otherwise, the
+    hash is computed the first time digest asks for it)
+    :type hash_files: bool
+    """
+
+    def __init__(self, db_file=None, hash_files=False, logger=logging):
+        self.db_file = CATALOG_FILE if db_file is None else db_file
+        self.hash_files = hash_files
+        self.logger = logger
+        if os.path.dirname(self.db_file):
+            os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        self.connection = sqlite3.connect(self.db_file)
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != CATALOG_VERSION:
+            # Written by a different version of this code, so rebuild it from scratch
+            with self.connection:
+                self.connection.execute('DROP TABLE IF EXISTS directories')
+                self.connection.execute('DROP TABLE IF EXISTS files')
+                self.connection.execute(f'PRAGMA user_version = {CATALOG_VERSION}')
+        with self.connection:
+            for statement in SCHEMA:
+                self.connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def refresh(self, directory, rescan=False):
+        """
+        Brings the entries for the files in the given directory up to date.  If the directory has not changed since
+        the last refresh, its files are not looked at, so files rewritten in place (which does not change the
+        modification time of their directory) are missed unless rescan is True
+        :param rescan: If True, stat every file even if the directory has not changed since the last refresh
+        :return: the number of files added, updated and removed
+        :rtype: int
+        """
+        directory = os.path.abspath(directory)
+        mtime_ns = os.stat(directory).st_mtime_ns
+        row = self.connection.execute('SELECT mtime_ns FROM directories WHERE path = ?', (directory,)).fetchone()
+        if not rescan and row is not None and row[0] == mtime_ns:
+            return 0
+        known = {path: (size, mtime) for path, size, mtime in self.connection.execute(
+            'SELECT path, size, mtime_ns FROM files WHERE directory = ?', (directory,))}
+        changed = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                status = entry.stat()
+                if known.pop(entry.path, None) != (status.st_size, status.st_mtime_ns):
+                    changed.append(self._entry(directory, entry.path, status))
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)', changed)
+            self.connection.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in known])
+            self.connection.execute('INSERT OR REPLACE INTO directories VALUES (?,?)', (directory, mtime_ns))
+        if changed or known:
+            self.logger.info(f'Trial catalog: {len(changed)} new/modified and {len(known)} removed file(s) in {directory}')
+        return len(changed) + len(known)
+
+    def _entry(self, directory, path, status):
+        # The replayers import the catalog, so import their parsing of file names only when needed
+        from atomic.parsing.replayer import filename_to_condition
+
+        conditions = filename_to_condition(path)
+        trial = conditions.get('Trial', conditions.get('TrialPlanning'))
+        values = {key: condition_value(conditions.get(key)) for key in CONDITION_COLUMNS}
+        values['Trial'] = condition_value(trial)
+        digest = file_hash(path) if self.hash_files else None
+        return (path, directory, os.path.splitext(path)[1], status.st_size, status.st_mtime_ns, digest,
+                values['Trial'], trial_number(values['Trial']), values['Team'], values['Member'], values['CondBtwn'],
+                values['CondWin'], values['Vers'], json.dumps(conditions))
+
+    def files(self, directory, ext='.metadata', trials=None, refresh=True, **conditions):
+        """
+        :param ext: Only the files with this extension (None for all)
+        :param trials: Only the files of these trial numbers (None for all)
+        :type trials: Set/List(int)
+        :param refresh: If True, bring the directory up to date first
+        :param conditions: Only the files whose name has these values for the given conditions (e.g., CondBtwn='2' or
+        CondBtwn='ASI-UAZ-TA1')
+        :return: the sorted names of the files in the given directory matching the given criteria
+        :rtype: List(str)
+        """
+        directory = os.path.abspath(directory)
+        if refresh:
+            self.refresh(directory)
+        query = 'SELECT path, conditions FROM files WHERE directory = ?'
+        params = [directory]
+        if ext is not None:
+            query += ' AND ext = ?'
+            params.append(ext)
+        if trials is not None:
+            trials = sorted(trials)
+            query += f' AND trial_number IN ({",".join("?"*len(trials))})'
+            params += trials
+        remaining = {}
+        for key, value in conditions.items():
+            if key in CONDITION_COLUMNS:
+                query += f' AND {CONDITION_COLUMNS[key]} = ?'
+                params.append(condition_value(value))
+            else:
+                remaining[key] = condition_value(value)
+        return sorted(path for path, row_conditions in self.connection.execute(query, params)
+                      if not remaining or all(condition_value(json.loads(row_conditions).get(key)) == value
+                                              for key, value in remaining.items()))
+
+    def conditions(self, path):
+        """
+        :return: the conditions recorded for the given file (None if not in the catalog)
+        :rtype: dict
+        """
+        row = self.connection.execute('SELECT conditions FROM files WHERE path = ?',
+                                      (os.path.abspath(path),)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def digest(self, path):
+        """
+        :return: the content hash recorded for the given file (computing and recording it, if not yet known)
+        :rtype: str
+        """
+        path = os.path.abspath(path)
+        row = self.connection.execute('SELECT sha256 FROM files WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[0] is not None:
+            return row[0]
+        digest = file_hash(path)
+        if row is not None:
+            with self.connection:
+                self.connection.execute('UPDATE files SET sha256 = ? WHERE path = ?', (digest, path))
+        return digest
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Cache of compiled RDDL worlds, so that trials sharing a domain and map convert it only once.
+
+Worlds are content-addressed: the key is a hash of the RDDL file's contents plus the parameters of the augmentation
+applied after conversion and the versions of the packages that convert and pickle the world, so editing the RDDL file
+(asking for a different augmentation, or upgrading psychsim or rddl2psychsim) can never return a stale world.  Packages
+used from a source tree rather than installed have no version, so a cache kept across changes to them must be cleared
+by hand.  Each lookup deserializes a fresh copy of the template, so replays never share (and corrupt) the same world.
+"""
+import functools
+import hashlib
+from importlib import metadata
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+from atomic.util.io import save_object, load_object
+
+# Bump whenever the augmentation applied to cached worlds changes
+CACHE_VERSION = 1
+# The packages whose versions are part of the key
+PACKAGES = ['psychsim', 'rddl2psychsim']
+
+
+@functools.lru_cache()
+def package_versions():
+    """
+    :return: the installed version of each of the PACKAGES (None if it is not installed as a distribution)
+    :rtype: Dict(str,str)
+    """
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+class WorldCache(object):
+    """
+    In-memory (and, optionally, on-disk) store of pickled world templates
+    :ivar directory: The directory holding the persistent cache files (None if the cache lives only in memory)
+    :type directory: str
+    :ivar templates: The pickled template for each key loaded or created so far
+    :type templates: Dict(str,bytes)
+    """
+
+    def __init__(self, directory=None, logger=logging):
+        self.directory = directory
+        self.logger = logger
+        self.templates = {}
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(fname, **params):
+        """
+        :return: the content hash of the given RDDL file and augmentation parameters (and of the package versions)
+        """
+        digest = hashlib.sha256()
+        with open(fname, 'rb') as rddl_file:
+            digest.update(rddl_file.read())
+        digest.update(json.dumps({'version': CACHE_VERSION, 'packages': package_versions(), **params},
+                                 sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl.gz')
+
+    def get(self, key, create):
+        """
+        :param create: function to call (with no arguments) to build the object if it is not cached
+        :return: a fresh copy of the object stored under the given key
+        """
+        template = self.templates.get(key)
+        if template is None and self.directory is not None and os.path.exists(self.path(key)):
+            try:
+                template = pickle.dumps(load_object(self.path(key)), protocol=pickle.HIGHEST_PROTOCOL)
+                self.templates[key] = template
+            except Exception:
+                self.logger.warning(f'Ignoring unreadable cached world {self.path(key)}')
+        if template is None:
+            self.misses += 1
+            obj = create()
+            try:
+                template = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                self.logger.warning('Unable to cache world, which cannot be pickled')
+                return obj
+            self.templates[key] = template
+            if self.directory is not None:
+                self.save(key, obj)
+            # The object just created is itself a fresh copy
+            return obj
+        else:
+            self.hits += 1
+            return pickle.loads(template)
+
+    def save(self, key, obj):
+        # Write to a temporary file first, so that concurrent replays never read a partially written world
+        handle, tmp_name = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(handle)
+        try:
+            save_object(obj, tmp_name)
+            os.replace(tmp_name, self.path(key))
+        except Exception:
+            self.logger.warning(f'Unable to save world to cache {self.path(key)}')
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
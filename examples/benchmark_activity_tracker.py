@@ -0,0 +1,82 @@
+import random
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+from atomic.analytic.models.jags.jag import update_knowledge
+from atomic.analytic.utils import activity_tracker
+from atomic.analytic.utils.time_period import TimePeriod, contains_overlapping_pair, contains_overlapping_set
+
+__desc__ = 'Overlap check of activity time periods: every pair vs. sorted sweep, on randomized activity histories'
+
+
+def random_periods(number, horizon):
+    periods = []
+    for _ in range(number):
+        start = random.choice([random.randint(0, horizon), random.uniform(0, horizon)])
+        kind = random.random()
+        if kind < 0.2:
+            periods.append(TimePeriod(start, -1))
+        elif kind < 0.25:
+            # Malformed periods, as left by out-of-order or missing times
+            period = TimePeriod(start, -1)
+            period.end = random.choice([start - 1, -2])
+            periods.append(period)
+        else:
+            periods.append(TimePeriod(start, start + random.choice([0, random.randint(0, horizon // 10)])))
+    return periods
+
+
+def random_history(number, horizon):
+    """
+    :return: the sequence of activity trackers kept for a player by a series of random knowledge updates
+    """
+    category = {}
+    history = []
+    elapsed = 0
+    for _ in range(number):
+        if random.random() < 0.9:
+            elapsed += random.randint(0, horizon // number + 1)
+        update_knowledge('p', category, random.choice([0., 0.5, 1.]), random.randint(0, elapsed) if
+                         random.random() < 0.05 else elapsed)
+        history.append([(tracker.confidence, tracker.time_period.start, tracker.time_period.end)
+                        for tracker in category.get('p', [])])
+    return history
+
+
+def time_check(fun, periods, repeat):
+    start = timer()
+    for _ in range(repeat):
+        fun(periods)
+    return (timer() - start) / repeat
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('-t', '--trials', type=int, default=2000, help='Number of randomized trials to validate')
+    parser.add_argument('-n', '--number', type=int, nargs='+', default=[100, 200, 400, 800],
+                        help='Numbers of time periods to time')
+    args = vars(parser.parse_args())
+
+    random.seed(0)
+    for trial in range(args['trials']):
+        periods = random_periods(random.randint(0, 12), random.choice([5, 20, 1000]))
+        assert contains_overlapping_set(periods) == contains_overlapping_pair(periods), f'Mismatch on {periods}'
+    print(f'Results identical to pairwise check on {args["trials"]} random sets of time periods')
+
+    # The knowledge updates of a JAG, with either overlap check
+    for trial in range(args['trials'] // 10):
+        state = random.getstate()
+        fast = random_history(100, 1000)
+        random.setstate(state)
+        activity_tracker.contains_overlapping_set = contains_overlapping_pair
+        try:
+            slow = random_history(100, 1000)
+        finally:
+            activity_tracker.contains_overlapping_set = contains_overlapping_set
+        assert fast == slow, f'Mismatch in trial {trial}'
+    print(f'Activity trackers identical to pairwise check on {args["trials"] // 10} random update histories')
+
+    for number in args['number']:
+        periods = [TimePeriod(i, i + random.randint(0, 1)) for i in range(0, 2 * number, 2)]
+        before = time_check(contains_overlapping_pair, periods, 3)
+        after = time_check(contains_overlapping_set, periods, 30)
+        print(f'{number:6d} periods: pairwise {1000*before:9.3f}ms, sweep {1000*after:9.3f}ms ({before/after:.0f}x)')
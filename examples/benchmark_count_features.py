@@ -0,0 +1,61 @@
+import random
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+from atomic.parsing.count_features import CountAction, CountEnterExit, CountTriageInHallways, CountVisitsPerRole, \
+    PlayerRoomPercentage
+
+__desc__ = 'Scaling of count feature extraction (including building the final DataFrames) with the number of messages'
+
+HALLWAYS = ['ccw', 'cce', 'mcw', 'mce', 'scw', 'sce', 'sccc']
+ROOMS = HALLWAYS + ['kco', 'tkt', 'lib', 'oba', 'jc', 'cf', 'rrc', 'crc', 'ccn']
+PLAYERS = ['P1', 'P2', 'P3']
+ROLES = ['medic', 'engineer', 'transporter']
+
+
+def random_messages(number):
+    messages = []
+    roles = {player: 'None' for player in PLAYERS}
+    for i in range(number):
+        player = random.choice(PLAYERS)
+        remaining = 900 - (900 * i) // number
+        msg = {'playername': player, 'participant_id': player, 'mission_timer': f'{remaining // 60} : {remaining % 60}',
+               'room_name': random.choice(ROOMS)}
+        kind = random.random()
+        if kind < 0.6:
+            msg['sub_type'] = 'Event:location'
+        elif kind < 0.8:
+            msg['sub_type'] = 'Event:Triage'
+            msg['triage_state'] = random.choice(['SUCCESSFUL', 'IN_PROGRESS'])
+            msg['type'] = random.choice(['CRITICAL', 'REGULAR'])
+        elif kind < 0.9:
+            msg['sub_type'] = 'Event:ToolUsed'
+        else:
+            msg['sub_type'] = 'Event:RoleSelected'
+            msg['prev_role'] = roles[player]
+            msg['new_role'] = roles[player] = random.choice(ROLES)
+        messages.append(msg)
+    return messages
+
+
+def time_features(messages):
+    features = [CountEnterExit(ROOMS), CountTriageInHallways(HALLWAYS), CountVisitsPerRole(ROOMS),
+                CountAction('Event:Triage', {'triage_state': 'SUCCESSFUL', 'type': 'CRITICAL'}),
+                PlayerRoomPercentage()]
+    start = timer()
+    for msg in messages:
+        for feature in features:
+            feature.processMsg(msg)
+    rows = sum(len(feature.getDataframe()) for feature in features)
+    return timer() - start, rows
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('-n', '--number', type=int, nargs='+', default=[1000, 2000, 4000, 8000, 16000],
+                        help='Numbers of messages to time')
+    args = vars(parser.parse_args())
+
+    random.seed(0)
+    for number in args['number']:
+        elapsed, rows = time_features(random_messages(number))
+        print(f'{number:8d} messages: {elapsed:8.3f}s ({1e6*elapsed/number:8.1f} us/message, {rows:8d} rows)')
@@ -0,0 +1,105 @@
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+import numpy as np
+from atomic.analytic.models.map import Map
+from atomic.analytic.models.player import Player
+
+__desc__ = 'Field-of-view calls per second: casting shadows one block at a time vs. one ring at a time'
+
+
+def write_map(directory, width, height, density):
+    """
+    Writes a random map of rooms (walls with gaps, plus scattered blocks) into directory/maps/benchmark.json
+    """
+    blocks = []
+    for x in range(width):
+        for z in range(height):
+            wall = x % 12 == 0 or z % 10 == 0
+            if (wall and random.random() < density) or random.random() < density / 20:
+                blocks += [{'type': 'stone', 'location': {'x': x, 'y': y, 'z': z}} for y in range(60, 64)]
+    os.makedirs(os.path.join(directory, 'maps'))
+    with open(os.path.join(directory, 'maps', 'benchmark.json'), 'w') as map_file:
+        json.dump({'metadata': {'lower_bound': {'x': 0, 'y': 60, 'z': 0},
+                                'upper_bound': {'x': width-1, 'y': 63, 'z': height-1}},
+                   'blocks': blocks}, map_file)
+    return 'benchmark'
+
+
+def time_fov(fun, game_map, player, poses):
+    start = timer()
+    for x, y, yaw in poses:
+        player.x = x
+        player.y = y
+        player.yaw = yaw
+        fun(game_map, player)
+    return len(poses) / (timer() - start)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('--map', help='Name of map in ./maps (default is a randomly generated one)')
+    parser.add_argument('--width', type=int, default=100, help='Width of generated map')
+    parser.add_argument('--height', type=int, default=80, help='Height of generated map')
+    parser.add_argument('-d', '--density', type=float, default=0.8, help='Fraction of wall blocks in generated map')
+    parser.add_argument('-n', '--number', type=int, default=1000, help='Number of FOV calls')
+    parser.add_argument('-v', '--victims', type=int, default=100, help='Number of victims to place on the map')
+    args = vars(parser.parse_args())
+
+    random.seed(0)
+    cwd = os.getcwd()
+    directory = None
+    if args['map'] is None:
+        directory = tempfile.mkdtemp()
+        map_name = write_map(directory, args['width'], args['height'], args['density'])
+        os.chdir(directory)
+    else:
+        map_name = args['map']
+    # Points of interest detected by each player, in order
+    detections = {}
+    try:
+        game_map = Map(lambda poi, p: detections.setdefault(id(p), []).append(tuple(poi)))
+        game_map.load_map_data(map_name)
+    finally:
+        os.chdir(cwd)
+        if directory is not None:
+            shutil.rmtree(directory)
+    width, height = game_map.dimensions[:2]
+    origin = game_map.origin
+    game_map.update_map([{'x': origin[0] + random.randrange(int(width)), 'y': origin[2] + 2,
+                          'z': origin[1] + random.randrange(int(height)), 'block_type': 'block_victim_1',
+                          'unique_id': f'vic_{i}'} for i in range(args['victims'])])
+    poses = [(random.randrange(int(width)), random.randrange(int(height)), random.uniform(-math.pi, math.pi))
+             for _ in range(args['number'])]
+
+    # Validate against casting one block at a time
+    player = Player({'callsign': 'Red', 'participant_id': 'benchmark'})
+    reference = Player({'callsign': 'Red', 'participant_id': 'benchmark'})
+    visible = 0
+    for x, y, yaw in poses:
+        for p in [player, reference]:
+            p.x = x
+            p.y = y
+            p.yaw = yaw
+            p.points_of_interest.clear()
+        game_map.compute_fov(player)
+        game_map.compute_fov_by_block(reference)
+        assert np.array_equal(player.fov_mask, reference.fov_mask), f'Mismatch at {x}, {y}, {yaw}'
+        assert len(player.arcs) == len(reference.arcs) and \
+            all(np.array_equal(a, b) for a, b in zip(player.arcs, reference.arcs)), f'Different arcs at {x}, {y}, {yaw}'
+        assert player.points_of_interest == reference.points_of_interest, \
+            f'Different points of interest at {x}, {y}, {yaw}'
+        visible += player.fov_mask.sum()
+    assert detections.get(id(player)) == detections.get(id(reference)), 'Different point of interest detections'
+    print(f'Results (masks, arcs and {len(detections.get(id(player), []))} point of interest detections) identical '
+          f'to block-by-block shadow casting on {len(poses)} poses '
+          f'(fov_radius={player.fov_radius}, {visible/len(poses):.1f} blocks visible on average)')
+
+    before = time_fov(Map.compute_fov_by_block, game_map, reference, poses)
+    after = time_fov(Map.compute_fov, game_map, player, poses)
+    print(f'by block {before:10,.0f} calls/s, by ring {after:10,.0f} calls/s ({after/before:.1f}x)')
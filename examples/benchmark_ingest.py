@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+from atomic.parsing.ingest import LiveSource, ingest, ingest_file
+
+__desc__ = 'Message ingestion: reading, decoding and processing one line at a time vs. the asynchronous pipeline'
+
+
+class StandInWorld(object):
+    """
+    Records the messages it processes, spending the given time on every decision interval's worth of them (as
+    ASISTWorld does when stepping PsychSim)
+    """
+
+    def __init__(self, step_time, interval=20):
+        self.step_time = step_time
+        self.interval = interval
+        self.msgs = []
+
+    def process_msg(self, msg):
+        self.msgs.append((msg.get('topic'), msg['msg']['sub_type'], msg['data']['index']))
+        if len(self.msgs) % self.interval == 0:
+            time.sleep(self.step_time)
+
+
+def random_log(fname, number, size):
+    with open(fname, 'w') as log_file:
+        for i in range(number):
+            if random.random() < 0.001:
+                log_file.write('{not json\n')
+            else:
+                msg = {'topic': random.choice(['observations/state', 'observations/events/player/location']),
+                       'msg': {'source': random.choice(['simulator', 'ac_a', 'ac_b']), 'sub_type': 'state'},
+                       'data': {'index': i, 'payload': [random.random() for _ in range(size)]}}
+                log_file.write(f'{json.dumps(msg)}\n')
+
+
+def replay_serially(world, fname):
+    # The loop formerly in Replayer.replay
+    with open(fname, 'rt') as json_file:
+        for line in json_file:
+            try:
+                msg = json.loads(line)
+            except Exception:
+                msg = None
+            if msg:
+                world.process_msg(msg)
+
+
+def live_payloads(fname):
+    """
+    :return: the payload (the message minus its topic) and topic of each line of the log, as a message bus would
+    deliver them
+    """
+    payloads = []
+    with open(fname, 'rt') as json_file:
+        for line in json_file:
+            try:
+                msg = json.loads(line)
+            except Exception:
+                payloads.append((line, None))
+            else:
+                payloads.append((json.dumps({key: value for key, value in msg.items() if key != 'topic'}),
+                                 msg['topic']))
+    return payloads
+
+
+def replay_live(world, payloads):
+    # A stand-in for the message bus, delivering the messages from its own thread
+    source = LiveSource()
+
+    def deliver():
+        for payload, topic in payloads:
+            source.feed(payload, topic)
+        source.close()
+    thread = threading.Thread(target=deliver)
+    thread.start()
+    asyncio.run(ingest(world, source.read, logger=NullLogger()))
+    thread.join()
+
+
+class NullLogger(object):
+    def error(self, msg):
+        pass
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('-n', '--number', type=int, default=50000, help='Number of messages in the log')
+    parser.add_argument('-s', '--size', type=int, default=40, help='Number of values in each message')
+    parser.add_argument('-t', '--step', type=float, default=0.002,
+                        help='Seconds spent (sleeping, so releasing the GIL) processing every 20 messages')
+    args = vars(parser.parse_args())
+
+    random.seed(0)
+    fname = os.path.join(tempfile.mkdtemp(), 'log.metadata')
+    try:
+        random_log(fname, args['number'], args['size'])
+        payloads = live_payloads(fname)
+        results = {}
+        for label, replay in [('serial', lambda world: replay_serially(world, fname)),
+                              ('pipeline', lambda world: ingest_file(world, fname, logger=NullLogger())),
+                              ('live', lambda world: replay_live(world, payloads))]:
+            world = StandInWorld(args['step'])
+            start = timer()
+            replay(world)
+            results[label] = (timer() - start, world.msgs)
+            print(f'{label:>8}: {results[label][0]:7.3f}s ({len(world.msgs)} messages)')
+        assert results['pipeline'][1] == results['serial'][1], 'Pipeline processed different messages'
+        assert results['live'][1] == results['serial'][1], 'Live pipeline processed different messages'
+        print('Same messages processed in the same order by all three')
+    finally:
+        os.remove(fname)
+        os.rmdir(os.path.dirname(fname))
@@ -0,0 +1,63 @@
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+from atomic.definitions import map_utils
+
+__desc__ = 'Default maps: parsing the CSV files on every call vs. the per-process registry and on-disk table cache'
+
+LOAD_MAPS = 'import time; from atomic.definitions.map_utils import get_default_maps; start = time.perf_counter(); ' \
+            'get_default_maps(); print(time.perf_counter() - start)'
+
+
+def parse_maps():
+    # What get_default_maps used to do on every call
+    tables = {}
+    for name, data in map_utils.get_default_maps().items():
+        adjacency = map_utils.getSandRMap(fname=data.adjacency_file)
+        tables[name] = (adjacency, map_utils.getSandRVictims(fname=data.victim_file),
+                        map_utils.getSandRCoords(fname=data.coords_file))
+    return tables
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('-n', '--number', type=int, default=20, help='Number of calls to time')
+    args = vars(parser.parse_args())
+    logging.disable(logging.WARNING)
+
+    cache_dir = tempfile.mkdtemp()
+    map_utils.MAP_CACHE_DIR = cache_dir
+    try:
+        start = timer()
+        maps = map_utils.get_default_maps()
+        print(f'First call (parsing):       {1000*(timer()-start):8.2f}ms')
+
+        for name, (adjacency, victims, coordinates) in parse_maps().items():
+            assert {room: dict(neighbors) for room, neighbors in maps[name].adjacency.items()} == \
+                {room: dict(neighbors) for room, neighbors in adjacency.items()}, f'Different adjacency in {name}'
+            assert {room: list(colors) for room, colors in maps[name].victims.items()} == victims, \
+                f'Different victims in {name}'
+            assert maps[name].coordinates == coordinates, f'Different coordinates in {name}'
+        print('Same tables as parsing the files')
+
+        start = timer()
+        for _ in range(args['number']):
+            parse_maps()
+        print(f'Parsing the files:          {1000*(timer()-start)/args["number"]:8.2f}ms per call')
+        start = timer()
+        for _ in range(args['number']):
+            map_utils.get_default_maps()
+        print(f'Registry:                   {1000*(timer()-start)/args["number"]:8.2f}ms per call')
+
+        # A fresh process (e.g., a spawned worker) finds the tables in the on-disk cache
+        env = dict(os.environ, ATOMIC_MAP_CACHE=cache_dir)
+        seconds = float(subprocess.run([sys.executable, '-c', LOAD_MAPS], env=env, capture_output=True, text=True,
+                                       check=True).stdout.split()[-1])
+        print(f'New process (disk cache):   {1000*seconds:8.2f}ms')
+    finally:
+        shutil.rmtree(cache_dir)
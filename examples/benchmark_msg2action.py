@@ -0,0 +1,75 @@
+import os
+import random
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+import pandas as pd
+from atomic.parsing.get_psychsim_action_name import Msg2ActionEntry
+
+__desc__ = 'Micro-benchmark of message-to-action translation: linear scan of conversions vs. compiled dispatch table'
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+ACTION_FILE = os.path.join(ROOT, 'data', 'rddl_psim', 'rddl2actions_newpickup.csv')
+AUX_FILE = os.path.join(ROOT, 'maps', 'Saturn', 'rddl_clpsd_neighbors.csv')
+PLAYERS = ['p1', 'p2', 'p3']
+
+
+def random_messages(number, aux):
+    """
+    :return: a mix of messages of every type in the conversions, including moves between non-adjacent rooms and
+    messages with no corresponding action
+    """
+    rooms = list(aux.index)
+    messages = []
+    for _ in range(number):
+        player = random.choice(PLAYERS)
+        sub_type = random.choice(['Event:location', 'Event:location', 'Event:Triage', 'Event:VictimPickedUp',
+                                  'Event:VictimPlaced', 'Event:RoleSelected', 'Event:MarkerPlaced', 'Event:Door', 'noop'])
+        msg = {'playername': player, 'sub_type': sub_type}
+        if sub_type == 'Event:location':
+            msg['old_room_name'] = random.choice(rooms)
+            neighbors = [room for room in aux.loc[msg['old_room_name']] if isinstance(room, str)]
+            msg['room_name'] = random.choice(neighbors) if neighbors and random.random() < 0.9 else random.choice(rooms)
+        elif sub_type == 'Event:Triage':
+            msg['triage_state'] = random.choice(['SUCCESSFUL', 'IN_PROGRESS', 'UNSUCCESSFUL'])
+            msg['type'] = random.choice(['CRITICAL', 'REGULAR'])
+        elif sub_type == 'Event:VictimPickedUp':
+            msg['type'] = random.choice(['CRITICAL', 'REGULAR'])
+            msg['state'] = random.choice(['saved', 'unsaved'])
+        elif sub_type == 'Event:RoleSelected':
+            msg['new_role'] = random.choice(['medic', 'engineer', 'transporter'])
+        elif sub_type == 'Event:MarkerPlaced':
+            msg['type'] = random.choice(['Marker Block 1', 'Marker Block 2', 'Marker Block 3'])
+        messages.append(msg)
+    return messages
+
+
+def time_translation(fun, messages):
+    start = timer()
+    for msg in messages:
+        fun(msg)
+    return len(messages) / (timer() - start)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('actions', nargs='?', default=ACTION_FILE, help='CSV file of message to action conversions')
+    parser.add_argument('aux', nargs='?', default=AUX_FILE, help='Auxiliary CSV file (e.g., room neighbors)')
+    parser.add_argument('-n', '--number', type=int, default=100000, help='Number of random messages')
+    args = vars(parser.parse_args())
+
+    Msg2ActionEntry.read_psysim_msg_conversion(args['actions'], args['aux'])
+    start = timer()
+    Msg2ActionEntry.compile()
+    print(f'Compiled {len(Msg2ActionEntry.conversions)} conversions in {timer()-start:.4f}s')
+
+    random.seed(0)
+    messages = random_messages(args['number'], pd.read_csv(args['aux'], index_col=0))
+
+    # Validate against the linear scan
+    for msg in messages:
+        assert Msg2ActionEntry.scan(msg) == Msg2ActionEntry.get_action(msg), f'Mismatch on {msg}'
+    print(f'Results identical to linear scan on {len(messages)} messages')
+
+    before = time_translation(Msg2ActionEntry.scan, messages)
+    after = time_translation(Msg2ActionEntry.get_action, messages)
+    print(f'linear {before:12,.0f} msgs/s, compiled {after:12,.0f} msgs/s ({after/before:.1f}x)')
@@ -0,0 +1,222 @@
+import functools
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import resource
+import statistics
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer as timer
+import atomic.parsing.ingest as ingest
+import atomic.parsing.rddl_replayer as rddl_replayer
+import atomic.parsing.replayer as streaming_replayer
+from atomic.parsing.rddl_replayer import RDDL_Replayer, accumulate_files, replay_parser, parse_replay_args
+from atomic.parsing.replay_features import FeatureReplayer
+from atomic.parsing.replayer import Replayer as StreamingReplayer
+
+__desc__ = 'Replay benchmark: throughput, peak memory and time per phase of each replayer on a fixed set of trials, ' \
+           'saved as a JSON baseline and compared against an earlier one to flag regressions'
+
+PHASES = ['parse', 'convert', 'step', 'features']
+REPLAYERS = ['rddl', 'features', 'streaming']
+
+# Phases shorter than this (in seconds) in the baseline are too noisy to flag
+MIN_PHASE_TIME = 0.5
+
+
+class PhaseTimer(object):
+    """
+    Accumulates the time spent in each phase, counting time spent in a phase nested in another (in the same thread)
+    only in the innermost one
+    """
+
+    def __init__(self):
+        self.totals = {phase: 0. for phase in PHASES}
+        self.counts = {'messages': 0, 'steps': 0}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def wrap(self, phase, fun, count=None):
+        """
+        :param count: if not None, the count to increment on each call
+        :return: the given function, timed as part of the given phase
+        """
+        @functools.wraps(fun)
+        def timed(*args, **kwargs):
+            stack = self.local.__dict__.setdefault('stack', [])
+            # Time spent in nested phases
+            stack.append(0.)
+            start = timer()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                elapsed = timer() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self.lock:
+                    self.totals[phase] += elapsed - nested
+                    if count is not None:
+                        self.counts[count] += 1
+        return timed
+
+
+def make_replayer(name, args, phases):
+    """
+    :return: a replayer of the given kind whose phases are timed by the given PhaseTimer
+    """
+    if name == 'streaming':
+        class TimedReplayer(StreamingReplayer):
+            def pre_replay(self, fname):
+                phases.wrap('convert', super().pre_replay)(fname)
+                world = self.worlds[fname]
+                world.create_agents = phases.wrap('convert', world.create_agents)
+                world.process_msg = phases.wrap('features', world.process_msg, 'messages')
+                world.step = phases.wrap('step', world.step, 'steps')
+
+            def post_replay(self, fname):
+                # Leave out writing the AC data next to the trial files
+                self.worlds[fname].close()
+
+            def finish(self):
+                pass
+
+        ingest.json = streaming_replayer.json = type('TimedJSON', (object,),
+                                                     {'loads': staticmethod(phases.wrap('parse', json.loads))})
+        return TimedReplayer(args['fname'], args['trials'], args['config'], logger=logging)
+
+    class TimedParser(rddl_replayer.MsgQCreator):
+        def __init__(self, *args, **kwargs):
+            phases.wrap('parse', super().__init__)(*args, **kwargs)
+
+        def startProcessing(self, *args, **kwargs):
+            phases.wrap('parse', super().startProcessing)(*args, **kwargs)
+            phases.counts['messages'] += len(self.jsonParser.jsonMsgs)
+
+        def getActionsAndEvents(self, *args, **kwargs):
+            return phases.wrap('parse', super().getActionsAndEvents)(*args, **kwargs)
+
+    base = FeatureReplayer if name == 'features' else RDDL_Replayer
+
+    class TimedReplayer(base):
+        def _create_derived_features(self, parser, logger=logging):
+            features = super()._create_derived_features(parser, logger)
+            for feature in features:
+                feature.processMsg = phases.wrap('features', feature.processMsg)
+            return features
+
+        def pre_replay(self, parser, logger=logging):
+            converter = super().pre_replay(parser, logger)
+            if converter:
+                converter.world.step = phases.wrap('step', converter.world.step, 'steps')
+            return converter
+
+    rddl_replayer.MsgQCreator = TimedParser
+    rddl_replayer.make_augmented_world = phases.wrap('convert', rddl_replayer.make_augmented_world)
+    kwargs = {'rddl_file': args['rddl'], 'action_file': args['actions'], 'aux_file': args['aux'], 'logger': logging}
+    if base is RDDL_Replayer:
+        kwargs['world_cache'] = args['world_cache']
+    return TimedReplayer(args['fname'], args['trials'], args['config'], **kwargs)
+
+
+def run(name, args):
+    """
+    Replays all of the trials with the given kind of replayer (meant to run in a fresh process, so that the peak RSS
+    is its own)
+    :rtype: dict
+    """
+    logging.getLogger().setLevel(getattr(logging, args['debug'].upper()))
+    phases = PhaseTimer()
+    replayer = make_replayer(name, args, phases)
+    start = timer()
+    replayer.process_files(args['number'])
+    wall = timer() - start
+    return {'seconds': wall, 'messages': phases.counts['messages'], 'steps': phases.counts['steps'],
+            'messages/sec': phases.counts['messages'] / wall, 'steps/sec': phases.counts['steps'] / wall,
+            # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+                           (1024 * 1024 if sys.platform == 'darwin' else 1024),
+            'phases': phases.totals}
+
+
+def summarize(runs):
+    """
+    :return: the median of each metric over the given runs
+    """
+    result = {key: statistics.median(run[key] for run in runs) for key in runs[0] if key != 'phases'}
+    result['phases'] = {phase: statistics.median(run['phases'][phase] for run in runs) for phase in PHASES}
+    return result
+
+
+def compare(results, baseline, threshold):
+    """
+    :return: a description of each metric that is worse than in the baseline by more than the given fraction
+    :rtype: List[str]
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        # (metric, new, old, whether higher is better)
+        metrics = [('messages/sec', result['messages/sec'], old['messages/sec'], True),
+                   ('steps/sec', result['steps/sec'], old['steps/sec'], True),
+                   ('peak_rss_mb', result['peak_rss_mb'], old['peak_rss_mb'], False)]
+        metrics += [(f'{phase} time', result['phases'][phase], old['phases'][phase], False) for phase in PHASES
+                    if old['phases'][phase] >= MIN_PHASE_TIME]
+        for metric, new_value, old_value, higher in metrics:
+            if old_value > 0:
+                change = (new_value - old_value) / old_value
+                print(f'{name:>10} {metric:>14}: {old_value:12.3f} -> {new_value:12.3f} ({100*change:+7.1f}%)')
+                if (-change if higher else change) > threshold:
+                    regressions.append(f'{name} {metric} {100*change:+.1f}%')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = replay_parser()
+    parser.description = __desc__
+    parser.add_argument('-r', '--replayers', nargs='+', choices=REPLAYERS, default=REPLAYERS,
+                        help='Replayers to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of each replayer (median is reported)')
+    parser.add_argument('--save', help='Name of JSON file in which to save the results as a baseline')
+    parser.add_argument('--baseline', help='Name of JSON file of an earlier baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Fraction by which a metric may be worse than the baseline before it is flagged')
+    args = parse_replay_args(parser)
+
+    trials = sorted(accumulate_files(args['fname'], args['trials']))
+    if len(trials) == 0:
+        sys.exit('No trial files found')
+    meta = {'trials': {os.path.basename(fname): os.path.getsize(fname) for fname in trials},
+            'python': platform.python_version(), 'platform': platform.platform(), 'steps': args['number'],
+            'repeat': args['repeat']}
+    results = {}
+    context = mp.get_context('fork')
+    for name in args['replayers']:
+        runs = []
+        for _ in range(args['repeat']):
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                runs.append(executor.submit(run, name, args).result())
+        results[name] = summarize(runs)
+        result = results[name]
+        print(f'{name:>10}: {result["seconds"]:8.2f}s, {result["messages/sec"]:9.1f} messages/s, '
+              f'{result["steps/sec"]:8.2f} steps/s, peak RSS {result["peak_rss_mb"]:8.1f}MB | ' +
+              ', '.join(f'{phase} {result["phases"][phase]:.2f}s' for phase in PHASES))
+
+    if args['save']:
+        with open(args['save'], 'w') as baseline_file:
+            json.dump({'meta': meta, 'results': results}, baseline_file, indent=2)
+    if args['baseline']:
+        with open(args['baseline'], 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['meta']['trials'] != meta['trials'] or baseline['meta']['steps'] != meta['steps']:
+            print('Warning: the baseline was recorded on a different set of trials or steps')
+        regressions = compare(results, baseline, args['threshold'])
+        if regressions:
+            print(f'Regressions beyond {100*args["threshold"]:.0f}%: {"; ".join(regressions)}')
+            sys.exit(1)
+        print(f'No regressions beyond {100*args["threshold"]:.0f}%')
@@ -0,0 +1,81 @@
+import copy
+import random
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+import numpy as np
+from psychsim.agent import Agent
+from psychsim.probability import Distribution
+from psychsim.pwl import WORLD
+from psychsim.world import World
+from atomic.definitions.features import get_location_key, get_num_victims_location_key, get_num_visits_location_key
+from atomic.model_learning.linear.rewards import LocationRewardVector, LocationVictimColorReward, \
+    LocationVisitedReward
+from atomic.model_learning.snapshots import WorldSnapshots
+
+__desc__ = 'Location-based reward features: computing each feature in each state vs. the feature matrix of all states'
+
+
+def make_world(num_locations):
+    world = World()
+    agent = Agent('Player')
+    world.addAgent(agent)
+    locations = [f'room{i}' for i in range(num_locations)]
+    world.defineState(agent.name, 'loc', list, locations)
+    world.setFeature(get_location_key(agent), locations[0])
+    for loc in locations:
+        for color in ['White', 'Red']:
+            world.defineState(WORLD, f'ctr_{loc}_{color}', int)
+            world.setFeature(get_num_victims_location_key(loc, color), random.randint(0, 2))
+        world.defineState(agent.name, f'locvisits_{loc}', int)
+        world.setFeature(get_num_visits_location_key(agent, loc), random.randint(0, 3))
+    return world, agent, locations
+
+
+def random_trajectory(world, agent, locations, length):
+    """
+    :return: the states of a random walk, recorded as snapshots (sharing the distributions that did not change)
+    """
+    trajectory = WorldSnapshots()
+    for t in range(length):
+        if t % 5 == 0:
+            # some uncertainty about the player's location
+            world.setFeature(get_location_key(agent), Distribution({random.choice(locations): 0.3,
+                                                                    random.choice(locations): 0.7}))
+        else:
+            world.setFeature(get_location_key(agent), random.choice(locations))
+        loc = random.choice(locations)
+        world.setFeature(get_num_victims_location_key(loc, 'White'), random.randint(0, 2))
+        world.setFeature(get_num_visits_location_key(agent, loc), random.randint(0, 3))
+        trajectory.append((trajectory.snapshot(world), None))
+    return [trajectory.state(t) for t in range(len(trajectory))]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('-l', '--locations', type=int, default=90, help='Number of locations')
+    parser.add_argument('-n', '--number', type=int, default=1000, help='Number of states')
+    args = vars(parser.parse_args())
+
+    random.seed(0)
+    world, agent, locations = make_world(args['locations'])
+    features = [LocationVisitedReward('Location Visited', agent, locations),
+                LocationVictimColorReward('See White', agent, 'White', locations),
+                LocationVictimColorReward('See Red', agent, 'Red', locations)]
+    rwd_vector = LocationRewardVector(features)
+    probs = np.random.rand(args['number'])
+
+    for label, states in [('snapshots', random_trajectory(world, agent, locations, args['number'])),
+                          ('copies', [copy.deepcopy(state) for state in
+                                      random_trajectory(world, agent, locations, args['number'])])]:
+        start = timer()
+        values = np.array([[feature.get_value(state) for feature in features] for state in states])
+        expected = probs @ values
+        elapsed = timer() - start
+        print(f'{label:>9} per feature: {1000*elapsed:8.2f}ms')
+        start = timer()
+        matrix_expected = rwd_vector.get_expected_values(states, probs)
+        elapsed = timer() - start
+        print(f'{label:>9} matrix:      {1000*elapsed:8.2f}ms')
+        assert np.allclose(values, rwd_vector.get_values_matrix(states)), 'Different feature values'
+        assert np.allclose(expected, matrix_expected), 'Different expected feature values'
+    print('Same feature values and expectations')
@@ -0,0 +1,56 @@
+import json
+import os
+import random
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+from atomic.parsing.map_parser import extract_map
+from atomic.parsing.room_index import room, RoomIndex, closest_room
+
+__desc__ = 'Micro-benchmark of point-in-room and nearest-room lookups: linear scan vs. grid RoomIndex'
+
+MAP_FILE = os.path.join(os.path.dirname(__file__), '..', 'maps', 'Saturn_1.0_sm_with_victimsA.json')
+
+
+def linear_containing(rooms, x, z):
+    return [r for r in rooms if r.in_room(x, z)]
+
+
+def time_lookups(fun, points):
+    start = timer()
+    for x, z in points:
+        fun(x, z)
+    return len(points) / (timer() - start)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('map', nargs='?', default=MAP_FILE, help='Semantic map JSON file')
+    parser.add_argument('-n', '--number', type=int, default=100000, help='Number of random query points')
+    parser.add_argument('-c', '--cell', type=float, default=RoomIndex.DEFAULT_CELL_SIZE, help='Grid cell size')
+    args = vars(parser.parse_args())
+
+    with open(args['map'], 'r') as map_file:
+        room_dict, _ = extract_map(json.load(map_file))
+    rooms = [room(rid, [coords[0]['x'], coords[0]['z'], coords[1]['x'], coords[1]['z']])
+             for rid, coords in room_dict.items()]
+    start = timer()
+    index = RoomIndex(rooms, args['cell'])
+    print(f'Indexed {len(rooms)} rooms into {len(index.cells)} cells in {timer()-start:.4f}s')
+
+    random.seed(0)
+    points = [(random.uniform(index.x_min-5, index.x_max+5), random.uniform(index.z_min-5, index.z_max+5))
+              for _ in range(args['number'])]
+
+    # Validate against the linear scans
+    for x, z in points:
+        assert linear_containing(rooms, x, z) == index.containing(x, z), f'Mismatch at {x},{z}'
+        assert closest_room(x, z, rooms) == index.closest(x, z), f'Mismatch at {x},{z}'
+    print(f'Results identical to linear scan on {len(points)} points')
+
+    for label, linear, indexed in [
+            ('point-in-room', lambda x, z: linear_containing(rooms, x, z), index.containing),
+            ('nearest-room', lambda x, z: closest_room(x, z, rooms), index.closest)]:
+        before = time_lookups(linear, points)
+        after = time_lookups(indexed, points)
+        print(f'{label:>14}: linear {before:12,.0f} lookups/s, indexed {after:12,.0f} lookups/s '
+              f'({after/before:.1f}x)')
@@ -0,0 +1,46 @@
+import datetime
+import random
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+from dateutil import parser as date_parser
+from atomic.definitions import timestamps
+
+__desc__ = 'Message clocks: dateutil and splitting the mission timer on every message vs. the fixed-format parsers'
+
+
+def make_messages(number):
+    start = datetime.datetime(2022, 3, 11, 15, 40, 39, tzinfo=datetime.timezone.utc)
+    msgs = []
+    for i in range(number):
+        elapsed = i * 0.05 + random.random() * 0.01
+        moment = start + datetime.timedelta(seconds=elapsed)
+        remaining = max(0, 900 - int(elapsed))
+        msgs.append({'msg': {'timestamp': moment.isoformat(timespec='microseconds').replace('+00:00', 'Z')},
+                     'data': {'mission_timer': f'{remaining // 60} : {remaining % 60}'}})
+    return msgs
+
+
+def old_clocks(msg):
+    # What ACWrapper and ASISTWorld used to do with each message
+    moment = date_parser.parse(msg['msg']['timestamp'])
+    return moment.timestamp()*1000, tuple([int(item) for item in msg['data']['mission_timer'].split(':')])
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('-n', '--number', type=int, default=20000, help='Number of messages')
+    args = vars(parser.parse_args())
+
+    random.seed(0)
+    msgs = make_messages(args['number'])
+    start = timer()
+    expected = [old_clocks(msg) for msg in msgs]
+    print(f'dateutil and split: {1e6*(timer()-start)/len(msgs):8.2f}us per message')
+    start = timer()
+    clocks = [timestamps.stamp_message(msg) for msg in msgs]
+    print(f'Fixed-format:       {1e6*(timer()-start)/len(msgs):8.2f}us per message')
+    for msg, (millis, timer_value), (epoch_ms, remaining) in zip(msgs, expected, clocks):
+        assert abs(epoch_ms - millis) < 1e-3, f'Different timestamp {msg["msg"]["timestamp"]}'
+        assert remaining == timer_value, f'Different timer {msg["data"]["mission_timer"]}'
+        timestamps.release_message(msg)
+    print('Same clocks')
@@ -0,0 +1,81 @@
+import json
+import os
+import random
+import resource
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+import numpy as np
+from atomic.analytic.models import map as voxel_map
+from atomic.analytic.utils.utils import xzy_location_from_dict
+
+__desc__ = 'Voxel map of the joint activity monitor: parsing the JSON map file on every load vs. the mapped binary cache'
+
+
+def make_map_file(fname, width, depth, height, density):
+    blocks = [{'type': random.choice(['stone', 'stone', 'glass']), 'location': {'x': x - 2200, 'y': y + 60, 'z': z - 10}}
+              for x in range(width) for z in range(depth) for y in range(height) if random.random() < density]
+    with open(fname, 'w') as map_file:
+        json.dump({'metadata': {'lower_bound': {'x': -2200, 'y': 60, 'z': -10},
+                                'upper_bound': {'x': width - 2201, 'y': height + 59, 'z': depth - 11}},
+                   'blocks': blocks}, map_file)
+    return len(blocks)
+
+
+def old_load(fname):
+    # What Map.load_map_data used to do on every load
+    with open(fname, 'r') as map_file:
+        map_data = json.load(map_file)
+    origin = xzy_location_from_dict(map_data['metadata']['lower_bound'])
+    dimensions = (xzy_location_from_dict(map_data['metadata']['upper_bound']) - origin) + 1
+    blocks = np.zeros(np.uint(dimensions), dtype=np.uint8)
+    for block in map_data['blocks']:
+        if block['type'] in voxel_map.TRANSPARENT_BLOCKS:
+            continue
+        loc = block['location']
+        x = np.uint16(loc['x'] - origin[0])
+        y = np.uint16(loc['y'] - origin[2])
+        z = np.uint8(loc['z'] - origin[1])
+        blocks[x, z, y] = 1
+    return origin, dimensions, blocks
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('-x', '--width', type=int, default=150, help='Width of the map (x)')
+    parser.add_argument('-z', '--depth', type=int, default=80, help='Depth of the map (z)')
+    parser.add_argument('-y', '--height', type=int, default=4, help='Height of the map (y)')
+    parser.add_argument('-n', '--number', type=int, default=20, help='Number of loads to time')
+    args = vars(parser.parse_args())
+
+    random.seed(0)
+    work_dir = tempfile.mkdtemp()
+    try:
+        fname = os.path.join(work_dir, 'map.json')
+        count = make_map_file(fname, args['width'], args['depth'], args['height'], 0.3)
+        print(f'{count} blocks in a {args["width"]}x{args["depth"]}x{args["height"]} map')
+        cache_dir = os.path.join(work_dir, 'cache')
+
+        start = timer()
+        origin, dimensions, blocks = old_load(fname)
+        print(f'Parsing the file:         {1000*(timer()-start):8.2f}ms')
+        start = timer()
+        cached = voxel_map.load_voxel_map(fname, cache_dir)
+        print(f'First load (compiling):   {1000*(timer()-start):8.2f}ms')
+        for expected, actual in zip((origin, dimensions, blocks), cached):
+            assert np.array_equal(expected, actual), 'Different voxel map'
+        print('Same voxel map as parsing the file')
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = timer()
+        loaded = [voxel_map.load_voxel_map(fname, cache_dir) for _ in range(args['number'])]
+        print(f'Later loads (mapped):     {1000*(timer()-start)/args["number"]:8.2f}ms per load')
+        print(f'Peak memory growth:       {(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss)/1024:8.2f}MB '
+              f'for {args["number"]} maps')
+        # Modifying one map leaves the others (and the cache) untouched
+        loaded[0][2][0, 0, 0] = 2
+        assert loaded[1][2][0, 0, 0] == blocks[0, 0, 0], 'Modification shared across maps'
+        del loaded, cached
+    finally:
+        shutil.rmtree(work_dir)
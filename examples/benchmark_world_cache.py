@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+from argparse import ArgumentParser
+from timeit import default_timer as timer
+from atomic.parsing.rddl_replayer import make_augmented_world
+from atomic.parsing.world_cache import WorldCache
+
+__desc__ = 'Startup time of the replay world: converting the RDDL file every time vs. loading it from the WorldCache'
+
+RDDL_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'rddl_psim', 'newpickup_v1MAP.rddl')
+
+
+def time_worlds(number, **kwargs):
+    start = timer()
+    for _ in range(number):
+        make_augmented_world(args['rddl'], conditions={'CondWin': args['map']}, **kwargs)
+    return (timer() - start) / number
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__desc__)
+    parser.add_argument('rddl', nargs='?', default=RDDL_FILE, help='RDDL file (with MAP placeholder, if any)')
+    parser.add_argument('-m', '--map', default='SaturnA', help='Map condition substituted for MAP in the file name')
+    parser.add_argument('-n', '--number', type=int, default=5, help='Number of worlds to create')
+    args = vars(parser.parse_args())
+
+    directory = tempfile.mkdtemp()
+    try:
+        before = time_worlds(args['number'])
+        print(f'      converted: {before:8.3f}s per world')
+        # First run populates the on-disk cache
+        start = timer()
+        make_augmented_world(args['rddl'], conditions={'CondWin': args['map']}, cache=WorldCache(directory))
+        print(f'  first (cold): {timer()-start:8.3f}s')
+        # A new process would start with only the on-disk cache
+        start = timer()
+        make_augmented_world(args['rddl'], conditions={'CondWin': args['map']}, cache=WorldCache(directory))
+        print(f'  from disk   : {timer()-start:8.3f}s')
+        after = time_worlds(args['number'], cache=WorldCache(directory))
+        print(f'  from memory : {after:8.3f}s per world ({before/after:.1f}x)')
+    finally:
+        shutil.rmtree(directory)
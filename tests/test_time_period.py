@@ -0,0 +1,66 @@
+"""
+Randomized checks that the sorted sweep of contains_overlapping_set finds the same overlaps as does_overlap
+"""
+import random
+import unittest
+
+from atomic.analytic.utils.time_period import TimePeriod, contains_overlapping_pair, contains_overlapping_set, \
+    does_overlap
+
+
+def random_periods(rng, number, horizon):
+    """
+    :return: time periods with integer or real bounds, including ongoing ones (ending at -1) and a few malformed ones
+    (ending before they start, as left by out-of-order or missing times)
+    """
+    periods = []
+    for _ in range(number):
+        start = rng.choice([rng.randint(0, horizon), rng.uniform(0, horizon)])
+        kind = rng.random()
+        if kind < 0.2:
+            periods.append(TimePeriod(start, -1))
+        elif kind < 0.25:
+            period = TimePeriod(start, -1)
+            period.end = rng.choice([start - 1, -2])
+            periods.append(period)
+        else:
+            periods.append(TimePeriod(start, start + rng.choice([0, rng.randint(0, max(1, horizon // 10))])))
+    return periods
+
+
+def any_pair_overlaps(time_periods):
+    """
+    :return: whether does_overlap holds for any two of the given time periods (in either order)
+    """
+    return any(does_overlap(period_1, period_2) or does_overlap(period_2, period_1)
+               for i, period_1 in enumerate(time_periods) for period_2 in time_periods[i+1:])
+
+
+class TestContainsOverlappingSet(unittest.TestCase):
+
+    def test_examples(self):
+        self.assertFalse(contains_overlapping_set([]))
+        self.assertFalse(contains_overlapping_set([TimePeriod(0, 5)]))
+        self.assertFalse(contains_overlapping_set([TimePeriod(6, 8), TimePeriod(0, 5)]))
+        self.assertTrue(contains_overlapping_set([TimePeriod(0, 5), TimePeriod(5, 8)]))
+        self.assertTrue(contains_overlapping_set([TimePeriod(0, 5), TimePeriod(3, -1)]))
+        self.assertFalse(contains_overlapping_set([TimePeriod(0, 5), TimePeriod(6, -1)]))
+        self.assertTrue(contains_overlapping_set([TimePeriod(4, -1), TimePeriod(4, -1)]))
+
+    def test_matches_does_overlap(self):
+        rng = random.Random(0)
+        for _ in range(5000):
+            periods = random_periods(rng, rng.randint(0, 12), rng.choice([5, 20, 1000]))
+            with self.subTest(periods=periods):
+                self.assertEqual(contains_overlapping_set(periods), any_pair_overlaps(periods))
+
+    def test_matches_pairwise_check(self):
+        rng = random.Random(1)
+        for _ in range(5000):
+            periods = random_periods(rng, rng.randint(0, 12), rng.choice([5, 20, 1000]))
+            with self.subTest(periods=periods):
+                self.assertEqual(contains_overlapping_set(periods), contains_overlapping_pair(periods))
+
+
+if __name__ == '__main__':
+    unittest.main()